@@ -1,12 +1,33 @@
 import os
-import google.generativeai as genai
-
-GOOGLE_API_KEY = os.environ['GOOGLE_API_KEY']
-genai.configure(api_key=GOOGLE_API_KEY)
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import pytz
+from calendar_resolver import resolve_calendar_query
+from cache import make_cache
+from llm_backend import TracedBackend, make_backend
+from tracing import annotate, span
+
+log = logging.getLogger('emoai.ai')
+
+# Per-message classification runs on a small bounded pool so a slow model call
+# can be abandoned at its deadline instead of stalling the chat request.
+CLASSIFIER_MAX_WORKERS = int(os.environ.get('CLASSIFIER_MAX_WORKERS', '8'))
+CLASSIFIER_TIMEOUT_SECONDS = float(os.environ.get('CLASSIFIER_TIMEOUT_SECONDS', '8'))
+
+classifier_executor = ThreadPoolExecutor(
+    max_workers=CLASSIFIER_MAX_WORKERS,
+    thread_name_prefix='classifier'
+)
 
-emoai_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    system_instruction="""
+EMOAI_INSTRUCTION = """
 You are EmoAI - an emotionally intelligent life companion who helps people improve their lives, quit bad habits, build better ones, and achieve their personal goals.
 
 MOST IMPORTANT - UNDERSTAND THE PERSON, NOT JUST THE WORDS:
@@ -91,56 +112,16 @@ Maximum 1-2 sentences per response. Be direct, warm, and impactful. Cut every un
 
 Remember: You are FEELING-FIRST and GOAL-ORIENTED. When someone messages you, ask yourself "What are they really feeling right now?" and "How can I help them move forward with their goals?" You're their supportive companion for emotional wellness AND life improvement.
 """
-)
 
-summarizer_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    system_instruction="""
+SUMMARIZER_INSTRUCTION = """
 You are a helpful assistant. Your task is to summarize a conversation.
 Read the entire chat history and summarize it into a concise, first-person
 journal entry from the user's perspective.
 Capture the main feelings, topics, important details, and any progress or insights.
 Start the journal entry with 'My Reflection Today:'
 """
-)
 
-event_extractor_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    system_instruction="""
-You are an event extraction assistant. Your task is to detect if a user message mentions any future events, appointments, meetings, or plans.
-
-EXTRACTION RULES:
-- Only extract events that are explicitly mentioned as future plans
-- Parse relative dates like "tomorrow", "next Tuesday", "on the 15th", "in 3 days"
-- Extract event title, date, time (if mentioned), and location (if mentioned)
-- Return JSON format ONLY if an event is detected, otherwise return "NO_EVENT"
-
-JSON FORMAT (return exactly this structure):
-{
-    "has_event": true,
-    "title": "event name",
-    "date": "YYYY-MM-DD",
-    "time": "HH:MM" or null,
-    "location": "location name" or null,
-    "original_message": "the user's message"
-}
-
-If NO event detected, return exactly: NO_EVENT
-
-EXAMPLES:
-"I have a dentist appointment tomorrow at 2pm" →
-{"has_event": true, "title": "Dentist appointment", "date": "2025-11-09", "time": "14:00", "location": null, "original_message": "I have a dentist appointment tomorrow at 2pm"}
-
-"Let's meet next Friday for coffee" →
-{"has_event": true, "title": "Coffee meeting", "date": "2025-11-15", "time": null, "location": null, "original_message": "Let's meet next Friday for coffee"}
-
-"I'm feeling stressed today" → NO_EVENT
-"""
-)
-
-sentiment_analyzer_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    system_instruction="""
+SENTIMENT_INSTRUCTION = """
 You are a sentiment analysis assistant. Analyze the emotional state of the user from their message.
 
 SENTIMENT CATEGORIES:
@@ -167,61 +148,86 @@ EXAMPLES:
 "I don't know what to do anymore..." → {"sentiment": "sad", "intensity": 0.8}
 "The weather is nice today" → {"sentiment": "neutral", "intensity": 0.2}
 """
-)
 
-calendar_query_model = genai.GenerativeModel(
-    model_name="gemini-2.0-flash",
-    system_instruction="""
-You are a calendar query analyzer. Detect if the user is asking about their schedule, calendar, or upcoming events.
-
-CALENDAR QUERY PATTERNS (recognize ALL of these):
-- "What's on my calendar?"
-- "Show me my schedule"
-- "What events do I have tomorrow?"
-- "Do I have anything planned this week?"
-- "What's my schedule for Friday?"
-- "Any events coming up?"
-- "What do I have on Monday?"
-- "Is there anything I have to do on [date]?"
-- "Anything on [date]?"
-- "Do I have plans on [date]?"
-- "What's happening on [date]?"
-- "Am I free on [date]?"
-- "Tell me about my schedule"
-- "What do I have coming up?"
+UNDERSTANDING_INSTRUCTION = """
+You are a message understanding assistant. For every user message you do THREE jobs at once and return ONE JSON object.
 
+JOB 1 - SENTIMENT: Analyze the emotional state of the user.
+SENTIMENT CATEGORIES:
+- happy: User is joyful, excited, celebrating, or expressing positive emotions
+- sad: User is down, depressed, grieving, or expressing sadness
+- anxious: User is worried, stressed, overwhelmed, or expressing anxiety
+- frustrated: User is annoyed, angry, or expressing frustration
+- neutral: User is calm, matter-of-fact, or not expressing strong emotions
+- confused: User is uncertain, lost, or seeking clarity
+INTENSITY SCALE (0.0 to 1.0):
+- 0.0-0.3: Low intensity (mild emotion)
+- 0.4-0.7: Medium intensity (noticeable emotion)
+- 0.8-1.0: High intensity (strong emotion)
+
+JOB 2 - EVENT EXTRACTION: Detect if the message mentions any future events, appointments, meetings, or plans.
+- Only extract events that are explicitly mentioned as future plans
+- Parse relative dates like "tomorrow", "next Tuesday", "on the 15th", "in 3 days"
+- Extract event title, date, time (if mentioned), and location (if mentioned)
+- A question about the user's schedule is NOT an event
+- If there is no event, "event" must be null
+
+JOB 3 - CALENDAR QUERY: Detect if the user is asking about their schedule, calendar, or upcoming events.
+Recognize questions like "What's on my calendar?", "Show me my schedule", "What events do I have tomorrow?",
+"Do I have anything planned this week?", "Any events coming up?", "Is there anything I have to do on [date]?",
+"Anything on [date]?", "Do I have plans on [date]?", "What's happening on [date]?", "Am I free on [date]?",
+"Tell me about my schedule", "What do I have coming up?"
 Parse the date range they're asking about:
 - "tomorrow" → tomorrow's date
 - "today" → today's date
 - "this week" → next 7 days from today
 - "next week" → 7-14 days from today
 - "Friday" or "Monday" etc. → next occurrence of that day
-- "on the 15th" or "on November 9" or "on 9th November" → that specific date
-- "on Nov 9" or "on 9 Nov" → that specific date
-- Always use YYYY-MM-DD format for dates
+- "on the 15th" or "on November 9" or "on 9th November" or "on Nov 9" → that specific date
+- If not a calendar query, "calendar_query" must be null
 
-Return JSON format if calendar query detected:
+Always use YYYY-MM-DD for dates and 24-hour HH:MM for times.
+
+Return ONLY this JSON structure:
 {
-    "is_calendar_query": true,
-    "start_date": "YYYY-MM-DD",
-    "end_date": "YYYY-MM-DD",
-    "query_type": "day|week|month|specific"
+    "sentiment": {"sentiment": "category", "intensity": 0.0-1.0},
+    "event": {"title": "event name", "date": "YYYY-MM-DD", "time": "HH:MM" or null, "location": "location name" or null} or null,
+    "calendar_query": {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD", "query_type": "day|week|month|specific"} or null
 }
 
-If NOT a calendar query, return:
-{"is_calendar_query": false}
+EXAMPLES (current date Saturday, November 08, 2025):
+"I have a dentist appointment tomorrow at 2pm" →
+{"sentiment": {"sentiment": "neutral", "intensity": 0.3}, "event": {"title": "Dentist appointment", "date": "2025-11-09", "time": "14:00", "location": null}, "calendar_query": null}
+
+"Let's meet next Friday for coffee, I'm so excited!" →
+{"sentiment": {"sentiment": "happy", "intensity": 0.7}, "event": {"title": "Coffee meeting", "date": "2025-11-14", "time": null, "location": null}, "calendar_query": null}
 
-EXAMPLES:
-"What's my schedule tomorrow?" → {"is_calendar_query": true, "start_date": "2025-11-09", "end_date": "2025-11-09", "query_type": "day"}
-"Show me events this week" → {"is_calendar_query": true, "start_date": "2025-11-08", "end_date": "2025-11-14", "query_type": "week"}
-"Is there anything I have to do on November 9?" → {"is_calendar_query": true, "start_date": "2025-11-09", "end_date": "2025-11-09", "query_type": "day"}
-"Anything on Nov 9?" → {"is_calendar_query": true, "start_date": "2025-11-09", "end_date": "2025-11-09", "query_type": "day"}
-"Do I have plans on 9th November?" → {"is_calendar_query": true, "start_date": "2025-11-09", "end_date": "2025-11-09", "query_type": "day"}
-"I'm feeling stressed" → {"is_calendar_query": false}
+"What's my schedule tomorrow?" →
+{"sentiment": {"sentiment": "neutral", "intensity": 0.2}, "event": null, "calendar_query": {"start_date": "2025-11-09", "end_date": "2025-11-09", "query_type": "day"}}
+
+"Show me events this week" →
+{"sentiment": {"sentiment": "neutral", "intensity": 0.2}, "event": null, "calendar_query": {"start_date": "2025-11-08", "end_date": "2025-11-14", "query_type": "week"}}
+
+"I don't know what to do anymore..." →
+{"sentiment": {"sentiment": "sad", "intensity": 0.8}, "event": null, "calendar_query": null}
+
+"I'm feeling stressed today" →
+{"sentiment": {"sentiment": "anxious", "intensity": 0.6}, "event": null, "calendar_query": null}
 """
-)
 
-def get_ai_chat_response(chat_history, detected_sentiment=None):
+# Every model call goes through one backend (LLM_BACKEND: gemini or fake),
+# addressed by role. Nothing talks to the network until the first call.
+MODEL_SPECS = {
+    'companion': {'system_instruction': EMOAI_INSTRUCTION},
+    'general': {},
+    'summarizer': {'system_instruction': SUMMARIZER_INSTRUCTION},
+    'sentiment': {'system_instruction': SENTIMENT_INSTRUCTION, 'json': True},
+    'understanding': {'system_instruction': UNDERSTANDING_INSTRUCTION, 'json': True},
+}
+
+llm = TracedBackend(make_backend(MODEL_SPECS))
+
+def _build_chat_turn(chat_history, detected_sentiment=None):
     last_user_message = chat_history[-1]['parts'][0]
     
     personality_context = ""
@@ -244,88 +250,430 @@ def get_ai_chat_response(chat_history, detected_sentiment=None):
         modified_history = chat_history[:-1]
         modified_message = last_user_message
     
-    chat_session = emoai_model.start_chat(history=modified_history)
-    response = chat_session.send_message(modified_message)
-    return response.text
+    return modified_history, modified_message
+
+def get_ai_chat_response(chat_history, detected_sentiment=None):
+    modified_history, modified_message = _build_chat_turn(chat_history, detected_sentiment)
+    return llm.chat('companion', modified_history, modified_message)
+
+async def get_ai_chat_response_async(chat_history, detected_sentiment=None):
+    modified_history, modified_message = _build_chat_turn(chat_history, detected_sentiment)
+    return await llm.chat_async('companion', modified_history, modified_message)
+
+def stream_ai_chat_response(chat_history, detected_sentiment=None):
+    """Yield the reply text piece by piece as Gemini generates it"""
+    modified_history, modified_message = _build_chat_turn(chat_history, detected_sentiment)
+    yield from llm.stream_chat('companion', modified_history, modified_message)
+
+async def stream_ai_chat_response_async(chat_history, detected_sentiment=None):
+    modified_history, modified_message = _build_chat_turn(chat_history, detected_sentiment)
+    async for text in llm.stream_chat_async('companion', modified_history, modified_message):
+        yield text
 
 def summarize_chat_as_journal(full_chat_history_text):
     prompt = f"Here is the chat conversation:\n\n{full_chat_history_text}\n\n"
-    response = summarizer_model.generate_content(prompt)
-    return response.text
+    return llm.generate('summarizer', prompt)
 
-def extract_event_from_message(user_message, current_datetime):
-    import json
-    import re
-    from datetime import datetime
-    
+async def summarize_chat_as_journal_async(full_chat_history_text):
+    prompt = f"Here is the chat conversation:\n\n{full_chat_history_text}\n\n"
+    return await llm.generate_async('summarizer', prompt)
+
+def get_ai_response_simple(prompt):
+    """One-off prompt with no persona or history, e.g. sleep insights"""
+    return llm.generate('general', prompt).strip()
+
+async def get_ai_response_simple_async(prompt):
+    return (await llm.generate_async('general', prompt)).strip()
+
+def _compaction_prompt(previous_summary, turns):
+    conversation = "\n".join(
+        f"{'User' if turn['role'] == 'user' else 'EmoAI'}: {turn['parts'][0]}"
+        for turn in turns
+    )
+    return (
+        "This summary will replace the earlier part of an ongoing conversation, "
+        "so keep every fact, feeling, goal and plan that later replies may need. "
+        "Keep it under 200 words.\n\n"
+        f"Summary so far:\n{previous_summary or '(none)'}\n\n"
+        f"Conversation since then:\n{conversation}\n\n"
+    )
+
+def summarize_conversation_context(previous_summary, turns):
+    """Fold older chat turns into the running summary that stands in for them"""
+    return llm.generate('summarizer', _compaction_prompt(previous_summary, turns)).strip()
+
+async def summarize_conversation_context_async(previous_summary, turns):
+    return (await llm.generate_async('summarizer', _compaction_prompt(previous_summary, turns))).strip()
+
+# Cheap local gate in front of event extraction and calendar-query detection.
+# A message can only hold an event or a calendar question if it mentions a
+# time/date or talks about plans; everything else just needs sentiment, which
+# the much smaller sentiment prompt handles.
+_WEEKDAYS = (r'monday|tuesday|wednesday|thursday|friday|saturday|sunday'
+             r'|mon|tue|tues|thu|thur|thurs|fri|(?:on|this|next) (?:sat|sun|wed)')
+_MONTHS = (r'january|february|march|april|june|july|august|september|october|november|december'
+           r'|jan|feb|apr|jun|jul|aug|sep|sept|oct|nov|dec'
+           r'|(?:mar|may) \d{1,2}|\d{1,2}(?:st|nd|rd|th)? (?:of )?(?:mar|may)'
+           r'|(?:in|by|during|until|till|since|early|mid|late|next|last) (?:mar|may)')
+_NUMBER_WORDS = r'\d+|a|an|one|two|three|four|five|six|seven|eight|nine|ten|couple(?: of)?|few'
+
+# "May" and "Mar" only count next to a day number or a preposition, so
+# "I may just give up" stays a feelings-only message. "today" and "tonight"
+# also let through some feelings ("stressed today"), which costs an extra
+# model call but never loses a same-day plan.
+TEMPORAL_PATTERN = re.compile(
+    r'\b(?:'
+    rf'(?:{_WEEKDAYS})s?'
+    rf'|(?:{_MONTHS})\.?'
+    r'|today|tonight|tonite|tomorrow|tomorow|tmrw|tmr|day after|weekend|coming up|upcoming'
+    r'|(?:this|next|coming|following|upcoming) (?:week|month|year|morning|afternoon|evening|night)'
+    rf'|in (?:{_NUMBER_WORDS}) (?:min(?:ute)?s?|hours?|hrs?|days?|weeks?|months?)'
+    r'|noon|midnight'
+    r'|\d{1,2}(?::\d{2})? ?(?:am|pm|a\.m\.|p\.m\.)'
+    r"|\d{1,2}:\d{2}|\d{1,2} ?o'?clock|at \d{1,2}(?::\d{2})?"
+    r'|\d{1,2}(?:st|nd|rd|th)'
+    r'|\d{1,4}[/-]\d{1,2}(?:[/-]\d{1,4})?'
+    r')\b',
+    re.IGNORECASE
+)
+
+# Only words for the calendar and what goes in it. Question phrasings like
+# "what's on", "am I free" or "is there anything" also fit feelings ("What's
+# on your mind?", "Am I free to just feel sad?"), so they only pass along
+# with one of these words or a time from TEMPORAL_PATTERN.
+CALENDAR_INTENT_PATTERN = re.compile(
+    r"\b(?:calend[ae]r|schedul\w*|agenda|plans?|planned|events?|appointments?|appt|meetings?"
+    r"|deadlines?|reservations?|booked|bookings?|interview|exam|class|party|trip|flight|remind\w*)\b",
+    re.IGNORECASE
+)
+
+_prefilter_lock = threading.Lock()
+_prefilter_stats = {
+    'messages_checked': 0,
+    'messages_passed': 0,
+    'messages_filtered': 0,
+    'calendar_resolved_locally': 0,
+    'llm_calls_skipped': 0
+}
+
+def _count_prefilter(**increments):
+    with _prefilter_lock:
+        for key, amount in increments.items():
+            _prefilter_stats[key] += amount
+
+def get_prefilter_stats():
+    with _prefilter_lock:
+        return dict(_prefilter_stats)
+
+def might_mention_event_or_calendar(user_message):
+    """True if the message could plausibly hold an event or a calendar query"""
+    return bool(TEMPORAL_PATTERN.search(user_message) or CALENDAR_INTENT_PATTERN.search(user_message))
+
+def prefilter_message(user_message):
+    passed = might_mention_event_or_calendar(user_message)
+    _count_prefilter(messages_checked=1, messages_passed=int(passed), messages_filtered=int(not passed))
+    return passed
+
+SENTIMENT_CATEGORIES = ('happy', 'sad', 'anxious', 'frustrated', 'neutral', 'confused')
+CALENDAR_QUERY_TYPES = ('day', 'week', 'month', 'specific')
+NEUTRAL_SENTIMENT = {"sentiment": "neutral", "intensity": 0.5}
+
+def _to_datetime(current_datetime):
+    if current_datetime is None:
+        return datetime.now(pytz.timezone('Asia/Kolkata'))
     if isinstance(current_datetime, str):
-        current_datetime = datetime.fromisoformat(current_datetime)
+        return datetime.fromisoformat(current_datetime)
+    return current_datetime
+
+def _valid_date(value):
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _valid_time(value):
+    try:
+        datetime.strptime(value, '%H:%M')
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def validate_sentiment(sentiment):
+    if not isinstance(sentiment, dict):
+        raise ValueError("missing 'sentiment' object")
+    category = str(sentiment.get('sentiment', '')).lower()
+    if category not in SENTIMENT_CATEGORIES:
+        raise ValueError(f"unknown sentiment category: {category!r}")
+    try:
+        intensity = float(sentiment.get('intensity', 0.5))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid intensity: {sentiment.get('intensity')!r}")
+    return {'sentiment': category, 'intensity': min(max(intensity, 0.0), 1.0)}
+
+def validate_understanding(data, user_message):
+    """Check a fused understanding response against its schema and normalize it.
+
+    Raises ValueError when a required part is missing or malformed. Optional
+    parts (event, calendar_query) that fail validation are dropped to None.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("understanding response is not a JSON object")
     
-    formatted_datetime = current_datetime.strftime("%A, %B %d, %Y at %I:%M %p")
-    prompt = f"Current date and time: {formatted_datetime}\nUser message: {user_message}"
+    sentiment = validate_sentiment(data.get('sentiment'))
     
-    try:
-        response = event_extractor_model.generate_content(prompt)
-        result = response.text.strip()
+    event = data.get('event')
+    if not (isinstance(event, dict) and event.get('title') and _valid_date(event.get('date'))):
+        event = None
+    else:
+        event = {
+            'has_event': True,
+            'title': event['title'],
+            'date': event['date'],
+            'time': event.get('time') if _valid_time(event.get('time')) else None,
+            'location': event.get('location') or None,
+            'original_message': user_message
+        }
+    
+    calendar_query = data.get('calendar_query')
+    if not (isinstance(calendar_query, dict)
+            and _valid_date(calendar_query.get('start_date'))
+            and _valid_date(calendar_query.get('end_date'))):
+        calendar_query = None
+    else:
+        query_type = calendar_query.get('query_type')
+        calendar_query = {
+            'is_calendar_query': True,
+            'start_date': calendar_query['start_date'],
+            'end_date': calendar_query['end_date'],
+            'query_type': query_type if query_type in CALENDAR_QUERY_TYPES else 'specific'
+        }
+    
+    return {
+        'sentiment': sentiment,
+        'event': event,
+        'calendar_query': calendar_query
+    }
+
+# Users repeat short messages ("hi", "thanks", "what's on my calendar?") all
+# the time, so classifier results are cached on the normalized text. Results
+# that depend on the date also key on the IST date. With the sqlite or redis
+# backend all gunicorn workers share the results. The backend follows
+# CACHE_BACKEND unless CLASSIFIER_CACHE_BACKEND overrides it.
+CLASSIFIER_CACHE_TTL_SECONDS = int(os.environ.get('CLASSIFIER_CACHE_TTL_SECONDS', '86400'))
+
+classifier_cache = make_cache(
+    backend=os.environ.get('CLASSIFIER_CACHE_BACKEND') or os.environ.get('CACHE_BACKEND', 'memory'),
+    path=os.environ.get('CLASSIFIER_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'classifier_cache.db')),
+    max_entries=int(os.environ.get('CLASSIFIER_CACHE_SIZE', '2048')),
+    default_ttl=CLASSIFIER_CACHE_TTL_SECONDS
+)
+
+def normalize_message(user_message):
+    return ' '.join(user_message.lower().split()).strip(' .!?~')
+
+def _classifier_cache_key(kind, user_message, current_datetime=None):
+    digest = hashlib.sha256(normalize_message(user_message).encode('utf-8')).hexdigest()
+    if current_datetime is None:
+        return f"classifier:{kind}:{digest}"
+    return f"classifier:{kind}:{current_datetime.date().isoformat()}:{digest}"
+
+def get_classifier_cache_stats():
+    return classifier_cache.stats.as_dict()
+
+def _parse_json_response(text):
+    result = text.strip()
+    json_match = re.search(r'\{[\s\S]*\}', result)
+    if not json_match:
+        raise ValueError(f"no JSON object in response: {result}")
+    return json.loads(json_match.group(0))
+
+def _generate_json(role, prompt):
+    return _parse_json_response(llm.generate(role, prompt))
+
+async def _generate_json_async(role, prompt):
+    return _parse_json_response(await llm.generate_async(role, prompt))
+
+def _understanding_prompt(user_message, current_datetime):
+    formatted_datetime = current_datetime.strftime("%A, %B %d, %Y at %I:%M %p")
+    return f"Current date and time: {formatted_datetime}\nUser message: {user_message}"
+
+def _cached_understanding(cache_key, user_message):
+    cached = classifier_cache.get(cache_key)
+    if cached is None:
+        return None
+    understanding = copy.deepcopy(cached)
+    if understanding['event']:
+        understanding['event']['original_message'] = user_message
+    return understanding
+
+def _analyze_sentiment_only(user_message):
+    with span('classify.sentiment') as s:
+        cache_key = _classifier_cache_key('sentiment', user_message)
+        cached = classifier_cache.get(cache_key)
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            return dict(cached)
         
-        if result == "NO_EVENT" or "NO_EVENT" in result:
-            return None
+        try:
+            sentiment = validate_sentiment(_generate_json('sentiment', user_message))
+        except Exception as e:
+            log.warning("Sentiment analysis error: %s", e)
+            return dict(NEUTRAL_SENTIMENT)
         
-        json_match = re.search(r'\{[\s\S]*\}', result)
-        if json_match:
-            json_str = json_match.group(0)
-            event_data = json.loads(json_str)
-            if event_data.get('has_event'):
-                return event_data
-        return None
-    except Exception as e:
-        print(f"Event extraction error: {e}")
-        print(f"Raw response: {result if 'result' in locals() else 'No response'}")
+        classifier_cache.set(cache_key, sentiment)
+        return dict(sentiment)
+
+async def _analyze_sentiment_only_async(user_message):
+    with span('classify.sentiment') as s:
+        cache_key = _classifier_cache_key('sentiment', user_message)
+        cached = classifier_cache.get(cache_key)
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            return dict(cached)
+        
+        try:
+            sentiment = validate_sentiment(await _generate_json_async('sentiment', user_message))
+        except Exception as e:
+            log.warning("Sentiment analysis error: %s", e)
+            return dict(NEUTRAL_SENTIMENT)
+        
+        classifier_cache.set(cache_key, sentiment)
+        return dict(sentiment)
+
+def _understand_with_model(user_message, current_datetime):
+    with span('classify.understanding') as s:
+        current_datetime = _to_datetime(current_datetime)
+        cache_key = _classifier_cache_key('understanding', user_message, current_datetime)
+        cached = _cached_understanding(cache_key, user_message)
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+        
+        prompt = _understanding_prompt(user_message, current_datetime)
+        try:
+            understanding = validate_understanding(_generate_json('understanding', prompt), user_message)
+        except Exception as e:
+            log.warning("Message understanding error: %s", e)
+            return {'sentiment': dict(NEUTRAL_SENTIMENT), 'event': None, 'calendar_query': None}
+        
+        classifier_cache.set(cache_key, understanding)
+        return copy.deepcopy(understanding)
+
+async def _understand_with_model_async(user_message, current_datetime):
+    with span('classify.understanding') as s:
+        current_datetime = _to_datetime(current_datetime)
+        cache_key = _classifier_cache_key('understanding', user_message, current_datetime)
+        cached = _cached_understanding(cache_key, user_message)
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+        
+        prompt = _understanding_prompt(user_message, current_datetime)
+        try:
+            understanding = validate_understanding(await _generate_json_async('understanding', prompt), user_message)
+        except Exception as e:
+            log.warning("Message understanding error: %s", e)
+            return {'sentiment': dict(NEUTRAL_SENTIMENT), 'event': None, 'calendar_query': None}
+        
+        classifier_cache.set(cache_key, understanding)
+        return copy.deepcopy(understanding)
+
+def understand_message(user_message, current_datetime=None):
+    """Sentiment, event extraction and calendar-query detection in a single model call"""
+    if not prefilter_message(user_message):
+        # No date words and no talk of plans: the event and calendar parts
+        # of the fused call would come back null, so only ask for sentiment.
+        _count_prefilter(llm_calls_skipped=2)
+        annotate(path='sentiment_only')
+        return {'sentiment': _analyze_sentiment_only(user_message), 'event': None, 'calendar_query': None}
+    
+    current_datetime = _to_datetime(current_datetime)
+    calendar_query = resolve_calendar_query(user_message, current_datetime)
+    if calendar_query:
+        # A schedule question with a range we can work out locally; it does
+        # not announce a new event either, so sentiment is all that is left.
+        _count_prefilter(calendar_resolved_locally=1, llm_calls_skipped=2)
+        annotate(path='calendar_local')
+        return {'sentiment': _analyze_sentiment_only(user_message), 'event': None, 'calendar_query': calendar_query}
+    
+    return _understand_with_model(user_message, current_datetime)
+
+async def understand_message_async(user_message, current_datetime=None):
+    """understand_message on the event loop, for the ASGI chat route"""
+    if not prefilter_message(user_message):
+        _count_prefilter(llm_calls_skipped=2)
+        annotate(path='sentiment_only')
+        return {'sentiment': await _analyze_sentiment_only_async(user_message), 'event': None, 'calendar_query': None}
+    
+    current_datetime = _to_datetime(current_datetime)
+    calendar_query = resolve_calendar_query(user_message, current_datetime)
+    if calendar_query:
+        _count_prefilter(calendar_resolved_locally=1, llm_calls_skipped=2)
+        annotate(path='calendar_local')
+        return {'sentiment': await _analyze_sentiment_only_async(user_message), 'event': None, 'calendar_query': calendar_query}
+    
+    return await _understand_with_model_async(user_message, current_datetime)
+
+def extract_event_from_message(user_message, current_datetime):
+    if not prefilter_message(user_message):
+        _count_prefilter(llm_calls_skipped=1)
         return None
+    return _understand_with_model(user_message, current_datetime)['event']
 
 def analyze_sentiment(user_message):
-    import json
-    import re
-    try:
-        response = sentiment_analyzer_model.generate_content(user_message)
-        result = response.text.strip()
-        
-        json_match = re.search(r'\{[\s\S]*\}', result)
-        if json_match:
-            json_str = json_match.group(0)
-            sentiment_data = json.loads(json_str)
-            return sentiment_data
-        
-        print(f"No JSON found in sentiment response: {result}")
-        return {"sentiment": "neutral", "intensity": 0.5}
-    except Exception as e:
-        print(f"Sentiment analysis error: {e}")
-        print(f"Raw response: {result if 'result' in locals() else 'No response'}")
-        return {"sentiment": "neutral", "intensity": 0.5}
+    return _understand_with_model(user_message, None)['sentiment']
 
 def detect_calendar_query(user_message, current_datetime):
-    import json
-    import re
-    from datetime import datetime
+    if not prefilter_message(user_message):
+        _count_prefilter(llm_calls_skipped=1)
+        return None
+    calendar_query = resolve_calendar_query(user_message, _to_datetime(current_datetime))
+    if calendar_query:
+        _count_prefilter(calendar_resolved_locally=1, llm_calls_skipped=1)
+        return calendar_query
+    return _understand_with_model(user_message, current_datetime)['calendar_query']
+
+def classify_message(user_message, current_datetime, timeout=None):
+    """Understand a message under a deadline; returns (sentiment, event, calendar_query)"""
+    if timeout is None:
+        timeout = CLASSIFIER_TIMEOUT_SECONDS
     
-    if isinstance(current_datetime, str):
-        current_datetime = datetime.fromisoformat(current_datetime)
+    with span('classify') as s:
+        # Run in a copy of this context so the pool thread's spans join the request's trace
+        future = classifier_executor.submit(contextvars.copy_context().run, understand_message, user_message, current_datetime)
+        try:
+            understanding = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            s.set(timed_out=True)
+            log.warning("Message understanding timed out after %ss, using fallback", timeout)
+            return dict(NEUTRAL_SENTIMENT), None, None
+        except Exception as e:
+            # Model errors are handled inside; this catches everything else
+            # (the calendar resolver, the cache, a shut-down pool) so a chat
+            # turn never fails on classification
+            s.error = True
+            log.error("Message understanding failed, using fallback: %s", e)
+            return dict(NEUTRAL_SENTIMENT), None, None
     
-    formatted_datetime = current_datetime.strftime("%A, %B %d, %Y at %I:%M %p")
-    prompt = f"Current date and time: {formatted_datetime}\nUser message: {user_message}"
+    return understanding['sentiment'], understanding['event'], understanding['calendar_query']
+
+async def classify_message_async(user_message, current_datetime, timeout=None):
+    """classify_message without a pool thread; the deadline is enforced on the event loop"""
+    if timeout is None:
+        timeout = CLASSIFIER_TIMEOUT_SECONDS
     
-    try:
-        response = calendar_query_model.generate_content(prompt)
-        result = response.text.strip()
-        
-        json_match = re.search(r'\{[\s\S]*\}', result)
-        if json_match:
-            json_str = json_match.group(0)
-            calendar_data = json.loads(json_str)
-            if calendar_data.get('is_calendar_query'):
-                return calendar_data
-        return None
-    except Exception as e:
-        print(f"Calendar query detection error: {e}")
-        print(f"Raw response: {result if 'result' in locals() else 'No response'}")
-        return None
+    with span('classify') as s:
+        try:
+            understanding = await asyncio.wait_for(understand_message_async(user_message, current_datetime), timeout)
+        except asyncio.TimeoutError:
+            s.set(timed_out=True)
+            log.warning("Message understanding timed out after %ss, using fallback", timeout)
+            return dict(NEUTRAL_SENTIMENT), None, None
+        except Exception as e:
+            s.error = True
+            log.error("Message understanding failed, using fallback: %s", e)
+            return dict(NEUTRAL_SENTIMENT), None, None
+    
+    return understanding['sentiment'], understanding['event'], understanding['calendar_query']
@@ -0,0 +1,178 @@
+import math
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func
+
+from journals import as_date, bucket_start, sql_day
+from models import db, Journal, UserSentiment, SleepLog
+from tracing import span
+from wellness import mood_value, night_score
+
+try:
+    import numpy as np
+except ImportError:  # optional; the plain-Python path returns the same numbers
+    np = None
+
+# Time series for the analytics charts: journal moods, chat sentiment and
+# sleep, bucketed by day, week or month over any range.
+#
+# Each metric is one query grouped by day (and category), so even years of
+# history come back as at most a few thousand small rows. Those are mapped to
+# buckets, and consecutive buckets are merged `stride` at a time so no more
+# than `points` come back. Merging sums the counts and totals of the merged
+# buckets before dividing, so a downsampled mean is the true mean of its
+# span, not a sample. The sums are NumPy bincounts when NumPy is installed.
+#
+# The result is columnar: one shared `t` list of bucket start dates, and per
+# metric one list per column, aligned with `t`. Buckets where a metric has no
+# data hold a count of 0 and null means.
+
+BUCKETS = ('day', 'week', 'month')
+METRICS = ('mood', 'sentiment', 'sleep')
+DEFAULT_POINTS = 120
+MAX_POINTS = 1000
+
+
+def _bucket_index(day, origin, bucket):
+    """Position of day's bucket counted from the bucket starting at `origin`"""
+    if bucket == 'month':
+        return (day.year - origin.year) * 12 + day.month - origin.month
+    return (bucket_start(day, bucket) - origin).days // (7 if bucket == 'week' else 1)
+
+
+def _nth_bucket(origin, index, bucket):
+    if bucket == 'month':
+        months = origin.month - 1 + index
+        return date(origin.year + months // 12, months % 12 + 1, 1)
+    return origin + timedelta(days=index * (7 if bucket == 'week' else 1))
+
+
+def _sums(groups, weights, size):
+    """Total of `weights` per group index"""
+    if np is not None:
+        return np.bincount(groups, weights=np.asarray(weights, dtype=np.float64), minlength=size).tolist()
+    sums = [0.0] * size
+    for group, weight in zip(groups, weights):
+        sums[group] += weight
+    return sums
+
+
+def _category_sums(groups, codes, weights, size, categories):
+    """Total of `weights` per category code and group index, as one list per category"""
+    if np is not None:
+        flat = np.bincount(np.asarray(codes, dtype=np.int64) * size + groups,
+                           weights=np.asarray(weights, dtype=np.float64), minlength=categories * size)
+        return flat.reshape(categories, size).tolist()
+    sums = [[0.0] * size for _ in range(categories)]
+    for group, code, weight in zip(groups, codes, weights):
+        sums[code][group] += weight
+    return sums
+
+
+def _mean(total, count):
+    return round(total / count, 2) if count else None
+
+
+def _mood_rows(user_id, start, end, dialect):
+    day = sql_day(Journal.timestamp, dialect)
+    # Whole-day bounds on the raw column so ix_journals_user_timestamp serves the range
+    query = db.session.query(day, Journal.mood, func.count()).filter(Journal.user_id == user_id)
+    if start is not None:
+        query = query.filter(Journal.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(Journal.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return [(as_date(d), mood.lower(), {'count': n, 'score': mood_value(mood) * n})
+            for d, mood, n in query.group_by(day, Journal.mood)]
+
+
+def _sentiment_rows(user_id, start, end, dialect):
+    day = sql_day(UserSentiment.timestamp, dialect)
+    query = db.session.query(day, UserSentiment.sentiment, func.count(), func.sum(func.coalesce(UserSentiment.intensity, 0.5)))
+    query = query.filter(UserSentiment.user_id == user_id)
+    if start is not None:
+        query = query.filter(UserSentiment.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(UserSentiment.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return [(as_date(d), sentiment.lower(), {'count': n, 'intensity': float(total or 0)})
+            for d, sentiment, n, total in query.group_by(day, UserSentiment.sentiment)]
+
+
+def _sleep_rows(user_id, start, end, dialect):
+    query = db.session.query(SleepLog.date, SleepLog.hours_slept, SleepLog.quality_rating).filter(SleepLog.user_id == user_id)
+    if start is not None:
+        query = query.filter(SleepLog.date >= start)
+    if end is not None:
+        query = query.filter(SleepLog.date <= end)
+    rows = []
+    for day, hours, quality in query:
+        row = {'count': 1, 'score': night_score(hours, quality)}
+        if hours is not None:
+            row.update(hours_count=1, hours=hours)
+        if quality:
+            row.update(quality_count=1, quality=quality)
+        rows.append((day, None, row))
+    return rows
+
+
+# metric: (row loader, summed columns, means as (name, total column, count column), category column name)
+SOURCES = {
+    'mood': (_mood_rows, ('count', 'score'), (('score', 'score', 'count'),), 'moods'),
+    'sentiment': (_sentiment_rows, ('count', 'intensity'), (('intensity', 'intensity', 'count'),), 'sentiments'),
+    'sleep': (_sleep_rows, ('count', 'score', 'hours', 'hours_count', 'quality', 'quality_count'),
+              (('score', 'score', 'count'), ('hours', 'hours', 'hours_count'), ('quality', 'quality', 'quality_count')), None),
+}
+
+
+def series(user_id, bucket='week', start=None, end=None, points=DEFAULT_POINTS, metrics=METRICS):
+    """Columnar series of `metrics` from start to end (inclusive; None for all history), at most `points` long"""
+    with span('analytics.series', bucket=bucket) as s:
+        dialect = db.session.get_bind().dialect.name
+        loaded = {name: SOURCES[name][0](user_id, start, end, dialect) for name in metrics}
+
+        days = [row[0] for rows in loaded.values() for row in rows]
+        first = start or (min(days) if days else None)
+        last = end or (max(days) if days else None)
+        result = {'bucket': bucket, 'stride': 1, 'start': first and first.isoformat(), 'end': last and last.isoformat(), 't': []}
+        if first is None or last is None or first > last:
+            for name in metrics:
+                _, _, means, category_name = SOURCES[name]
+                result[name] = {'count': [], **{mean_name: [] for mean_name, _, _ in means}}
+                if category_name:
+                    result[name][category_name] = {}
+            return result
+
+        origin = bucket_start(first, bucket)
+        buckets = _bucket_index(last, origin, bucket) + 1
+        stride = max(1, math.ceil(buckets / points))
+        size = math.ceil(buckets / stride)
+
+        columns = {}
+        for name in metrics:
+            _, summed, means, category_name = SOURCES[name]
+            rows = loaded[name]
+            groups = [_bucket_index(day, origin, bucket) // stride for day, _, _ in rows]
+            if np is not None:
+                groups = np.asarray(groups, dtype=np.int64)
+            sums = {column: _sums(groups, [values.get(column, 0) for _, _, values in rows], size) for column in summed}
+            categories = {}
+            if category_name:
+                names = sorted({category for _, category, _ in rows})
+                code = {category: i for i, category in enumerate(names)}
+                counts = _category_sums(groups, [code[category] for _, category, _ in rows],
+                                        [values['count'] for _, _, values in rows], size, len(names))
+                categories = dict(zip(names, counts))
+            columns[name] = (sums, means, category_name, categories)
+
+        # Keep the groups where any metric has data
+        kept = [g for g in range(size) if any(sums['count'][g] for sums, _, _, _ in columns.values())]
+        result['stride'] = stride
+        result['t'] = [_nth_bucket(origin, g * stride, bucket).isoformat() for g in kept]
+        for name, (sums, means, category_name, categories) in columns.items():
+            out = {'count': [int(sums['count'][g]) for g in kept]}
+            for mean_name, total, count in means:
+                out[mean_name] = [_mean(sums[total][g], sums[count][g]) for g in kept]
+            if category_name:
+                out[category_name] = {c: [int(counts[g]) for g in kept] for c, counts in categories.items()}
+            result[name] = out
+        s.set(points=len(kept), rows=len(days))
+        return result
@@ -1,16 +1,31 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, flash, session, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_bcrypt import Bcrypt
-from models import db, User, UserProfile, Journal, ChatMessage, HabitProgress, Reminder, Goal, Activity, MotivationMessage, SleepLog, Event, UserSentiment, GoogleCalendarToken
+from app_logging import configure_logging, get_log_stats
+from cache import make_cache
+from calendar_service import CalendarService, describe_event
+from db_engine import database_url, engine_options, configure_engine
+from chat_state import ConversationState, ConversationStateCache, estimate_tokens, get_token_stats, record_token_usage
+import migrations
+import tracing
+from tracing import span
+from models import db, User, UserProfile, Journal, ChatMessage, HabitProgress, Reminder, Goal, Activity, MotivationMessage, SleepLog, Event, UserSentiment, GoogleCalendarToken, ChatSessionSummary
+from journals import BUCKETS, MAX_PAGE_SIZE, PAGE_SIZE, journal_count, journal_dict, journal_page, mood_series
+import analytics
+import sentiment_trends
+import wellness
+from wellness import compute_wellness, record_journal, record_sleep, record_activity
 import os
 import sys
+import json
+import logging
 import secrets
 import random
 from datetime import datetime, date, timedelta
 import pytz
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'attached_assets'))
-from ai_core_1762554001118 import get_ai_chat_response, summarize_chat_as_journal, extract_event_from_message, analyze_sentiment, detect_calendar_query
+from ai_core_1762554001118 import get_ai_chat_response, stream_ai_chat_response, summarize_chat_as_journal, summarize_conversation_context, classify_message, get_ai_response_simple, get_prefilter_stats, get_classifier_cache_stats
 
 IST = pytz.timezone('Asia/Kolkata')
 
@@ -21,9 +36,13 @@ def get_ist_date():
     return get_ist_now().date()
 
 app = Flask(__name__)
+configure_logging(app)
+chat_log = logging.getLogger('emoai.chat')
+reminder_log = logging.getLogger('emoai.reminders')
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///vibe_journal.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url()
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
 app.config['SESSION_COOKIE_SECURE'] = os.environ.get('REPL_SLUG') is not None
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -32,16 +51,125 @@ app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
 app.config['SESSION_PERMANENT'] = True
 
 db.init_app(app)
+with app.app_context():
+    configure_engine(db.engine)
 bcrypt = Bcrypt(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+# Per-worker cache of chat session history so each turn only reads the rows
+# stored since the previous one instead of replaying the whole session.
+chat_states = ConversationStateCache(
+    max_sessions=int(os.environ.get('CHAT_STATE_MAX_SESSIONS', '500')),
+    ttl_seconds=int(os.environ.get('CHAT_STATE_TTL_SECONDS', '1800'))
+)
+CHAT_HISTORY_WINDOW = int(os.environ.get('CHAT_HISTORY_WINDOW', '40'))
+# Once a session's unsummarized history passes the token budget (or the
+# window), older turns are folded into a stored running summary and only the
+# last CHAT_COMPACTION_KEEP_TURNS turns are kept verbatim.
+CHAT_TOKEN_BUDGET = int(os.environ.get('CHAT_TOKEN_BUDGET', '3000'))
+CHAT_COMPACTION_KEEP_TURNS = int(os.environ.get('CHAT_COMPACTION_KEEP_TURNS', '10'))
+# A chat turn's rows (the user's message, its sentiment, any detected event,
+# a compaction summary and the reply) go out in one commit once the reply is
+# in, and nothing is flushed while the model runs, so no write lock is held
+# across the call. If the turn fails, the user's message is still committed,
+# marked 'pending' (unanswered). CHAT_COMMIT_MODE=eager also commits it as
+# 'pending' before the model is called, so it survives a worker crash mid-turn
+# at the cost of a second commit.
+CHAT_COMMIT_MODE = os.environ.get('CHAT_COMMIT_MODE', 'turn')
+
+# Cache for hot per-user reads. Keys live under "user:<id>:" so a write can
+# drop everything derived for a user, but only in a cache that worker can
+# reach: with a per-worker memory cache the other gunicorn workers would keep
+# serving stale reminders and events until the TTL ran out. So these entries
+# always go to a shared backend, CACHE_BACKEND if it is sqlite or redis and
+# the sqlite file otherwise. USER_CACHE_BACKEND=memory is for a single process.
+USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND') or (
+    'redis' if os.environ.get('CACHE_BACKEND') == 'redis' else 'sqlite'
+)
+app_cache = make_cache(
+    backend=USER_CACHE_BACKEND,
+    max_entries=int(os.environ.get('CACHE_SIZE', '4096')),
+    default_ttl=int(os.environ.get('CACHE_TTL_SECONDS', '300'))
+)
+
+def user_cache_key(user_id, name):
+    return f"user:{user_id}:{name}"
+
+def invalidate_user_cache(user_id, name=None):
+    if name is None:
+        app_cache.invalidate_prefix(user_cache_key(user_id, ''))
+    else:
+        app_cache.delete(user_cache_key(user_id, name))
+
+event_calendar = CalendarService(app_cache, user_cache_key)
+
+def get_active_reminders(user_id):
+    """Active reminders as dicts; polled every minute by every open tab, so cached"""
+    key = user_cache_key(user_id, 'active_reminders')
+    with span('reminders.active') as s:
+        reminders = app_cache.get(key)
+        s.set(cache_hit=reminders is not None)
+        if reminders is None:
+            reminders = [{
+                'id': r.id,
+                'message': r.message,
+                'time': r.time
+            } for r in Reminder.query.filter_by(user_id=user_id, is_active=True).all()]
+            app_cache.set(key, reminders)
+    return reminders
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# SERVER_TIMING=1 adds each request's stage timings as a Server-Timing header
+# (browser devtools show it). Stage names and durations only, but still turn
+# it off for untrusted clients if that is too much to reveal.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+@app.before_request
+def start_request_trace():
+    tracing.start_trace(request.endpoint or 'unmatched')
+
+@app.after_request
+def finish_request_trace(response):
+    trace = tracing.current_trace()
+    # asgi.py's routes finish responses in steps; it ends their traces itself
+    if trace is None or trace.owned:
+        return response
+    if SERVER_TIMING:
+        # A streamed response's headers go out first, so its header only covers the stages before the stream
+        response.headers['Server-Timing'] = trace.server_timing()
+    if response.is_streamed:
+        status = response.status_code
+        response.call_on_close(lambda: tracing.end_trace(trace, status))
+    else:
+        tracing.end_trace(trace, response.status_code)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this worker; set METRICS_TOKEN to require a bearer token"""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return Response("unauthorized\n", status=401, mimetype='text/plain')
+    body = (tracing.metrics.render()
+            + tracing.render_stats('chat', get_token_stats(), 'Chat prompt token totals (chat_state).')
+            + tracing.render_stats('prefilter', get_prefilter_stats(), 'Message pre-filter counters.')
+            + tracing.render_stats('classifier_cache', get_classifier_cache_stats(), 'Classifier result cache.')
+            + tracing.render_stats('app_cache', app_cache.stats.as_dict(), 'Per-user read cache.')
+            + tracing.render_stats('log', get_log_stats(), 'Log records sampled out or dropped.'))
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+app.cli.add_command(migrations.cli)
+app.cli.add_command(wellness.cli)
+app.cli.add_command(sentiment_trends.cli)
+
 with app.app_context():
-    db.create_all()
+    # Set AUTO_MIGRATE=0 to run `flask --app app db upgrade` as a release step instead
+    for version, name, seconds in migrations.prepare_schema(os.environ.get('AUTO_MIGRATE', '1') == '1'):
+        app.logger.info("Applied migration %d (%s) in %.2fs", version, name, seconds)
 
 @app.route('/')
 def index():
@@ -166,151 +294,255 @@ def get_chat_history_from_db():
         })
     return history
 
-@app.route('/chat', methods=['POST'])
-@login_required
-def chat():
-    user_message = request.json.get('message', '')
-    
-    if not user_message:
-        return jsonify({'error': 'No message provided'}), 400
+def compaction_due(state):
+    return state.prompt_tokens() > CHAT_TOKEN_BUDGET or len(state.turns) > CHAT_HISTORY_WINDOW
+
+def compact_chat_state(state):
+    """Fold the turns outside the keep window into the session's running summary"""
+    turns, through_id = state.turns_to_compact(CHAT_COMPACTION_KEEP_TURNS)
+    if not turns:
+        return False
     
-    session_id = get_session_id()
+    try:
+        summary = summarize_conversation_context(state.summary, turns)
+    except Exception as e:
+        chat_log.warning("Chat compaction failed for session %s: %s", state.session_id, e)
+        return False
     
-    user_chat = ChatMessage(
+    store_compaction(state, summary, through_id)
+    return True
+
+def store_compaction(state, summary, through_id):
+    """Fold a new summary into the state and add its row to the database session"""
+    state.fold_into_summary(summary, through_id)
+    
+    # Stored alongside the turn's other rows, so it commits with the reply
+    summary_row = ChatSessionSummary.query.filter_by(session_id=state.session_id).first()
+    if summary_row is None:
+        summary_row = ChatSessionSummary(user_id=state.user_id, session_id=state.session_id)
+        db.session.add(summary_row)
+    elif summary_row.summarized_through_id >= through_id:
+        # Another worker stored a summary reaching as far; keep it
+        return
+    summary_row.summary = summary
+    summary_row.summarized_through_id = through_id
+    summary_row.summarized_tokens = state.summarized_tokens
+
+def get_chat_history(unsaved_message=None, compact=True):
+    """Recent history for the model, from the session cache plus any rows stored since
+
+    unsaved_message is the turn's user message when it is not in the database yet.
+    With compact=False an over-budget history is sent as it is, for the caller
+    to compact once the reply is out.
+    """
+    with span('chat.history') as s:
+        session_id = get_session_id()
+        state = chat_states.get(current_user.id, session_id)
+        s.set(cache_hit=state is not None)
+        if state is not None:
+            # Another worker may have compacted the session since this one
+            # cached it; new rows alone would never bring its summary in
+            stored_through_id = db.session.query(ChatSessionSummary.summarized_through_id).filter_by(
+                session_id=session_id).scalar()
+            if stored_through_id is not None and stored_through_id > state.summarized_through_id:
+                s.set(summary_reloaded=True)
+                state = None
+        if state is None:
+            state = ConversationState(current_user.id, session_id)
+            summary_row = ChatSessionSummary.query.filter_by(user_id=current_user.id, session_id=session_id).first()
+            if summary_row:
+                state.restore_summary(summary_row.summary, summary_row.summarized_through_id, summary_row.summarized_tokens)
+            chat_states.put(state)
+    
+        with state.lock:
+            new_messages = db.session.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+                ChatMessage.user_id == current_user.id,
+                ChatMessage.session_id == session_id,
+                ChatMessage.id > state.last_message_id
+            ).order_by(ChatMessage.id).all()
+            for message_id, role, content in new_messages:
+                state.append(message_id, role, content)
+        
+            compacted = False
+            if compact and compaction_due(state):
+                compacted = compact_chat_state(state)
+        
+            history = state.history_for_model(CHAT_HISTORY_WINDOW)
+            if unsaved_message is not None:
+                history.append({'role': 'user', 'parts': [unsaved_message]})
+            sent_tokens = state.prompt_tokens() + (estimate_tokens(unsaved_message) if unsaved_message else 0)
+            full_tokens = state.full_history_tokens()
+        s.set(new_rows=len(new_messages), history_tokens=sent_tokens, compacted=compacted)
+    
+    record_token_usage(sent_tokens, full_tokens, compacted)
+    chat_log.info("Chat prompt tokens: ~%d sent, ~%d full history%s",
+                  sent_tokens, full_tokens, " (compacted)" if compacted else "")
+    return history
+
+def begin_chat_turn(session_id, user_message, arrived_at=None):
+    """Add the user's message as a pending row; only eager mode commits it now"""
+    chat_message = ChatMessage(
         user_id=current_user.id,
         session_id=session_id,
         role='user',
-        content=user_message
+        content=user_message,
+        status='pending',
+        timestamp=arrived_at or get_ist_now()
     )
-    db.session.add(user_chat)
-    db.session.commit()
-    
+    db.session.add(chat_message)
+    if CHAT_COMMIT_MODE == 'eager':
+        with span('chat.begin'):
+            db.session.commit()
+    return chat_message
+
+def finish_chat_turn(user_row, session_id, ai_response):
+    """Mark the message answered and commit it with the reply and the turn's other rows"""
+    user_row.status = 'complete'
+    db.session.add(ChatMessage(
+        user_id=user_row.user_id,
+        session_id=session_id,
+        role='model',
+        content=ai_response
+    ))
+    adds_event = any(isinstance(obj, Event) for obj in db.session.new)
+    sentiments = [obj for obj in db.session.new if isinstance(obj, UserSentiment)]
+    with span('chat.commit', rows=len(db.session.new) + len(db.session.dirty)):
+        for sentiment in sentiments:
+            sentiment_trends.record(sentiment)
+        db.session.commit()
+    if adds_event:
+        event_calendar.invalidate(user_row.user_id)
+
+def abandon_chat_turn(session_id, user_message, arrived_at=None):
+    """After a failed turn, drop its rows but keep the user's message as pending"""
+    db.session.rollback()
+    if CHAT_COMMIT_MODE == 'eager':
+        return
     try:
-        detected_sentiment = analyze_sentiment(user_message)
-        
-        sentiment_record = UserSentiment(
-            user_id=current_user.id,
-            session_id=session_id,
-            sentiment=detected_sentiment['sentiment'],
-            intensity=detected_sentiment['intensity']
-        )
-        db.session.add(sentiment_record)
-        
-        current_datetime = get_ist_now()
-        detected_event = extract_event_from_message(user_message, current_datetime)
-        
-        event_data = None
-        if detected_event:
-            try:
-                event_date = datetime.strptime(detected_event['date'], '%Y-%m-%d').date()
-                event_time_str = detected_event.get('time')
-                
-                is_future_event = False
-                if event_date > get_ist_date():
-                    is_future_event = True
-                elif event_date == get_ist_date() and event_time_str:
-                    event_datetime = IST.localize(datetime.strptime(f"{detected_event['date']} {event_time_str}", '%Y-%m-%d %H:%M'))
-                    is_future_event = event_datetime > current_datetime
-                
-                if not is_future_event:
-                    print(f"Rejected past event: {event_date} {event_time_str}")
-                elif not detected_event.get('title'):
-                    print(f"Rejected event without title")
-                else:
-                    new_event = Event(
-                        user_id=current_user.id,
-                        title=detected_event['title'],
-                        event_date=event_date,
-                        event_time=detected_event.get('time'),
-                        location=detected_event.get('location'),
-                        created_from_message=user_message,
-                        is_confirmed=False
-                    )
-                    db.session.add(new_event)
-                    db.session.flush()
-                    
-                    event_data = {
-                        'id': new_event.id,
-                        'title': new_event.title,
-                        'date': new_event.event_date.isoformat(),
-                        'time': new_event.event_time,
-                        'location': new_event.location
-                    }
-            except Exception as event_error:
-                print(f"Error creating event: {event_error}")
-        
-        calendar_query_data = detect_calendar_query(user_message, current_datetime)
-        calendar_events_context = ""
-        
-        print(f"[CALENDAR QUERY DEBUG] User message: {user_message}")
-        print(f"[CALENDAR QUERY DEBUG] Calendar query data: {calendar_query_data}")
-        
-        if calendar_query_data:
-            start_date = datetime.strptime(calendar_query_data['start_date'], '%Y-%m-%d').date()
-            end_date = datetime.strptime(calendar_query_data['end_date'], '%Y-%m-%d').date()
-            
-            print(f"[CALENDAR QUERY DEBUG] Searching for events between {start_date} and {end_date}")
-            
-            all_events_in_range = Event.query.filter(
-                Event.user_id == current_user.id,
-                Event.event_date >= start_date,
-                Event.event_date <= end_date
-            ).order_by(Event.event_date, Event.event_time).all()
-            
-            print(f"[CALENDAR QUERY DEBUG] Total events in range: {len(all_events_in_range)}")
-            for evt in all_events_in_range:
-                print(f"  - {evt.title} on {evt.event_date} (confirmed: {evt.is_confirmed})")
-            
-            events = Event.query.filter(
-                Event.user_id == current_user.id,
-                Event.event_date >= start_date,
-                Event.event_date <= end_date
-            ).order_by(Event.event_date, Event.event_time).all()
+        begin_chat_turn(session_id, user_message, arrived_at)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        chat_log.error("Error saving pending chat message: %s", e)
+
+def event_payload(event):
+    return {
+        'id': event.id,
+        'title': event.title,
+        'date': event.event_date.isoformat(),
+        'time': event.event_time,
+        'location': event.location
+    }
+
+def prepare_chat_turn(user_message, session_id, classification=None, compact=True):
+    """Classify the message and build the model history; returns (sentiment, event, chat_history)
+
+    The sentiment row and any detected Event are only added to the session;
+    the caller commits them with the reply (finish_chat_turn) and reads the
+    event's id after that. classification is the (sentiment, event,
+    calendar_query) triple when the caller has already worked it out, as the
+    ASGI chat routes do. compact=False skips history compaction, which calls
+    the model; the ASGI routes compact after the response instead.
+    """
+    # Nothing is flushed until the turn commits, so no write transaction (on
+    # SQLite, no database lock) is held while the model runs
+    with db.session.no_autoflush:
+        return _prepare_chat_turn(user_message, session_id, classification, compact)
+
+def _prepare_chat_turn(user_message, session_id, classification, compact):
+    current_datetime = get_ist_now()
+    if classification is None:
+        classification = classify_message(user_message, current_datetime)
+    detected_sentiment, detected_event, calendar_query_data = classification
+    
+    sentiment_record = UserSentiment(
+        user_id=current_user.id,
+        session_id=session_id,
+        sentiment=detected_sentiment['sentiment'],
+        intensity=detected_sentiment['intensity']
+    )
+    db.session.add(sentiment_record)
+    
+    new_event = None
+    if detected_event:
+        try:
+            event_date = datetime.strptime(detected_event['date'], '%Y-%m-%d').date()
+            event_time_str = detected_event.get('time')
             
-            print(f"[CALENDAR QUERY DEBUG] All events: {len(events)}")
+            is_future_event = False
+            if event_date > get_ist_date():
+                is_future_event = True
+            elif event_date == get_ist_date() and event_time_str:
+                event_datetime = IST.localize(datetime.strptime(f"{detected_event['date']} {event_time_str}", '%Y-%m-%d %H:%M'))
+                is_future_event = event_datetime > current_datetime
             
-            if events:
-                events_list = []
-                for evt in events:
-                    event_info = f"- {evt.title} on {evt.event_date.strftime('%A, %B %d, %Y')}"
-                    if evt.event_time:
-                        event_info += f" at {evt.event_time}"
-                    if evt.location:
-                        event_info += f" (Location: {evt.location})"
-                    if not evt.is_confirmed:
-                        event_info += " (pending confirmation)"
-                    events_list.append(event_info)
-                
-                calendar_events_context = f"\n\n[CALENDAR EVENTS for your response]\nThe user has these events in their calendar:\n" + "\n".join(events_list) + "\n\nPlease present these events in a warm, conversational way. If any event is pending confirmation, gently remind them they can confirm it."
-                print(f"[CALENDAR QUERY DEBUG] Calendar events context added to AI")
+            if not is_future_event:
+                chat_log.info("Rejected past event: %s %s", event_date, event_time_str)
+            elif not detected_event.get('title'):
+                chat_log.info("Rejected event without title")
             else:
-                calendar_events_context = f"\n\n[CALENDAR EVENTS for your response]\nThe user has no events in this time period. Let them know gently that their calendar is clear for this time."
-                print(f"[CALENDAR QUERY DEBUG] No events found, telling AI calendar is clear")
+                # Model output; PostgreSQL rejects strings longer than the column
+                new_event = Event(
+                    user_id=current_user.id,
+                    title=detected_event['title'][:200],
+                    event_date=event_date,
+                    event_time=detected_event.get('time'),
+                    location=(detected_event.get('location') or '')[:200] or None,
+                    created_from_message=user_message,
+                    is_confirmed=False
+                )
+                db.session.add(new_event)
+        except Exception as event_error:
+            chat_log.warning("Error creating event: %s", event_error)
+    
+    calendar_events_context = ""
+    # From the messages before this one; the personality context covers this one
+    trend_context = sentiment_trends.prompt_context(current_user.id)
+    
+    if calendar_query_data:
+        start_date = datetime.strptime(calendar_query_data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(calendar_query_data['end_date'], '%Y-%m-%d').date()
+        events = event_calendar.events_between(current_user.id, start_date, end_date)
         
-        chat_history = get_chat_history_from_db()
-        
-        user_context = f"""
-        User's name: {current_user.profile.name}
-        User's goal: {current_user.profile.goal}
-        User's age: {current_user.profile.age if current_user.profile.age else 'Not specified'}
-        """
-        
-        if len(chat_history) == 1:
-            chat_history[0]['parts'][0] = f"{user_context}\n\nUser says: {chat_history[0]['parts'][0]}"
-        
-        if calendar_events_context:
-            chat_history[-1]['parts'][0] += calendar_events_context
+        if events:
+            calendar_events_context = f"\n\n[CALENDAR EVENTS for your response]\nThe user has these events in their calendar:\n" + "\n".join(describe_event(e) for e in events) + "\n\nPlease present these events in a warm, conversational way. If any event is pending confirmation, gently remind them they can confirm it."
+        else:
+            calendar_events_context = f"\n\n[CALENDAR EVENTS for your response]\nThe user has no events in this time period. Let them know gently that their calendar is clear for this time."
+    
+    chat_history = get_chat_history(None if CHAT_COMMIT_MODE == 'eager' else user_message, compact)
+    
+    user_context = f"""
+    User's name: {current_user.profile.name}
+    User's goal: {current_user.profile.goal}
+    User's age: {current_user.profile.age if current_user.profile.age else 'Not specified'}
+    """
+    
+    if len(chat_history) == 1:
+        chat_history[0]['parts'][0] = f"{user_context}\n\nUser says: {chat_history[0]['parts'][0]}"
+    
+    if calendar_events_context:
+        chat_history[-1]['parts'][0] += calendar_events_context
+    if trend_context:
+        chat_history[-1]['parts'][0] += trend_context
+    
+    return detected_sentiment, new_event, chat_history
+
+@app.route('/chat', methods=['POST'])
+@login_required
+def chat():
+    user_message = request.json.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    session_id = get_session_id()
+    user_row = begin_chat_turn(session_id, user_message)
+    
+    try:
+        detected_sentiment, new_event, chat_history = prepare_chat_turn(user_message, session_id)
         
         ai_response = get_ai_chat_response(chat_history, detected_sentiment)
-        
-        ai_chat = ChatMessage(
-            user_id=current_user.id,
-            session_id=session_id,
-            role='model',
-            content=ai_response
-        )
-        db.session.add(ai_chat)
-        db.session.commit()
+        finish_chat_turn(user_row, session_id, ai_response)
         
         response_data = {
             'response': ai_response,
@@ -318,16 +550,70 @@ def chat():
             'sentiment': detected_sentiment
         }
         
-        if event_data:
-            response_data['detected_event'] = event_data
+        if new_event:
+            response_data['detected_event'] = event_payload(new_event)
         
         return jsonify(response_data)
     except Exception as e:
+        abandon_chat_turn(session_id, user_message)
         return jsonify({
             'error': str(e),
             'success': False
         }), 500
 
+def sse_event(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/chat_stream', methods=['POST'])
+@login_required
+def chat_stream():
+    """Same as /chat, but streams the reply to the browser as server-sent events"""
+    user_message = request.json.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    session_id = get_session_id()
+    
+    def generate():
+        # The view's database session is closed once the response starts
+        # streaming, so re-attach the user to the one the generator runs in.
+        db.session.add(current_user._get_current_object())
+        user_row = begin_chat_turn(session_id, user_message)
+        settled = False
+        
+        try:
+            detected_sentiment, new_event, chat_history = prepare_chat_turn(user_message, session_id)
+            
+            yield sse_event('sentiment', detected_sentiment)
+            
+            chunks = []
+            for text in stream_ai_chat_response(chat_history, detected_sentiment):
+                chunks.append(text)
+                yield sse_event('token', {'text': text})
+            
+            # The turn is only stored once the whole stream has arrived; the
+            # event has no id before that, so it follows the tokens
+            finish_chat_turn(user_row, session_id, ''.join(chunks))
+            settled = True
+            if new_event:
+                yield sse_event('detected_event', event_payload(new_event))
+            yield sse_event('done', {'success': True})
+        except Exception as e:
+            settled = True
+            abandon_chat_turn(session_id, user_message)
+            yield sse_event('error', {'error': str(e), 'success': False})
+        finally:
+            if not settled:
+                # The client went away mid-stream (GeneratorExit, which
+                # except Exception misses); keep its message as pending
+                abandon_chat_turn(session_id, user_message)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/save_journal', methods=['POST'])
 @login_required
 def save_journal():
@@ -345,20 +631,39 @@ def save_journal():
         goal_progress=''
     )
     db.session.add(journal)
+    record_journal(journal)
     
     session_id = get_session_id()
     ChatMessage.query.filter_by(
         user_id=current_user.id,
         session_id=session_id
     ).delete()
+    ChatSessionSummary.query.filter_by(
+        user_id=current_user.id,
+        session_id=session_id
+    ).delete()
     
     db.session.commit()
+    chat_states.invalidate(session_id)
     
     session['chat_session_id'] = secrets.token_hex(16)
     session.modified = True
     
     return jsonify({'success': True, 'message': 'Journal entry saved!'})
 
+def build_journal_summary_prompt(chat_history):
+    full_chat_text = "\n".join([
+        f"{'User' if msg['role'] == 'user' else 'EmoAI'}: {msg['parts'][0]}"
+        for msg in chat_history
+    ])
+    
+    return f"""
+        User's name: {current_user.profile.name}
+        User's main goal: {current_user.profile.goal}
+        
+        {full_chat_text}
+        """
+
 @app.route('/get_summary', methods=['POST'])
 @login_required
 def get_summary():
@@ -368,18 +673,7 @@ def get_summary():
         return jsonify({'error': 'No chat history to summarize'}), 400
     
     try:
-        full_chat_text = "\n".join([
-            f"{'User' if msg['role'] == 'user' else 'EmoAI'}: {msg['parts'][0]}"
-            for msg in chat_history
-        ])
-        
-        summary_prompt = f"""
-        User's name: {current_user.profile.name}
-        User's main goal: {current_user.profile.goal}
-        
-        {full_chat_text}
-        """
-        
+        summary_prompt = build_journal_summary_prompt(chat_history)
         summary = summarize_chat_as_journal(summary_prompt)
         
         return jsonify({
@@ -395,21 +689,71 @@ def get_summary():
 @app.route('/journal')
 @login_required
 def journal_view():
-    journals = Journal.query.filter_by(user_id=current_user.id).order_by(Journal.timestamp.desc()).all()
-    return render_template('journal.html', journals=journals)
+    """The newest journal entries; older pages load from /get_journals"""
+    journals, next_cursor = journal_page(current_user.id)
+    return render_template('journal.html', journals=journals, next_cursor=next_cursor)
 
 @app.route('/journal/analytics')
 @login_required
 def journal_analytics():
-    """Journal analytics with graphs and AI insights"""
-    journals = Journal.query.filter_by(user_id=current_user.id).order_by(Journal.timestamp.asc()).all()
-    journals_data = [{
-        'timestamp': j.timestamp.isoformat(),
-        'mood': j.mood,
-        'summary': j.summary,
-        'goal_progress': j.goal_progress or ''
-    } for j in journals]
-    return render_template('journal_analytics.html', journals=journals, journals_data=journals_data)
+    """Journal analytics with graphs and AI insights; the charts load their data from the JSON endpoints"""
+    return render_template('journal_analytics.html', journal_count=journal_count(current_user.id))
+
+@app.route('/get_journals', methods=['GET'])
+@login_required
+def get_journals():
+    """A page of journal entries, newest first; pass next_cursor back as `cursor` for the next page"""
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    try:
+        journals, next_cursor = journal_page(current_user.id, limit, request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid cursor'}), 400
+    return jsonify({
+        'success': True,
+        'journals': [journal_dict(j) for j in journals],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/journal_mood_series', methods=['GET'])
+@login_required
+def journal_mood_series():
+    """Journal entry counts per day, week or month and mood, between optional start and end dates"""
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in BUCKETS:
+        return jsonify({'success': False, 'error': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    try:
+        start, end = (date.fromisoformat(request.args[name]) if request.args.get(name) else None
+                      for name in ('start', 'end'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    return jsonify({'success': True, **mood_series(current_user.id, bucket, start, end)})
+
+@app.route('/analytics_series', methods=['GET'])
+@login_required
+def analytics_series():
+    """Mood, chat sentiment and sleep per day, week or month as columnar arrays, at most `points` long"""
+    bucket = request.args.get('bucket', 'week')
+    if bucket not in analytics.BUCKETS:
+        return jsonify({'success': False, 'error': f"bucket must be one of {', '.join(analytics.BUCKETS)}"}), 400
+    metrics = [m for m in request.args.get('metrics', ','.join(analytics.METRICS)).split(',') if m]
+    if not metrics or any(m not in analytics.METRICS for m in metrics):
+        return jsonify({'success': False, 'error': f"metrics must be from {', '.join(analytics.METRICS)}"}), 400
+    try:
+        start, end = (date.fromisoformat(request.args[name]) if request.args.get(name) else None
+                      for name in ('start', 'end'))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD'}), 400
+    if start and end and start > end:
+        return jsonify({'success': False, 'error': 'start must not be after end'}), 400
+    points = min(max(request.args.get('points', analytics.DEFAULT_POINTS, type=int), 1), analytics.MAX_POINTS)
+    return jsonify({'success': True, **analytics.series(current_user.id, bucket, start, end, points, metrics)})
+
+@app.route('/sentiment_trends', methods=['GET'])
+@login_required
+def get_sentiment_trends():
+    """Chat sentiment: recent weights per category, hour and weekday histograms and the last `sessions` session arcs"""
+    sessions = min(max(request.args.get('sessions', sentiment_trends.DEFAULT_SESSIONS, type=int), 0), sentiment_trends.MAX_SESSIONS)
+    return jsonify({'success': True, **sentiment_trends.trends(current_user.id, sessions)})
 
 @app.route('/clear_chat', methods=['POST'])
 @login_required
@@ -419,7 +763,12 @@ def clear_chat():
         user_id=current_user.id,
         session_id=session_id
     ).delete()
+    ChatSessionSummary.query.filter_by(
+        user_id=current_user.id,
+        session_id=session_id
+    ).delete()
     db.session.commit()
+    chat_states.invalidate(session_id)
     
     session['chat_session_id'] = secrets.token_hex(16)
     session.modified = True
@@ -503,14 +852,11 @@ def get_reminder_status():
     ).first()
     
     # Get a random active reminder if available
-    active_reminders = Reminder.query.filter_by(
-        user_id=current_user.id,
-        is_active=True
-    ).all()
+    active_reminders = get_active_reminders(current_user.id)
     
     if active_reminders:
         random_reminder = random.choice(active_reminders)
-        reminder_message = random_reminder.message
+        reminder_message = random_reminder['message']
     else:
         # Fallback to goal if no custom reminders
         reminder_message = f"How's your progress on: {current_user.profile.goal}?"
@@ -639,6 +985,7 @@ def create_reminder():
     )
     db.session.add(reminder)
     db.session.commit()
+    invalidate_user_cache(current_user.id, 'active_reminders')
     
     return jsonify({
         'success': True,
@@ -672,6 +1019,7 @@ def update_reminder(reminder_id):
         reminder.is_active = data['is_active']
     
     db.session.commit()
+    invalidate_user_cache(current_user.id, 'active_reminders')
     
     return jsonify({
         'success': True,
@@ -695,6 +1043,7 @@ def delete_reminder(reminder_id):
     
     db.session.delete(reminder)
     db.session.commit()
+    invalidate_user_cache(current_user.id, 'active_reminders')
     
     return jsonify({'success': True, 'message': 'Reminder deleted'})
 
@@ -769,6 +1118,7 @@ def log_activity():
         completed=True
     )
     db.session.add(activity)
+    record_activity(activity)
     db.session.commit()
     
     motivation_msg = MotivationMessage(
@@ -789,18 +1139,15 @@ def sleep_tracker():
     sleep_logs = SleepLog.query.filter_by(user_id=current_user.id).order_by(SleepLog.date.desc()).limit(14).all()
     return render_template('sleep.html', sleep_logs=sleep_logs, user_name=current_user.profile.name if current_user.profile else 'User')
 
-@app.route('/log_sleep', methods=['POST'])
-@login_required
-def log_sleep():
-    """Log sleep data with AI analysis"""
-    import ai_core_1762554001118 as ai_core
-    
-    data = request.json
+def save_sleep_log(data):
+    """Create or update the user's sleep log for the day; returns the last 7 logs"""
     sleep_date = datetime.strptime(data.get('date', str(get_ist_date())), '%Y-%m-%d').date()
     
     existing_log = SleepLog.query.filter_by(user_id=current_user.id, date=sleep_date).first()
     
+    after = (data.get('hours_slept'), data.get('quality_rating'))
     if existing_log:
+        record_sleep(current_user.id, sleep_date, (existing_log.hours_slept, existing_log.quality_rating), after)
         existing_log.bedtime = data.get('bedtime')
         existing_log.wake_time = data.get('wake_time')
         existing_log.hours_slept = data.get('hours_slept')
@@ -817,24 +1164,23 @@ def log_sleep():
             notes=data.get('notes', '')
         )
         db.session.add(sleep_log)
+        record_sleep(current_user.id, sleep_date, after=after)
     
     db.session.commit()
     
-    recent_logs = SleepLog.query.filter_by(user_id=current_user.id).order_by(SleepLog.date.desc()).limit(7).all()
-    
-    ai_insights = None
-    if recent_logs:
-        try:
-            sleep_data = [{
-                'date': log.date.isoformat(),
-                'hours': log.hours_slept,
-                'quality': log.quality_rating,
-                'bedtime': log.bedtime,
-                'wake_time': log.wake_time,
-                'notes': log.notes
-            } for log in recent_logs]
-            
-            prompt = f"""Analyze this user's sleep data from the past week and provide personalized insights and recommendations.
+    return SleepLog.query.filter_by(user_id=current_user.id).order_by(SleepLog.date.desc()).limit(7).all()
+
+def build_sleep_insights_prompt(recent_logs):
+    sleep_data = [{
+        'date': log.date.isoformat(),
+        'hours': log.hours_slept,
+        'quality': log.quality_rating,
+        'bedtime': log.bedtime,
+        'wake_time': log.wake_time,
+        'notes': log.notes
+    } for log in recent_logs]
+    
+    return f"""Analyze this user's sleep data from the past week and provide personalized insights and recommendations.
 
 Sleep Data:
 {sleep_data}
@@ -845,10 +1191,19 @@ Provide a brief analysis (2-3 sentences) covering:
 3. One specific, actionable recommendation to improve sleep
 
 Keep it warm, supportive, and feeling-first. No medical advice."""
-            
-            ai_insights = ai_core.get_ai_response_simple(prompt)
+
+@app.route('/log_sleep', methods=['POST'])
+@login_required
+def log_sleep():
+    """Log sleep data with AI analysis"""
+    recent_logs = save_sleep_log(request.json)
+    
+    ai_insights = None
+    if recent_logs:
+        try:
+            ai_insights = get_ai_response_simple(build_sleep_insights_prompt(recent_logs))
         except Exception as e:
-            print(f"Error generating AI sleep insights: {e}")
+            app.logger.warning("Error generating AI sleep insights: %s", e)
     
     return jsonify({
         'success': True,
@@ -928,20 +1283,9 @@ def my_calendar():
 @login_required
 def get_events():
     """Get all events for the current user"""
-    events = Event.query.filter_by(user_id=current_user.id).order_by(Event.event_date).all()
     return jsonify({
         'success': True,
-        'events': [{
-            'id': e.id,
-            'title': e.title,
-            'description': e.description,
-            'date': e.event_date.isoformat(),
-            'time': e.event_time,
-            'location': e.location,
-            'is_confirmed': e.is_confirmed,
-            'is_in_google_calendar': e.is_in_google_calendar,
-            'created_from_message': e.created_from_message
-        } for e in events]
+        'events': event_calendar.all_events(current_user.id)
     })
 
 @app.route('/confirm_event/<int:event_id>', methods=['POST'])
@@ -987,6 +1331,8 @@ def confirm_event(event_id):
         db.session.add(reminder)
     
     db.session.commit()
+    invalidate_user_cache(current_user.id, 'active_reminders')
+    event_calendar.invalidate(current_user.id)
     
     token_record = GoogleCalendarToken.query.filter_by(user_id=current_user.id).first()
     if token_record and not event.is_in_google_calendar:
@@ -1028,8 +1374,9 @@ def confirm_event(event_id):
             event.is_in_google_calendar = True
             event.google_calendar_id = calendar_event['id']
             db.session.commit()
+            event_calendar.invalidate(current_user.id)
         except Exception as e:
-            print(f"Error auto-syncing to Google Calendar: {e}")
+            app.logger.warning("Error auto-syncing to Google Calendar: %s", e)
     
     return jsonify({'success': True, 'event': {
         'id': event.id,
@@ -1062,6 +1409,7 @@ def update_event(event_id):
         event.description = data['description'] if data['description'] else None
     
     db.session.commit()
+    event_calendar.invalidate(current_user.id)
     return jsonify({'success': True, 'event': {
         'id': event.id,
         'title': event.title,
@@ -1081,118 +1429,16 @@ def delete_event(event_id):
     
     db.session.delete(event)
     db.session.commit()
+    event_calendar.invalidate(current_user.id)
     return jsonify({'success': True})
 
 @app.route('/wellness_score', methods=['GET'])
 @login_required
 def wellness_score():
-    """Calculate overall wellness score (0-100)"""
-    from datetime import timedelta
-    
-    today = get_ist_date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    mood_score = 0
-    journal_entries = Journal.query.filter(
-        Journal.user_id == current_user.id,
-        Journal.timestamp >= datetime.combine(week_ago, datetime.min.time())
-    ).all()
-    
-    if journal_entries:
-        mood_values = {'happy': 100, 'grateful': 90, 'hopeful': 85, 'content': 80, 
-                       'neutral': 70, 'anxious': 50, 'stressed': 40, 'sad': 30, 'frustrated': 20}
-        avg_mood = sum(mood_values.get(j.mood.lower(), 70) for j in journal_entries) / len(journal_entries)
-        mood_score = avg_mood * 0.25
-    else:
-        mood_score = 50 * 0.25
-    
-    sleep_score = 0
-    sleep_logs = SleepLog.query.filter(
-        SleepLog.user_id == current_user.id,
-        SleepLog.date >= week_ago
-    ).all()
-    
-    if sleep_logs:
-        total_sleep_score = 0
-        for log in sleep_logs:
-            hours = log.hours_slept or 0
-            quality = log.quality_rating or 3
-            
-            if 7 <= hours <= 9:
-                duration_score = 50
-            elif 6 <= hours < 7:
-                duration_score = 40
-            elif 9 < hours <= 10:
-                duration_score = 45
-            elif 5 <= hours < 6:
-                duration_score = 30
-            elif 4 <= hours < 5:
-                duration_score = 20
-            else:
-                duration_score = 10
-            
-            quality_score = quality * 10
-            log_score = min(duration_score + quality_score, 100)
-            total_sleep_score += log_score
-        
-        avg_sleep = total_sleep_score / len(sleep_logs)
-        sleep_score = avg_sleep * 0.25
-    else:
-        sleep_score = 50 * 0.25
-    
-    habit_score = 0
-    goals = Goal.query.filter_by(user_id=current_user.id, is_active=True).all()
-    
-    if goals:
-        total_activities = 0
-        for goal in goals:
-            activities = Activity.query.filter(
-                Activity.user_id == current_user.id,
-                Activity.goal_id == goal.id,
-                Activity.date >= week_ago,
-                Activity.completed == True
-            ).count()
-            total_activities += activities
-        
-        habit_score = min((total_activities / 7) * 100, 100) * 0.25
-    else:
-        habit_score = 50 * 0.25
-    
-    journal_consistency_score = 0
-    total_days = (today - month_ago).days
-    if total_days > 0:
-        all_month_journals = Journal.query.filter(
-            Journal.user_id == current_user.id,
-            Journal.timestamp >= datetime.combine(month_ago, datetime.min.time())
-        ).count()
-        
-        consistency_pct = (all_month_journals / total_days) * 100
-        journal_consistency_score = min(consistency_pct, 100) * 0.25
-    else:
-        journal_consistency_score = 50 * 0.25
-    
-    overall_score = int(mood_score + sleep_score + habit_score + journal_consistency_score)
-    
-    category_label = 'Excellent'
-    if overall_score < 40:
-        category_label = 'Needs Attention'
-    elif overall_score < 60:
-        category_label = 'Fair'
-    elif overall_score < 80:
-        category_label = 'Good'
-    
-    return jsonify({
-        'success': True,
-        'overall_score': overall_score,
-        'category': category_label,
-        'breakdown': {
-            'mood': int(mood_score / 0.25),
-            'sleep': int(sleep_score / 0.25),
-            'habits': int(habit_score / 0.25),
-            'journal_consistency': int(journal_consistency_score / 0.25)
-        }
-    })
+    """Calculate overall wellness score (0-100) over the last `days` days (default 7)"""
+    days = min(max(request.args.get('days', 7, type=int), 1), 365)
+    result = compute_wellness(current_user.id, get_ist_date(), days)
+    return jsonify({'success': True, **result})
 
 @app.route('/calendar')
 @login_required
@@ -1206,22 +1452,18 @@ def check_event_followups():
     """Check if there are any events from yesterday to follow up on"""
     yesterday = get_ist_date() - timedelta(days=1)
     
-    past_events = Event.query.filter(
-        Event.user_id == current_user.id,
-        Event.event_date == yesterday,
-        Event.is_confirmed == True
-    ).all()
+    past_events = event_calendar.confirmed_events_on(current_user.id, yesterday)
     
     if past_events:
         event = past_events[0]
         return jsonify({
             'has_followup': True,
             'event': {
-                'id': event.id,
-                'title': event.title,
-                'date': event.event_date.isoformat()
+                'id': event['id'],
+                'title': event['title'],
+                'date': event['date']
             },
-            'followup_message': f"How did your {event.title} go yesterday?"
+            'followup_message': f"How did your {event['title']} go yesterday?"
         })
     
     return jsonify({'has_followup': False})
@@ -1233,44 +1475,35 @@ def check_time_reminders():
     current_datetime = get_ist_now()
     current_time = current_datetime.strftime('%H:%M')
     
-    print(f"[REMINDER CHECK] Current IST time: {current_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
-    
     if not current_user.profile:
-        print(f"[REMINDER CHECK] No user profile found")
+        reminder_log.debug("No user profile found")
         return jsonify({'show_reminder': False})
     
     if not current_user.profile.reminder_enabled:
-        print(f"[REMINDER CHECK] Reminders disabled for user")
+        reminder_log.debug("Reminders disabled for user")
         return jsonify({'show_reminder': False})
     
-    active_reminders = Reminder.query.filter_by(
-        user_id=current_user.id,
-        is_active=True
-    ).all()
-    
-    print(f"[REMINDER CHECK] Found {len(active_reminders)} active reminders")
-    for r in active_reminders:
-        print(f"  - Reminder: '{r.message}' at {r.time}")
+    active_reminders = get_active_reminders(current_user.id)
     
-    time_matched_reminders = [r for r in active_reminders if r.time and r.time == current_time[:5]]
+    time_matched_reminders = [r for r in active_reminders if r['time'] and r['time'] == current_time[:5]]
     
-    print(f"[REMINDER CHECK] Matched {len(time_matched_reminders)} reminders for time {current_time[:5]}")
+    # Polled every minute by every open tab: one line per poll, at DEBUG
+    if reminder_log.isEnabledFor(logging.DEBUG):
+        reminder_log.debug("IST %s: %d active reminders %s, %d due",
+                           current_datetime.strftime('%Y-%m-%d %H:%M:%S'), len(active_reminders),
+                           [(r['message'], r['time']) for r in active_reminders], len(time_matched_reminders))
     
     if time_matched_reminders:
-        reminders_list = [{
-            'id': r.id,
-            'message': r.message,
-            'time': r.time
-        } for r in time_matched_reminders]
+        reminders_list = time_matched_reminders
         
-        print(f"[REMINDER CHECK] Returning {len(reminders_list)} reminders")
+        reminder_log.info("Showing %d reminders for %s", len(reminders_list), current_time[:5])
         return jsonify({
             'show_reminder': True,
             'reminders': reminders_list
         })
     
     if current_user.profile.reminder_time and current_user.profile.reminder_time == current_time[:5]:
-        print(f"[REMINDER CHECK] Showing daily reminder at {current_time[:5]}")
+        reminder_log.info("Showing daily reminder at %s", current_time[:5])
         return jsonify({
             'show_reminder': True,
             'reminders': [{
@@ -1278,7 +1511,6 @@ def check_time_reminders():
             }]
         })
     
-    print(f"[REMINDER CHECK] No reminders to show")
     return jsonify({'show_reminder': False})
 
 @app.route('/google_auth')
@@ -1426,6 +1658,7 @@ def sync_event_to_google(event_id):
         event.is_in_google_calendar = True
         event.google_calendar_id = calendar_event['id']
         db.session.commit()
+        event_calendar.invalidate(current_user.id)
         
         return jsonify({
             'success': True,
@@ -1434,7 +1667,7 @@ def sync_event_to_google(event_id):
         })
     
     except Exception as e:
-        print(f"Error syncing to Google Calendar: {e}")
+        app.logger.error("Error syncing to Google Calendar: %s", e)
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,157 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import secrets
+import threading
+
+from flask import g, has_request_context, request, session
+
+# Logging for the app and its modules. Loggers live under "emoai."
+# (emoai.chat, emoai.reminders, emoai.ai, ...) and are plain
+# logging.getLogger() loggers, so modules without Flask can use them too.
+#
+# Request threads never write to stderr themselves. The root logger's only
+# handler is a QueueHandler. It stamps each record with the request it came
+# from (request id, route, user, chat session), drops sampled-out records and
+# enqueues the rest. A listener thread formats and writes them. When the queue
+# is full, records are dropped and counted instead of blocking the request.
+#
+# LOG_LEVEL sets the level (INFO by default). Anything below it is rejected by
+# the logger before a record is built, so guarded debug dumps cost one level
+# check. LOG_SAMPLE keeps a fraction of a logger's records below WARNING,
+# e.g. "emoai.reminders=0.01,emoai.chat=0.25". Warnings and errors always pass.
+# LOG_FORMAT=json writes one JSON object per line.
+
+CONTEXT_FIELDS = ('request_id', 'route', 'user_id', 'chat_session')
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s %(route)s user=%(user_id)s session=%(chat_session)s] %(message)s'
+
+_stats_lock = threading.Lock()
+_stats = {'sampled_out': 0, 'dropped': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def get_log_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def request_id(environ=None):
+    """The request's id: X-Request-ID if the client sent one, else a new one kept in the environ"""
+    environ = environ if environ is not None else request.environ
+    if 'emoai.request_id' not in environ:
+        environ['emoai.request_id'] = environ.get('HTTP_X_REQUEST_ID') or secrets.token_hex(6)
+    return environ['emoai.request_id']
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds the request's id, route, user and chat session to each record ('-' outside a request)"""
+
+    def filter(self, record):
+        for field in CONTEXT_FIELDS:
+            setattr(record, field, '-')
+        if has_request_context():
+            try:
+                record.request_id = request_id()
+                record.route = request.endpoint or request.path
+                # Only a user Flask-Login has already loaded; logging never runs the user query
+                user = g.get('_login_user')
+                record.user_id = getattr(user, 'id', None) or '-'
+                # dict.get, not session.get, so logging doesn't mark the session accessed
+                record.chat_session = dict.get(session._get_current_object(), 'chat_session_id') or '-'
+            except Exception:
+                # A log line must never fail the request it describes
+                pass
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps `rate` of a logger's records below WARNING; rates apply to a logger and its children"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, probe = 1.0, name
+            while probe:
+                if probe in self.rates:
+                    rate = self.rates[probe]
+                    break
+                probe = probe.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0 or random.random() < rate:
+            return True
+        _count('sampled_out')
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _count('dropped')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            entry[field] = getattr(record, field, '-')
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_sample_rates(spec):
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        name, _, rate = part.partition('=')
+        rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+    return rates
+
+
+def configure_logging(app):
+    """Route all logging through the request-aware queue; call once, before app.logger is used"""
+    from flask.logging import default_handler
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if os.environ.get('LOG_FORMAT') == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = DroppingQueueHandler(queue.Queue(int(os.environ.get('LOG_QUEUE_SIZE', '10000'))))
+    handler.addFilter(SamplingFilter(parse_sample_rates(os.environ.get('LOG_SAMPLE', ''))))
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    app.logger.removeHandler(default_handler)
+
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,469 @@
+"""ASGI entry point: the AI-bound routes run on an event loop, the rest is app.py.
+
+/chat, /chat_stream, /get_summary and /log_sleep await Gemini's async client
+instead of holding a worker thread for the length of a model call, so one
+process can keep hundreds of them in flight. Their database work runs in
+short Flask request contexts on a small thread pool. Every other route goes
+to the Flask app unchanged, on its own pool, so cheap routes keep answering
+while the model is slow. Chat history compaction, which is a model call of
+its own, runs after the response has been sent.
+
+    uvicorn asgi:application --host 0.0.0.0 --port $PORT
+"""
+import asyncio
+import contextvars
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from flask import Response, jsonify, request, session
+from flask_login import current_user
+
+import tracing
+from app_logging import request_id
+from app import app, db, CHAT_COMMIT_MODE, CHAT_COMPACTION_KEEP_TURNS, SERVER_TIMING, chat_states, compaction_due, store_compaction, get_ist_now, get_session_id, begin_chat_turn, finish_chat_turn, abandon_chat_turn, event_payload, prepare_chat_turn, sse_event, get_chat_history_from_db, build_journal_summary_prompt, save_sleep_log, build_sleep_insights_prompt
+from models import ChatMessage
+from ai_core_1762554001118 import classify_message_async, get_ai_chat_response_async, stream_ai_chat_response_async, summarize_chat_as_journal_async, summarize_conversation_context_async, get_ai_response_simple_async
+
+# Threads for the database steps of the async routes; they never wait on the model
+ASGI_DB_THREADS = int(os.environ.get('ASGI_DB_THREADS', '8'))
+# Threads for the plain Flask routes (one per request in flight, like sync workers)
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', '16'))
+
+log = logging.getLogger('emoai.asgi')
+
+db_executor = ThreadPoolExecutor(max_workers=ASGI_DB_THREADS, thread_name_prefix='asgi-db')
+wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix='asgi-wsgi')
+
+
+def build_environ(scope, body):
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope['server'][0] if scope.get('server') else 'localhost',
+        'SERVER_PORT': str(scope['server'][1]) if scope.get('server') else '80',
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f"HTTP_{name}"
+        value = value.decode('latin1')
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def respond(rv):
+    """Turn a view-style return value into a finished Flask response (cookies, after_request)"""
+    return app.process_response(app.make_response(rv))
+
+
+class RequestSteps:
+    """Runs the synchronous steps of one request, each in its own Flask request context.
+
+    The database session ends with each step, so a step commits whatever it
+    needs to keep or returns the unsaved rows for a later step to merge. A
+    session cookie set by one step (a new chat session id, say) is carried
+    into the later steps and onto the response.
+    """
+
+    def __init__(self, scope, body):
+        self.environ = build_environ(scope, body)
+        # One id for all of the request's steps, so their log lines can be joined
+        request_id(self.environ)
+        self.body = body
+        self.set_cookie = None
+        # Coroutine functions to await once the response has been sent
+        self.after = []
+
+    async def run(self, step, *args):
+        loop = asyncio.get_running_loop()
+        # Carry the request's trace into the pool thread
+        return await loop.run_in_executor(db_executor, contextvars.copy_context().run, self._run, step, args)
+
+    def _run(self, step, args):
+        environ = dict(self.environ)
+        environ['wsgi.input'] = io.BytesIO(self.body)
+        with app.request_context(environ):
+            result = step(*args)
+            if isinstance(result, Response):
+                if self.set_cookie and 'Set-Cookie' not in result.headers:
+                    result.headers['Set-Cookie'] = self.set_cookie
+            elif session.modified:
+                self._carry_session()
+            return result
+
+    def _carry_session(self):
+        carrier = Response()
+        app.session_interface.save_session(app, session, carrier)
+        self.set_cookie = carrier.headers.get('Set-Cookie')
+        if not self.set_cookie:
+            return
+        cookies = SimpleCookie(self.environ.get('HTTP_COOKIE', ''))
+        new_cookie = SimpleCookie(self.set_cookie)
+        for name, morsel in new_cookie.items():
+            cookies[name] = morsel.value
+        self.environ['HTTP_COOKIE'] = '; '.join(f"{name}={morsel.coded_value}" for name, morsel in cookies.items())
+
+
+def _require_login():
+    if not current_user.is_authenticated:
+        return respond(app.login_manager.unauthorized())
+    return None
+
+
+def _chat_begin():
+    denied = _require_login()
+    if denied:
+        return denied
+    user_message = request.json.get('message', '')
+    if not user_message:
+        return respond((jsonify({'error': 'No message provided'}), 400))
+    session_id = get_session_id()
+    # In turn mode nothing is written until the reply is in, so keep the
+    # arrival time for the user's row, as app.py's routes stamp it
+    arrived_at = get_ist_now()
+    user_row_id = begin_chat_turn(session_id, user_message, arrived_at).id if CHAT_COMMIT_MODE == 'eager' else None
+    return user_message, session_id, user_row_id, arrived_at
+
+
+def _chat_prepare(user_message, session_id, classification):
+    # Compaction would block this pool thread on the model; compact_history() does it later
+    detected_sentiment, new_event, chat_history = prepare_chat_turn(user_message, session_id, classification, compact=False)
+    # The step's session ends here, so hand the turn's unsaved rows to _chat_finish
+    unsaved = list(db.session.new) + list(db.session.dirty)
+    return detected_sentiment, new_event, chat_history, unsaved
+
+
+def _store_turn(user_message, session_id, user_row_id, arrived_at, ai_response, new_event, unsaved):
+    """Commit the turn with its reply; returns the detected event's payload, if any"""
+    if user_row_id is None:
+        user_row = begin_chat_turn(session_id, user_message, arrived_at)
+    else:
+        user_row = db.session.get(ChatMessage, user_row_id)
+    merged = {id(row): db.session.merge(row) for row in unsaved}
+    finish_chat_turn(user_row, session_id, ai_response)
+    return event_payload(merged[id(new_event)]) if new_event else None
+
+
+def _chat_finish(user_message, session_id, user_row_id, arrived_at, ai_response, detected_sentiment, new_event, unsaved):
+    event = _store_turn(user_message, session_id, user_row_id, arrived_at, ai_response, new_event, unsaved)
+    response_data = {
+        'response': ai_response,
+        'success': True,
+        'sentiment': detected_sentiment
+    }
+    if event:
+        response_data['detected_event'] = event
+    return respond(jsonify(response_data))
+
+
+def _chat_failed(user_message, session_id, arrived_at, e):
+    abandon_chat_turn(session_id, user_message, arrived_at)
+    return _error(e)
+
+
+def _error(e):
+    return respond((jsonify({'error': str(e), 'success': False}), 500))
+
+
+async def chat(steps):
+    started = await steps.run(_chat_begin)
+    if isinstance(started, Response):
+        return started
+    user_message, session_id, user_row_id, arrived_at = started
+
+    try:
+        classification = await classify_message_async(user_message, get_ist_now())
+        detected_sentiment, new_event, chat_history, unsaved = await steps.run(
+            _chat_prepare, user_message, session_id, classification)
+        ai_response = await get_ai_chat_response_async(chat_history, detected_sentiment)
+        response = await steps.run(_chat_finish, user_message, session_id, user_row_id, arrived_at, ai_response,
+                                   detected_sentiment, new_event, unsaved)
+    except Exception as e:
+        return await steps.run(_chat_failed, user_message, session_id, arrived_at, e)
+    steps.after.append(lambda: compact_history(steps, session_id))
+    return response
+
+
+class Stream:
+    """A streamed reply: `response` carries the status and headers, `body` yields the chunks"""
+
+    def __init__(self, response, body):
+        self.response = response
+        self.body = body
+
+
+def _stream_start():
+    return respond(Response(mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    }))
+
+
+async def chat_stream(steps):
+    started = await steps.run(_chat_begin)
+    if isinstance(started, Response):
+        return started
+    return Stream(await steps.run(_stream_start), _chat_stream_events(steps, *started))
+
+
+async def _chat_stream_events(steps, user_message, session_id, user_row_id, arrived_at):
+    """The same events as app.py's /chat_stream, with the model streamed on the event loop"""
+    settled = False
+    try:
+        classification = await classify_message_async(user_message, get_ist_now())
+        detected_sentiment, new_event, chat_history, unsaved = await steps.run(
+            _chat_prepare, user_message, session_id, classification)
+        yield sse_event('sentiment', detected_sentiment)
+
+        chunks = []
+        async for text in stream_ai_chat_response_async(chat_history, detected_sentiment):
+            chunks.append(text)
+            yield sse_event('token', {'text': text})
+
+        event = await steps.run(_store_turn, user_message, session_id, user_row_id, arrived_at, ''.join(chunks),
+                                new_event, unsaved)
+        settled = True
+        steps.after.append(lambda: compact_history(steps, session_id))
+        if event:
+            yield sse_event('detected_event', event)
+        yield sse_event('done', {'success': True})
+    except Exception as e:
+        settled = True
+        await steps.run(abandon_chat_turn, session_id, user_message, arrived_at)
+        yield sse_event('error', {'error': str(e), 'success': False})
+    finally:
+        if not settled:
+            # The client went away mid-stream; keep its message as pending
+            await steps.run(abandon_chat_turn, session_id, user_message, arrived_at)
+
+
+def _compaction_begin(session_id):
+    """The older turns to fold into the session summary, if its history is over budget"""
+    state = chat_states.get(current_user.id, session_id)
+    if state is None:
+        return None
+    with state.lock:
+        if not compaction_due(state):
+            return None
+        turns, through_id = state.turns_to_compact(CHAT_COMPACTION_KEEP_TURNS)
+        return (state.summary, turns, through_id) if turns else None
+
+
+def _compaction_finish(session_id, summary, through_id):
+    state = chat_states.get(current_user.id, session_id)
+    if state is None:
+        return
+    with state.lock:
+        # Another request compacted these turns in the meantime
+        if state.summarized_through_id >= through_id:
+            return
+        store_compaction(state, summary, through_id)
+        db.session.commit()
+
+
+async def compact_history(steps, session_id):
+    """Summarize an over-budget chat history with the async model client, after the reply is out"""
+    pending = await steps.run(_compaction_begin, session_id)
+    if pending is None:
+        return
+    previous_summary, turns, through_id = pending
+    try:
+        summary = await summarize_conversation_context_async(previous_summary, turns)
+    except Exception as e:
+        log.warning("Chat compaction failed for session %s: %s", session_id, e)
+        return
+    await steps.run(_compaction_finish, session_id, summary, through_id)
+
+
+def _summary_begin():
+    denied = _require_login()
+    if denied:
+        return denied
+    chat_history = get_chat_history_from_db()
+    if not chat_history:
+        return respond((jsonify({'error': 'No chat history to summarize'}), 400))
+    return build_journal_summary_prompt(chat_history)
+
+
+async def get_summary(steps):
+    started = await steps.run(_summary_begin)
+    if isinstance(started, Response):
+        return started
+
+    try:
+        summary = await summarize_chat_as_journal_async(started)
+    except Exception as e:
+        return await steps.run(_error, e)
+    return await steps.run(lambda: respond(jsonify({'summary': summary, 'success': True})))
+
+
+def _sleep_begin():
+    denied = _require_login()
+    if denied:
+        return denied
+    recent_logs = save_sleep_log(request.json)
+    return build_sleep_insights_prompt(recent_logs) if recent_logs else None
+
+
+async def log_sleep(steps):
+    prompt = await steps.run(_sleep_begin)
+    if isinstance(prompt, Response):
+        return prompt
+
+    ai_insights = None
+    if prompt:
+        try:
+            ai_insights = await get_ai_response_simple_async(prompt)
+        except Exception as e:
+            app.logger.warning("Error generating AI sleep insights: %s", e)
+    return await steps.run(lambda: respond(jsonify({'success': True, 'ai_insights': ai_insights})))
+
+
+ASYNC_ROUTES = {
+    ('POST', '/chat'): chat,
+    ('POST', '/chat_stream'): chat_stream,
+    ('POST', '/get_summary'): get_summary,
+    ('POST', '/log_sleep'): log_sleep,
+}
+
+
+def _headers(response):
+    return [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in response.headers.items()]
+
+
+async def send_response(send, response):
+    await send({'type': 'http.response.start', 'status': response.status_code, 'headers': _headers(response)})
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def send_stream(send, receive, stream):
+    """Send a Stream's chunks as they come; stops early if the client disconnects"""
+    headers = [(name, value) for name, value in _headers(stream.response) if name != b'content-length']
+    await send({'type': 'http.response.start', 'status': stream.response.status_code, 'headers': headers})
+    # The request body has been read, so the next message is the disconnect
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        async for chunk in stream.body:
+            if disconnected.done():
+                break
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+        else:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnected.cancel()
+        # Runs the stream's cleanup when it was cut short
+        await stream.body.aclose()
+
+
+async def call_flask(scope, body, send):
+    """Run the Flask app for one request on the WSGI pool, streaming what it yields"""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    put = lambda *item: loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def start_response(status, headers, exc_info=None):
+        put('start', int(status.split(' ', 1)[0]), headers)
+        return lambda data: put('body', data)
+
+    def run():
+        try:
+            result = app(build_environ(scope, body), start_response)
+            try:
+                for chunk in result:
+                    if chunk:
+                        put('body', chunk)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except BaseException as e:
+            put('error', e)
+        finally:
+            put('end')
+
+    loop.run_in_executor(wsgi_executor, run)
+    started = False
+    while True:
+        item = await queue.get()
+        if item[0] == 'start':
+            headers = [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in item[2]]
+            await send({'type': 'http.response.start', 'status': item[1], 'headers': headers})
+            started = True
+        elif item[0] == 'body':
+            await send({'type': 'http.response.body', 'body': item[1], 'more_body': True})
+        elif item[0] == 'error':
+            log.error("Error in WSGI request %s", scope['path'], exc_info=item[1])
+            if not started:
+                await send({'type': 'http.response.start', 'status': 500, 'headers': [(b'content-type', b'text/plain')]})
+                started = True
+        else:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    body = await read_body(receive)
+    handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await call_flask(scope, body, send)
+        return
+
+    trace = tracing.start_trace(handler.__name__, owned=True)
+    steps = RequestSteps(scope, body)
+    response = await handler(steps)
+    if isinstance(response, Stream):
+        if SERVER_TIMING:
+            # Sent before the body, so it only covers the stages before the stream
+            response.response.headers['Server-Timing'] = trace.server_timing()
+        await send_stream(send, receive, response)
+        response = response.response
+    else:
+        if SERVER_TIMING:
+            response.headers['Server-Timing'] = trace.server_timing()
+        await send_response(send, response)
+    tracing.end_trace(trace, response.status_code)
+
+    for task in steps.after:
+        try:
+            await task()
+        except Exception:
+            log.exception("Error after responding to %s", scope['path'])
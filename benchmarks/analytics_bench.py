@@ -0,0 +1,137 @@
+"""Time analytics.series() on multi-year histories and check it against a brute-force reference.
+
+Builds synthetic users with YEARS of daily journals, sleep logs and chat
+sentiment. For each bucket and a few point budgets it checks that the series
+matches reference(), which loads every row and groups it in plain Python,
+and, with NumPy installed, that the NumPy and plain-Python paths agree. It
+then reports time per call and the JSON size next to the raw rows the
+charts used to receive.
+
+    python benchmarks/analytics_bench.py [--years 4] [--repeat 20]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def reference(user_id, bucket, points):
+    """The same series from every raw row, bucketed by date arithmetic in plain Python"""
+    from journals import bucket_start
+    from models import Journal, UserSentiment, SleepLog
+    from wellness import mood_value, night_score
+
+    rows = {'mood': [], 'sentiment': [], 'sleep': []}
+    for j in Journal.query.filter_by(user_id=user_id):
+        rows['mood'].append((j.timestamp.date(), j.mood.lower(), {'count': 1, 'score': mood_value(j.mood)}))
+    for s in UserSentiment.query.filter_by(user_id=user_id):
+        rows['sentiment'].append((s.timestamp.date(), s.sentiment.lower(),
+                                  {'count': 1, 'intensity': s.intensity if s.intensity is not None else 0.5}))
+    for log in SleepLog.query.filter_by(user_id=user_id):
+        values = {'count': 1, 'score': night_score(log.hours_slept, log.quality_rating)}
+        if log.hours_slept is not None:
+            values.update(hours=log.hours_slept, hours_count=1)
+        if log.quality_rating:
+            values.update(quality=log.quality_rating, quality_count=1)
+        rows['sleep'].append((log.date, None, values))
+
+    days = [day for metric in rows.values() for day, _, _ in metric]
+    starts = sorted({bucket_start(d, bucket) for d in days})
+    first, last = starts[0], starts[-1]
+    # Every bucket start in the range, so merged groups line up with the calendar
+    grid, current = [], first
+    while current <= last:
+        grid.append(current)
+        current = bucket_start(current + timedelta(days=32 if bucket == 'month' else 7 if bucket == 'week' else 1), bucket)
+    stride = max(1, math.ceil(len(grid) / points))
+    group_of = {start: grid[i - i % stride] for i, start in enumerate(grid)}
+
+    totals = {}
+    for metric, metric_rows in rows.items():
+        for day, category, values in metric_rows:
+            group = totals.setdefault(group_of[bucket_start(day, bucket)], {}).setdefault(metric, {})
+            for name, value in values.items():
+                group[name] = group.get(name, 0) + value
+            if category is not None:
+                group.setdefault('categories', {})[category] = group.get('categories', {}).get(category, 0) + 1
+    return stride, totals
+
+
+def check(result, stride, totals):
+    if result['stride'] != stride or result['t'] != [d.isoformat() for d in sorted(totals)]:
+        return f"grid differs: stride {result['stride']} vs {stride}, {len(result['t'])} vs {len(totals)} points"
+    means = {'mood': (('score', 'count'),), 'sentiment': (('intensity', 'count'),),
+             'sleep': (('score', 'count'), ('hours', 'hours_count'), ('quality', 'quality_count'))}
+    for i, start in enumerate(sorted(totals)):
+        for metric, pairs in means.items():
+            expected = totals[start].get(metric, {})
+            if result[metric]['count'][i] != expected.get('count', 0):
+                return f"{metric} count differs at {start}"
+            category_column = {'mood': 'moods', 'sentiment': 'sentiments'}.get(metric)
+            if category_column:
+                got = {c: counts[i] for c, counts in result[metric][category_column].items() if counts[i]}
+                if got != expected.get('categories', {}):
+                    return f"{metric} category counts differ at {start}"
+            for name, count in pairs:
+                want = round(expected[name] / expected[count], 2) if expected.get(count) else None
+                got = result[metric][name][i]
+                if (want is None) != (got is None) or (want is not None and abs(want - got) > 0.011):
+                    return f"{metric} {name} differs at {start}: {got} vs {want}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'analytics.db')}"
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+    import analytics
+    from journals import journal_dict
+    from models import Journal
+    from synthetic_data import populate
+
+    days = args.years * 365
+    failures = 0
+    with app_module.app.app_context():
+        user_id = populate(users=2, seed=11, scale={'journal_days': days, 'sleep_days': days, 'chat_sessions': days // 7})[0]
+        raw = json.dumps([journal_dict(j) for j in Journal.query.filter_by(user_id=user_id)])
+        print(f"{args.years} years of history; every journal as JSON: {len(raw) / 1024:.0f} KiB")
+        print(f"{'bucket':<7}{'points':>7}{'stride':>7}{'returned':>9}{'ms/call':>9}{'KiB':>7}  numpy")
+
+        for bucket in analytics.BUCKETS:
+            for points in (30, analytics.DEFAULT_POINTS, 400):
+                result = analytics.series(user_id, bucket, points=points)
+                problem = check(result, *reference(user_id, bucket, points))
+                numpy_matches = '-'
+                if analytics.np is not None:
+                    saved, analytics.np = analytics.np, None
+                    numpy_matches = 'same' if analytics.series(user_id, bucket, points=points) == result else 'DIFFERS'
+                    analytics.np = saved
+                started = time.perf_counter()
+                for _ in range(args.repeat):
+                    analytics.series(user_id, bucket, points=points)
+                elapsed = (time.perf_counter() - started) / args.repeat
+                print(f"{bucket:<7}{points:>7}{result['stride']:>7}{len(result['t']):>9}{elapsed * 1000:>9.1f}"
+                      f"{len(json.dumps(result)) / 1024:>7.1f}  {numpy_matches}")
+                if problem or numpy_matches == 'DIFFERS':
+                    failures += 1
+                    print(f"  mismatch: {problem or 'numpy and plain-Python paths differ'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Check the cache backends behave the same and compare hit rates across workers.
+
+Every backend first runs the same get/set/TTL/delete/invalidate_prefix checks.
+Then WORKERS processes each replay a skewed stream of lookups, filling the
+cache on a miss, the way gunicorn workers share (or don't share) results.
+The redis backend runs against benchmarks/resp_server.py unless CACHE_URL
+points at a real server.
+
+    python benchmarks/cache_backends_bench.py [--workers 4] [--lookups 5000]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cache import make_cache
+from resp_server import serve_in_thread
+
+
+def check_semantics(cache):
+    failures = []
+
+    def expect(label, actual, expected):
+        if actual != expected:
+            failures.append(f"{label}: got {actual!r}, expected {expected!r}")
+
+    cache.set('check:a', {'n': 1})
+    expect('get after set', cache.get('check:a'), {'n': 1})
+    cache.get('check:a')['n'] = 2
+    expect('get returns a copy', cache.get('check:a'), {'n': 1})
+    expect('get missing', cache.get('check:missing'), None)
+
+    cache.set('check:short', 'x', ttl=0.05)
+    time.sleep(0.1)
+    expect('get after ttl', cache.get('check:short'), None)
+
+    cache.delete('check:a')
+    expect('get after delete', cache.get('check:a'), None)
+
+    cache.set('user:1:reminders', [1])
+    cache.set('user:1:events', [2])
+    cache.set('user:12:reminders', [3])
+    cache.invalidate_prefix('user:1:')
+    expect('prefix invalidated', (cache.get('user:1:reminders'), cache.get('user:1:events')), (None, None))
+    expect('other prefix kept', cache.get('user:12:reminders'), [3])
+    return failures
+
+
+def _worker(backend, path, url, lookups, keyspace, seed, results):
+    cache = make_cache(backend, path=path, url=url, max_entries=keyspace * 2, default_ttl=600)
+    rng = random.Random(seed)
+    timings = []
+    for _ in range(lookups):
+        # Skewed so a few keys (common messages, active users) dominate
+        key = f"bench:{int(keyspace * rng.random() ** 3)}"
+        started = time.perf_counter()
+        if cache.get(key) is None:
+            cache.set(key, {'value': key})
+        timings.append(time.perf_counter() - started)
+    stats = cache.stats.as_dict()
+    timings.sort()
+    results.put((stats['hits'], stats['misses'], stats['errors'], timings[len(timings) // 2]))
+
+
+def bench_workers(backend, path, url, workers, lookups, keyspace):
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(backend, path, url, lookups, keyspace, seed, results))
+        for seed in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    hits = sum(row[0] for row in rows)
+    misses = sum(row[1] for row in rows)
+    errors = sum(row[2] for row in rows)
+    p50_us = sorted(row[3] for row in rows)[len(rows) // 2] * 1e6
+    return hits / (hits + misses), errors, p50_us
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--keyspace', type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = os.environ.get('CACHE_URL')
+    if not url:
+        server, url = serve_in_thread()
+
+    failed = False
+    try:
+        for backend in ('memory', 'sqlite', 'redis'):
+            path = os.path.join(workdir, f'{backend}.db')
+            failures = check_semantics(make_cache(backend, path=path, url=url))
+            for failure in failures:
+                print(f"  {backend} FAILED {failure}")
+            failed = failed or bool(failures)
+
+            if backend == 'redis':
+                make_cache(backend, url=url).invalidate_prefix('bench:')
+            hit_rate, errors, p50_us = bench_workers(
+                backend, os.path.join(workdir, 'bench.db'), url, args.workers, args.lookups, args.keyspace)
+            print(f"{backend:>6}: semantics {'ok' if not failures else 'FAILED'}, "
+                  f"{args.workers} workers hit rate {hit_rate:.1%}, p50 {p50_us:.0f} us/lookup, {errors} errors")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Compare the local calendar range resolver with the model path.
+
+Runs a fixed set of calendar phrases against calendar_resolver.resolve_calendar_query
+and, when a real GOOGLE_API_KEY is set, against the fused understanding model.
+Reports per-call latency and accuracy for both; phrases the resolver declines
+(None) are counted as "deferred" since production sends those to the model.
+
+    python benchmarks/calendar_resolver_bench.py
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pytz
+
+from calendar_resolver import resolve_calendar_query
+
+# Same reference time as the examples in the model prompts
+NOW = pytz.timezone('Asia/Kolkata').localize(datetime(2025, 11, 8, 10, 0))
+
+# (phrase, expected (start_date, end_date), or None for "not a calendar query" or "leave it to the model")
+PHRASES = [
+    ("What's on my calendar?", ('2025-11-08', '2025-11-14')),
+    ("Show me my schedule", ('2025-11-08', '2025-11-14')),
+    ("What events do I have tomorrow?", ('2025-11-09', '2025-11-09')),
+    ("What's my schedule tomorrow?", ('2025-11-09', '2025-11-09')),
+    ("Do I have anything planned this week?", ('2025-11-08', '2025-11-14')),
+    ("Show me events this week", ('2025-11-08', '2025-11-14')),
+    ("What do I have next week?", ('2025-11-15', '2025-11-21')),
+    ("What's my schedule for Friday?", ('2025-11-14', '2025-11-14')),
+    ("What do I have on Monday?", ('2025-11-10', '2025-11-10')),
+    ("Any events coming up?", ('2025-11-08', '2025-11-14')),
+    ("What do I have coming up?", ('2025-11-08', '2025-11-14')),
+    ("Is there anything I have to do on November 9?", ('2025-11-09', '2025-11-09')),
+    ("Anything on Nov 9?", ('2025-11-09', '2025-11-09')),
+    ("Do I have plans on 9th November?", ('2025-11-09', '2025-11-09')),
+    ("Anything on 9 Nov?", ('2025-11-09', '2025-11-09')),
+    ("What's happening on the 15th?", ('2025-11-15', '2025-11-15')),
+    ("Am I free on Saturday?", ('2025-11-08', '2025-11-08')),
+    ("What do I have today?", ('2025-11-08', '2025-11-08')),
+    ("Tell me about my schedule", ('2025-11-08', '2025-11-14')),
+    ("Am I busy next month?", ('2025-12-01', '2025-12-31')),
+    ("Anything on December 3rd?", ('2025-12-03', '2025-12-03')),
+    ("Do I have anything next Friday?", ('2025-11-14', '2025-11-14')),
+    ("What's on in 3 days?", ('2025-11-11', '2025-11-11')),
+    # Name a time no rule covers, so they must go to the model, not default to the coming week
+    ("What do I have in December?", None),
+    ("What's on my schedule for March?", None),
+    ("What do I have planned this year?", None),
+    ("Do I have anything for Christmas?", None),
+    ("What do I have the week after next?", None),
+    ("I'm feeling stressed", None),
+    # Feelings questions that borrow calendar phrasing but name no calendar or time
+    ("Is there anything I can do to stop overthinking?", None),
+    ("What's on your mind?", None),
+    ("Am I free to just feel sad?", None),
+    ("Do I have anything to be grateful for?", None),
+    ("What do I have to lose?", None),
+    ("What is happening to me?", None),
+    ("Is there anything wrong with me today?", None),
+    ("I have a dentist appointment tomorrow at 2pm", None),
+]
+
+
+# The expected-None phrases above that are real calendar questions: the
+# resolver must decline them, and the model is not scored on them
+LEFT_TO_MODEL = {
+    "What do I have in December?",
+    "What's on my schedule for March?",
+    "What do I have planned this year?",
+    "Do I have anything for Christmas?",
+    "What do I have the week after next?",
+}
+
+
+def _score(result, expected):
+    if expected is None:
+        return result is None
+    return result is not None and (result['start_date'], result['end_date']) == expected
+
+
+def bench_local(rounds=500):
+    correct = deferred = wrong = 0
+    for phrase, expected in PHRASES:
+        result = resolve_calendar_query(phrase, NOW)
+        if result is None and expected is not None:
+            deferred += 1
+        elif _score(result, expected):
+            correct += 1
+        else:
+            wrong += 1
+            print(f"  local WRONG: {phrase!r} -> {result}")
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for phrase, _ in PHRASES:
+            resolve_calendar_query(phrase, NOW)
+    per_call_us = (time.perf_counter() - started) / (rounds * len(PHRASES)) * 1e6
+    return correct, deferred, wrong, per_call_us
+
+
+def bench_model():
+    import ai_core_1762554001118 as ai_core
+
+    correct = wrong = 0
+    timings = []
+    for phrase, expected in PHRASES:
+        if phrase in LEFT_TO_MODEL:
+            continue
+        started = time.perf_counter()
+        result = ai_core._understand_with_model(phrase, NOW)['calendar_query']
+        timings.append(time.perf_counter() - started)
+        if _score(result, expected):
+            correct += 1
+        else:
+            wrong += 1
+            print(f"  model WRONG: {phrase!r} -> {result}")
+    timings.sort()
+    return correct, wrong, timings[len(timings) // 2] * 1000
+
+
+def main():
+    total = len(PHRASES)
+    correct, deferred, wrong, per_call_us = bench_local()
+    print(f"local resolver: {correct}/{total} correct, {deferred} deferred to model, "
+          f"{wrong} wrong, {per_call_us:.1f} us/call")
+
+    if os.environ.get('GOOGLE_API_KEY', 'offline') == 'offline':
+        print("model path: skipped (set GOOGLE_API_KEY to compare against Gemini)")
+        return 1 if wrong else 0
+
+    model_correct, model_wrong, p50_ms = bench_model()
+    print(f"model path: {model_correct}/{total - len(LEFT_TO_MODEL)} correct, {model_wrong} wrong, p50 {p50_ms:.0f} ms/call")
+    return 1 if wrong else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+"""Check that the app's hot per-user queries are served by an index.
+
+Runs EXPLAIN QUERY PLAN for each query in hot_queries() (the same filters
+and orderings app.py uses) and fails when SQLite would scan a whole table
+instead of searching an index. Temp B-trees for ORDER BY are reported but
+allowed. By default it checks a scratch database filled by synthetic_data.py;
+--db checks an existing file instead (run `flask --app app db upgrade`
+first so its migrations are applied).
+
+    python benchmarks/explain_indexes.py [--db instance/vibe_journal.db]
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+
+def hot_queries(user_id=1):
+    from sqlalchemy import delete, func, select, tuple_
+    from models import (ChatMessage, Event, SleepLog, Journal, Activity, HabitProgress, Reminder, Goal,
+                        MotivationMessage, DailyWellness, UserSentiment)
+
+    today = date.today()
+    week_ago = today - timedelta(days=7)
+    session_id = 'bench-1-0'
+    return {
+        'chat history': select(ChatMessage).where(
+            ChatMessage.user_id == user_id, ChatMessage.session_id == session_id).order_by(ChatMessage.timestamp),
+        'chat state delta': select(ChatMessage.id, ChatMessage.role, ChatMessage.content).where(
+            ChatMessage.user_id == user_id, ChatMessage.session_id == session_id,
+            ChatMessage.id > 100).order_by(ChatMessage.id),
+        'events in range': select(Event).where(
+            Event.user_id == user_id, Event.event_date >= week_ago, Event.event_date <= today
+        ).order_by(Event.event_date, Event.event_time),
+        'all events': select(Event).where(Event.user_id == user_id).order_by(Event.event_date, Event.event_time),
+        'event followups': select(Event).where(
+            Event.user_id == user_id, Event.event_date >= today - timedelta(days=1),
+            Event.event_date <= today - timedelta(days=1)).order_by(Event.event_date, Event.event_time),
+        'recent sleep logs': select(SleepLog).where(SleepLog.user_id == user_id).order_by(SleepLog.date.desc()).limit(7),
+        'sleep log by date': select(SleepLog).where(SleepLog.user_id == user_id, SleepLog.date == today),
+        'weekly sleep logs': select(SleepLog).where(SleepLog.user_id == user_id, SleepLog.date >= week_ago),
+        'weekly journals': select(Journal).where(
+            Journal.user_id == user_id, Journal.timestamp >= datetime.combine(week_ago, datetime.min.time())),
+        'journal list': select(Journal).where(Journal.user_id == user_id).order_by(Journal.timestamp.desc()),
+        'journal page': select(Journal).where(
+            Journal.user_id == user_id, tuple_(Journal.timestamp, Journal.id) < (datetime.combine(today, datetime.min.time()), 500)
+        ).order_by(Journal.timestamp.desc(), Journal.id.desc()).limit(21),
+        'journal mood series': select(func.date(Journal.timestamp), Journal.mood, func.count()).where(
+            Journal.user_id == user_id).group_by(func.date(Journal.timestamp), Journal.mood),
+        'sentiment series': select(func.date(UserSentiment.timestamp), UserSentiment.sentiment, func.count()).where(
+            UserSentiment.user_id == user_id).group_by(func.date(UserSentiment.timestamp), UserSentiment.sentiment),
+        'goal activity count': select(func.count()).select_from(Activity).where(
+            Activity.user_id == user_id, Activity.goal_id == 1, Activity.date >= week_ago, Activity.completed == True),
+        'wellness rollups': select(DailyWellness).where(
+            DailyWellness.user_id == user_id, DailyWellness.day >= today - timedelta(days=30)),
+        'habit streak': select(HabitProgress).where(
+            HabitProgress.user_id == user_id, HabitProgress.date >= week_ago).order_by(HabitProgress.date.desc()),
+        'habit cleanup': delete(HabitProgress).where(
+            HabitProgress.user_id == user_id, HabitProgress.date < today - timedelta(days=30)),
+        'active reminders': select(Reminder).where(Reminder.user_id == user_id, Reminder.is_active == True),
+        'active goals': select(Goal).where(Goal.user_id == user_id, Goal.is_active == True),
+        'unread motivation': select(MotivationMessage).where(
+            MotivationMessage.user_id == user_id, MotivationMessage.is_read == False
+        ).order_by(MotivationMessage.created_at.desc()).limit(5),
+    }
+
+
+def _sqlite_value(value):
+    # How SQLAlchemy stores these types in SQLite
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def query_plan(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = compiled.construct_params()
+    values = tuple(_sqlite_value(params[name]) for name in compiled.positiontup)
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", values).fetchall()
+    return [row[-1] for row in rows]
+
+
+def check(engine):
+    failures = 0
+    with engine.connect() as conn:
+        for name, statement in hot_queries().items():
+            plan = query_plan(conn, statement)
+            full_scans = [step for step in plan if step.startswith('SCAN') and 'USING' not in step]
+            failures += bool(full_scans)
+            print(f"{'FAIL' if full_scans else 'ok':<5}{name:<22}{' | '.join(plan)}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', help='check this SQLite file instead of a synthetic one')
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'explain.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(db_path)}"
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    import app as app_module
+
+    with app_module.app.app_context():
+        if not args.db:
+            from synthetic_data import populate
+            populate(users=args.users)
+        failures = check(app_module.db.engine)
+    print(f"{failures} hot queries scan a full table")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Concurrent-request load test: sync gunicorn workers vs the ASGI entry point.
+
+Starts the app with LLM_BACKEND=fake (every model call takes
+FAKE_LLM_LATENCY_SECONDS, default 1.0) on a scratch database. For each chat
+route it then runs USERS concurrent chat clients, each sending ROUNDS
+messages, while a prober keeps calling /check_time_reminders. Reports chat
+throughput and latency, and how long the cheap route took while the chats
+were in flight. A /chat_stream reply counts as an error if its event stream
+ends in an error event or without a done event.
+
+    python benchmarks/load_test.py [--modes sync,asgi] [--routes chat,chat_stream] [--users 32] [--rounds 3] [--error-rate 0.05]
+
+Pass --url to load an already running server instead (real models and all).
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    # What .replit deploys today
+    'sync': ['gunicorn', 'app:app', '--workers=4', '--bind', '127.0.0.1:{port}', '--log-level', 'warning'],
+    'asgi': ['uvicorn', 'asgi:application', '--host', '127.0.0.1', '--port', '{port}', '--log-level', 'warning'],
+}
+
+
+class Client:
+    """Just enough HTTP/1.1 to drive the app: one connection per request, cookies kept"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookies = SimpleCookie()
+
+    async def request(self, method, path, json_body=None, form=None):
+        if json_body is not None:
+            body, content_type = json.dumps(json_body).encode(), 'application/json'
+        elif form is not None:
+            body, content_type = urlencode(form).encode(), 'application/x-www-form-urlencoded'
+        else:
+            body, content_type = b'', None
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        if self.cookies:
+            lines.append("Cookie: " + '; '.join(f"{k}={m.coded_value}" for k, m in self.cookies.items()))
+
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+        raw = await reader.read()
+        writer.close()
+
+        head, _, payload = raw.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin1').split('\r\n')
+        for line in header_lines:
+            name, _, value = line.partition(':')
+            if name.lower() == 'set-cookie':
+                self.cookies.load(value.strip())
+            if name.lower() == 'transfer-encoding' and 'chunked' in value:
+                payload = _dechunk(payload)
+        return int(status_line.split()[1]), payload
+
+
+def _dechunk(payload):
+    out = b''
+    while payload:
+        size_line, _, rest = payload.partition(b'\r\n')
+        size = int(size_line.split(b';')[0], 16)
+        if size == 0:
+            break
+        out += rest[:size]
+        payload = rest[size + 2:]
+    return out
+
+
+async def sign_up(url, n):
+    client = Client(url)
+    email = f"load-{os.getpid()}-{n}-{time.time_ns()}@example.com"
+    await client.request('POST', '/signup', form={'email': email, 'password': 'load-test'})
+    await client.request('POST', '/onboarding', form={'name': f'Load {n}', 'goal': 'sleep better'})
+    return client
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+def _failed(route, status, payload):
+    if status != 200:
+        return True
+    if route == 'chat_stream':
+        return b'event: error' in payload or b'event: done' not in payload
+    return False
+
+
+async def run_load(url, users, rounds, route='chat'):
+    clients = await asyncio.gather(*(sign_up(url, n) for n in range(users)))
+    chat_latencies, probe_latencies, errors = [], [], 0
+    done = asyncio.Event()
+
+    async def chatter(n, client):
+        nonlocal errors
+        for i in range(rounds):
+            started = time.perf_counter()
+            status, payload = await client.request('POST', f'/{route}', json_body={'message': f"Long day, load test {n}.{i}"})
+            chat_latencies.append(time.perf_counter() - started)
+            errors += _failed(route, status, payload)
+
+    async def prober():
+        while not done.is_set():
+            started = time.perf_counter()
+            await clients[0].request('GET', '/check_time_reminders')
+            probe_latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(0.1)
+
+    probe = asyncio.create_task(prober())
+    started = time.perf_counter()
+    await asyncio.gather(*(chatter(n, client) for n, client in enumerate(clients)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe
+
+    return {
+        'chat_requests': len(chat_latencies),
+        'errors': errors,
+        'throughput_rps': len(chat_latencies) / elapsed,
+        'chat_p50_s': _percentile(chat_latencies, 0.5),
+        'chat_p95_s': _percentile(chat_latencies, 0.95),
+        'probe_p50_s': _percentile(probe_latencies, 0.5),
+        'probe_max_s': max(probe_latencies, default=0.0),
+    }
+
+
+def start_server(mode, port, env):
+    command = [part.format(port=port) for part in SERVERS[mode]]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            asyncio.run(Client(f"http://127.0.0.1:{port}").request('GET', '/login'))
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modes', default='sync,asgi')
+    parser.add_argument('--routes', default='chat,chat_stream')
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of model calls the fake backend fails')
+    parser.add_argument('--url', help='load an already running server instead of starting one')
+    args = parser.parse_args()
+
+    if args.url:
+        for route in args.routes.split(','):
+            print(route, json.dumps(asyncio.run(run_load(args.url, args.users, args.rounds, route)), indent=2))
+        return 0
+
+    workdir = tempfile.mkdtemp()
+    # A fixed SECRET_KEY so session cookies are valid across gunicorn workers
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load.db')}", SECRET_KEY='load-test',
+               CACHE_PATH=os.path.join(workdir, 'cache.db'), LLM_BACKEND='fake', FAKE_LLM_ERROR_RATE=str(args.error_rate))
+    env.setdefault('FAKE_LLM_LATENCY_SECONDS', '1.0')
+    env.setdefault('LOG_LEVEL', 'WARNING')
+    # Create the schema once so the workers don't race to do it
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, env=env, check=True)
+
+    print(f"{args.users} users x {args.rounds} chats, {float(env['FAKE_LLM_LATENCY_SECONDS']):.1f}s per model call, "
+          f"{args.error_rate:.0%} injected model errors")
+    for mode in args.modes.split(','):
+        process = start_server(mode, args.port, env)
+        try:
+            for route in args.routes.split(','):
+                result = asyncio.run(run_load(f"http://127.0.0.1:{args.port}", args.users, args.rounds, route))
+                print(f"{mode:>5} /{route:<12}: {result['throughput_rps']:.1f} chats/s, chat p50 {result['chat_p50_s']:.2f}s "
+                      f"p95 {result['chat_p95_s']:.2f}s, /check_time_reminders p50 {result['probe_p50_s'] * 1000:.0f}ms "
+                      f"max {result['probe_max_s'] * 1000:.0f}ms, {result['errors']} errors")
+        finally:
+            process.terminate()
+            process.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Throwaway local PostgreSQL cluster for running the benchmarks against Postgres.
+
+Needs the PostgreSQL server binaries (initdb, pg_ctl) on PATH, or their directory
+in PG_BIN, plus the psycopg2 driver. The cluster lives in a temp directory,
+listens on a Unix socket there and on a free localhost port, runs with
+fsync off (fine for relative numbers, not for durability) and is deleted on exit.
+
+    python benchmarks/routes_bench.py --postgres
+    python benchmarks/local_postgres.py    # prints a DATABASE_URL, Ctrl-C to stop
+"""
+import contextlib
+import getpass
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+
+
+def _binary(name):
+    path = os.path.join(os.environ['PG_BIN'], name) if os.environ.get('PG_BIN') else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise RuntimeError(f"{name} not found; install PostgreSQL or set PG_BIN")
+    return path
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_postgres(database='emoai'):
+    """Start a scratch cluster; yields its SQLAlchemy URL"""
+    workdir = tempfile.mkdtemp(prefix='emoai-pg-')
+    datadir = os.path.join(workdir, 'data')
+    port = _free_port()
+    user = getpass.getuser()
+    subprocess.run([_binary('initdb'), '-D', datadir, '-U', user, '--auth=trust', '-E', 'UTF8'],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([_binary('pg_ctl'), '-D', datadir, '-l', os.path.join(workdir, 'server.log'), '-w',
+                    '-o', f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1 -c fsync=off",
+                    'start'], check=True, stdout=subprocess.DEVNULL)
+    try:
+        subprocess.run([_binary('createdb'), '-h', workdir, '-p', str(port), '-U', user, database], check=True)
+        yield f"postgresql://{user}@127.0.0.1:{port}/{database}"
+    finally:
+        subprocess.run([_binary('pg_ctl'), '-D', datadir, '-m', 'fast', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    with local_postgres() as url:
+        print(f"DATABASE_URL={url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,56 @@
+"""Measure the chat pre-filter against the labelled corpus.
+
+Every message labelled "event" or "calendar" must pass the pre-filter, since a
+filtered message never reaches event extraction or calendar-query detection.
+Messages labelled "none" that get filtered are LLM calls saved.
+
+    python benchmarks/prefilter_recall.py
+"""
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_core_1762554001118 import might_mention_event_or_calendar
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prefilter_corpus.jsonl')
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    corpus = load_corpus()
+    positives = [row for row in corpus if row['label'] != 'none']
+    negatives = [row for row in corpus if row['label'] == 'none']
+
+    missed = [row for row in positives if not might_mention_event_or_calendar(row['message'])]
+    filtered = [row for row in negatives if not might_mention_event_or_calendar(row['message'])]
+
+    started = time.perf_counter()
+    rounds = 200
+    for _ in range(rounds):
+        for row in corpus:
+            might_mention_event_or_calendar(row['message'])
+    per_message_us = (time.perf_counter() - started) / (rounds * len(corpus)) * 1e6
+
+    recall = 1 - len(missed) / len(positives)
+    skip_rate = len(filtered) / len(negatives)
+    print(f"corpus: {len(positives)} event/calendar, {len(negatives)} other")
+    print(f"recall on event/calendar messages: {recall:.1%}")
+    print(f"other messages kept away from the models: {skip_rate:.1%}")
+    print(f"pre-filter cost: {per_message_us:.1f} us/message")
+
+    for row in missed:
+        print(f"  MISSED [{row['label']}] {row['message']}")
+
+    return 1 if missed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Minimal Redis-protocol server for exercising cache.RedisCache locally.
+
+Implements just what the cache uses (PING, AUTH, SELECT, GET, SET with EX/PX,
+DEL, SCAN with MATCH/COUNT, DBSIZE, FLUSHDB) on a single in-memory dict.
+It is a stand-in for development and benchmarks, not a Redis replacement.
+
+    python benchmarks/resp_server.py --port 6390
+    CACHE_BACKEND=redis CACHE_URL=redis://127.0.0.1:6390/0 gunicorn app:app --workers=4
+"""
+import argparse
+import fnmatch
+import socketserver
+import threading
+import time
+
+_store = {}
+_store_lock = threading.Lock()
+
+
+def _alive(key, now):
+    entry = _store.get(key)
+    if entry is None:
+        return None
+    if entry[1] is not None and entry[1] <= now:
+        del _store[key]
+        return None
+    return entry
+
+
+def _encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    if isinstance(value, bool):
+        return b"+OK\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return f"${len(value)}\r\n".encode() + value + b"\r\n"
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b''.join(_encode(item) for item in value)
+    return f"+{value}\r\n".encode()
+
+
+def execute(args):
+    command = args[0].upper()
+    now = time.time()
+    with _store_lock:
+        if command in (b'PING',):
+            return 'PONG'
+        if command in (b'AUTH', b'SELECT'):
+            return True
+        if command == b'GET':
+            entry = _alive(args[1], now)
+            return entry[0] if entry else None
+        if command == b'SET':
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            if b'PX' in options:
+                expires_at = now + int(args[3 + options.index(b'PX') + 1]) / 1000
+            elif b'EX' in options:
+                expires_at = now + int(args[3 + options.index(b'EX') + 1])
+            _store[args[1]] = (args[2], expires_at)
+            return True
+        if command == b'DEL':
+            return sum(1 for key in args[1:] if _alive(key, now) and _store.pop(key, None))
+        if command == b'SCAN':
+            # The whole keyspace in one page; cursor is always 0 on return
+            pattern = b'*'
+            if b'MATCH' in [arg.upper() for arg in args]:
+                pattern = args[[arg.upper() for arg in args].index(b'MATCH') + 1]
+            keys = [key for key in list(_store) if _alive(key, now)
+                    and fnmatch.fnmatchcase(key.decode('utf-8', 'replace'), pattern.decode('utf-8', 'replace'))]
+            return [b'0', keys]
+        if command == b'DBSIZE':
+            return len(_store)
+        if command == b'FLUSHDB':
+            _store.clear()
+            return True
+    return ValueError(f"unknown command '{command.decode()}'")
+
+
+class RESPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            if not line.startswith(b'*'):
+                continue
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            self.wfile.write(_encode(execute(args)))
+
+
+class RESPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_in_thread(host='127.0.0.1', port=0):
+    """Start a server on a background thread; returns (server, url)"""
+    server = RESPServer((host, port), RESPHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"redis://{host}:{server.server_address[1]}/0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+    server = RESPServer((args.host, args.port), RESPHandler)
+    print(f"RESP stand-in listening on redis://{args.host}:{args.port}/0")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+"""End-to-end latency, query count and allocation benchmark for the Flask routes.
+
+Builds a scratch SQLite database of synthetic users (synthetic_data.py),
+then drives each route in ROUTES through the Flask test client as those
+users, with the fake LLM backend standing in for Gemini. Reports per route:
+
+    p50 / p95 / p99 latency   timing pass, no tracing
+    queries per request       SQL statements seen by the engine
+    commits per request       transactions committed (each one an fsync on SQLite)
+    peak KiB per request      tracemalloc peak, in a separate pass
+
+The numbers are compared against routes_baseline.json, which records the
+--users and --requests it was made with; other values are not compared,
+since cache hit rates (and so queries per request) depend on them. Queries
+and commits per request must not grow. Timings are too noisy on a shared
+machine to gate on, so a p50 more than --tolerance and --floor-ms above
+the baseline is only reported. Pass --save-baseline after an intentional
+change.
+
+    python benchmarks/routes_bench.py [--users 100] [--requests 200] [--check]
+
+--postgres runs the same routes against a throwaway local PostgreSQL
+(local_postgres.py), and --database-url against any empty database.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, BENCH_DIR)
+BASELINE_PATH = os.path.join(BENCH_DIR, 'routes_baseline.json')
+
+# (name, method, path, json body); the LLM is the fake backend with no latency
+ROUTES = [
+    ('chat', 'POST', '/chat', {'message': "Long day at work, I'm pretty tired"}),
+    ('chat_stream', 'POST', '/chat_stream', {'message': "Long day at work, I'm pretty tired"}),
+    ('dashboard', 'GET', '/dashboard', None),
+    ('wellness_score', 'GET', '/wellness_score', None),
+    ('journal_analytics', 'GET', '/journal/analytics', None),
+    ('journal_page', 'GET', '/journal', None),
+    ('get_journals', 'GET', '/get_journals', None),
+    ('journal_mood_series', 'GET', '/journal_mood_series?bucket=week', None),
+    ('analytics_series', 'GET', '/analytics_series?bucket=week&points=60', None),
+    ('sentiment_trends', 'GET', '/sentiment_trends', None),
+    ('get_events', 'GET', '/get_events', None),
+    ('check_time_reminders', 'GET', '/check_time_reminders', None),
+]
+
+
+def setup_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    # A fresh per-user cache, so entries from an earlier run's user ids are never hit
+    os.environ['CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'cache.db')
+    os.environ['LLM_BACKEND'] = 'fake'
+    os.environ['FAKE_LLM_LATENCY_SECONDS'] = '0'
+    os.environ.setdefault('SECRET_KEY', 'bench')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+    return app_module
+
+
+def count_queries(engine):
+    from sqlalchemy import event
+
+    counter = {'n': 0, 'commits': 0}
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter['n'] += 1
+
+    @event.listens_for(engine, 'commit')
+    def _count_commit(conn):
+        counter['commits'] += 1
+
+    return counter
+
+
+def client_for(app, user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+    return client
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct * (len(values) - 1))))]
+
+
+def run_route(clients, counter, route, requests):
+    name, method, path, body = route
+    timings, queries, commits = [], [], []
+    for i in range(requests):
+        client = clients[i % len(clients)]
+        before, commits_before = counter['n'], counter['commits']
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, buffered=True)
+        timings.append(time.perf_counter() - started)
+        queries.append(counter['n'] - before)
+        commits.append(counter['commits'] - commits_before)
+        if response.status_code != 200:
+            raise RuntimeError(f"{name}: HTTP {response.status_code} for user request {i}")
+
+    peaks = []
+    tracemalloc.start()
+    for i in range(max(10, requests // 10)):
+        client = clients[i % len(clients)]
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        client.open(path, method=method, json=body, buffered=True)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'p50_ms': _percentile(timings, 0.50) * 1000,
+        'p95_ms': _percentile(timings, 0.95) * 1000,
+        'p99_ms': _percentile(timings, 0.99) * 1000,
+        'queries_per_request': statistics.mean(queries),
+        'max_queries': max(queries),
+        'commits_per_request': statistics.mean(commits),
+        'peak_kib': statistics.mean(peaks) / 1024,
+    }
+
+
+def compare(results, baseline, tolerance, floor_ms):
+    """(regressions, timing notes) against the baseline"""
+    problems, notes = [], []
+    for name, result in results.items():
+        base = baseline.get('routes', {}).get(name)
+        if not base:
+            continue
+        if result['queries_per_request'] > base['queries_per_request'] + 0.01:
+            problems.append(f"{name}: {result['queries_per_request']:.1f} queries/request "
+                            f"(baseline {base['queries_per_request']:.1f})")
+        if result['commits_per_request'] > base.get('commits_per_request', float('inf')) + 0.01:
+            problems.append(f"{name}: {result['commits_per_request']:.1f} commits/request "
+                            f"(baseline {base['commits_per_request']:.1f})")
+        if result['p50_ms'] > max(base['p50_ms'] * (1 + tolerance), base['p50_ms'] + floor_ms):
+            notes.append(f"{name}: p50 {result['p50_ms']:.1f} ms (baseline {base['p50_ms']:.1f} ms)")
+    return problems, notes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--routes', help='comma-separated subset of route names')
+    parser.add_argument('--db', help='keep the synthetic database at this path (reused if it exists)')
+    parser.add_argument('--database-url', help='use this database instead of SQLite (filled if it has no bench users)')
+    parser.add_argument('--postgres', action='store_true', help='start a throwaway local PostgreSQL and use it')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit 1 on a regression against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='relative p50 growth worth reporting')
+    parser.add_argument('--floor-ms', type=float, default=2.0, help='absolute p50 growth worth reporting')
+    args = parser.parse_args()
+
+    if args.postgres:
+        from local_postgres import local_postgres
+        with local_postgres() as url:
+            return run(args, url)
+    if args.database_url:
+        return run(args, args.database_url)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), 'routes_bench.db')
+    return run(args, f"sqlite:///{os.path.abspath(db_path)}")
+
+
+def run(args, database_url):
+    app_module = setup_app(database_url)
+    app, db = app_module.app, app_module.db
+
+    with app.app_context():
+        user_ids = [uid for (uid,) in db.session.query(app_module.User.id).filter(
+            app_module.User.email.like('bench%')).limit(args.users)]
+        if not user_ids:
+            from synthetic_data import populate
+            started = time.perf_counter()
+            user_ids = populate(users=args.users)
+            print(f"built {len(user_ids)} synthetic users in {time.perf_counter() - started:.1f}s "
+                  f"({db.engine.dialect.name})")
+        counter = count_queries(db.engine)
+        dialect = db.engine.dialect.name
+
+    clients = [client_for(app, uid) for uid in user_ids]
+    selected = [r for r in ROUTES if not args.routes or r[0] in args.routes.split(',')]
+
+    results = {}
+    for route in selected:
+        # Warm caches and lazy imports before timing
+        for client in clients[:5]:
+            client.open(route[2], method=route[1], json=route[3], buffered=True)
+        results[route[0]] = run_route(clients, counter, route, args.requests)
+
+    print(f"{'route':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'commits':>9}{'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+              f"{r['queries_per_request']:>9.1f}{r['commits_per_request']:>9.1f}{r['peak_kib']:>10.0f}")
+
+    if dialect != 'sqlite':
+        # The committed baseline is for the default SQLite setup
+        return 0
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({'users': args.users, 'requests': args.requests, 'routes': results}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline saved to {os.path.relpath(BASELINE_PATH, ROOT)}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        return 0
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    if (baseline.get('users'), baseline.get('requests')) != (args.users, args.requests):
+        print(f"  not compared: the baseline was made with --users {baseline.get('users')} "
+              f"--requests {baseline.get('requests')}")
+        return 2 if args.check else 0
+    problems, notes = compare(results, baseline, args.tolerance, args.floor_ms)
+    for note in notes:
+        print(f"  slower (advisory) {note}")
+    for problem in problems:
+        print(f"  REGRESSION {problem}")
+    return 1 if problems and args.check else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Check the incremental sentiment trend aggregates against the raw rows.
+
+Randomized users send messages through sentiment_trends.record(), as
+finish_chat_turn() does, with the edges mixed in: mixed-case and unknown
+categories, missing and out-of-range intensities, sessions of one message
+and sessions spread over several days. Then:
+
+- trends() must match reference(), which reads every user_sentiments row and
+  recomputes the averages, histograms and session arcs in plain Python;
+- the incremental aggregates must equal a rebuild from user_sentiments;
+- trends() must use the same number of queries for 1 message or thousands.
+
+It also reports the time per record() and per trends() call.
+
+    python benchmarks/sentiment_parity.py [--users 40] [--seed 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SENTIMENTS = ['happy', 'sad', 'anxious', 'frustrated', 'neutral', 'confused', 'Happy', 'SAD', 'excited', '']
+INTENSITIES = [None, -0.3, 0.0, 0.2, 0.5, 0.5, 0.81, 1.0, 1.4]
+
+
+def reference(user_id, sessions):
+    """trends() from every raw row, in plain Python"""
+    from models import UserSentiment
+    from sentiment_trends import ALPHA, CATEGORIES, KEEP, arc, observation
+
+    rows = UserSentiment.query.filter_by(user_id=user_id).order_by(UserSentiment.timestamp, UserSentiment.id).all()
+    ewma = dict.fromkeys(CATEGORIES, 0.0)
+    hours, weekdays, arcs = {}, {}, {}
+    for row in rows:
+        category, intensity = observation(row.sentiment, row.intensity)
+        for c in CATEGORIES:
+            ewma[c] = ewma[c] * KEEP + (ALPHA * intensity if c == category else 0.0)
+        for table, key in ((hours, row.timestamp.hour), (weekdays, row.timestamp.weekday())):
+            table.setdefault(key, []).append((category, intensity))
+        arcs.setdefault(row.session_id, []).append((row.timestamp, category, intensity))
+
+    weights = {c: round(w / (1.0 - KEEP ** len(rows)), 3) for c, w in ewma.items()} if rows else {}
+
+    def histogram(table, size):
+        sentiments = {}
+        for i, readings in table.items():
+            for category, _ in readings:
+                sentiments.setdefault(category, [0] * size)[i] += 1
+        return {
+            'count': [len(table.get(i, [])) for i in range(size)],
+            'intensity': [round(sum(x for _, x in table[i]) / len(table[i]), 3) if i in table else None for i in range(size)],
+            'sentiments': dict(sorted(sentiments.items()))
+        }
+
+    ordered = sorted(arcs.items(), key=lambda item: item[1][-1][0], reverse=True)[:sessions]
+    expected_sessions = []
+    for session_id, readings in ordered:
+        (_, first_c, first_x), (_, last_c, last_x) = readings[0], readings[-1]
+        peak = readings[0]
+        for reading in readings[1:]:
+            if reading[2] > peak[2]:
+                peak = reading
+        expected_sessions.append({
+            'session_id': session_id, 'messages': len(readings), 'arc': arc(first_c, first_x, last_c, last_x),
+            'first': (first_c, first_x), 'last': (last_c, last_x), 'peak': (peak[1], peak[2])
+        })
+    return {
+        'messages': len(rows),
+        'weights': weights,
+        'by_hour': histogram(hours, 24),
+        'by_weekday': histogram(weekdays, 7),
+        'sessions': expected_sessions
+    }
+
+
+def matches(actual, expected):
+    got_sessions = [{
+        'session_id': s['session_id'], 'messages': s['messages'], 'arc': s['arc'],
+        'first': (s['first']['sentiment'], s['first']['intensity']),
+        'last': (s['last']['sentiment'], s['last']['intensity']),
+        'peak': (s['peak']['sentiment'], s['peak']['intensity'])
+    } for s in actual['sessions']]
+    problems = []
+    if actual['messages'] != expected['messages']:
+        problems.append(f"messages {actual['messages']} vs {expected['messages']}")
+    if actual['recent']['weights'] != expected['weights']:
+        problems.append("recent weights")
+    for name in ('by_hour', 'by_weekday'):
+        got, want = actual[name], expected[name]
+        # Means are summed in a different order, so the third decimal may round either way
+        close = all((g is None) == (w is None) and (g is None or abs(g - w) < 0.0011)
+                    for g, w in zip(got['intensity'], want['intensity']))
+        if got['count'] != want['count'] or got['sentiments'] != want['sentiments'] or not close:
+            problems.append(name)
+    if got_sessions != expected['sessions']:
+        problems.append("session arcs")
+    return problems
+
+
+def aggregate_rows():
+    from models import db, SentimentProfile, SentimentSlot, SentimentSession
+
+    def rows(model, skip=('id',)):
+        columns = [c.name for c in model.__table__.columns if c.name not in skip]
+        return sorted(tuple(getattr(r, c) for c in columns) for r in db.session.query(model))
+    return [rows(model) for model in (SentimentProfile, SentimentSlot, SentimentSession)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sentiment.db')}"
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+    from sqlalchemy import event
+    from models import db, User, UserSentiment, IST
+    from sentiment_trends import backfill, record, trends
+
+    rng = random.Random(args.seed)
+    now = datetime.now(IST).replace(tzinfo=None)
+    failures = 0
+    with app_module.app.app_context():
+        # User n sends about 4**(n % 6) messages, from 1 to ~1000
+        sizes = {}
+        for n in range(args.users):
+            user = User(email=f'sentiment{n}@example.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            sizes[user.id] = max(1, int(4 ** (n % 6) * rng.uniform(0.5, 1.0)))
+        db.session.commit()
+
+        started = time.perf_counter()
+        recorded = 0
+        for user_id, messages in sizes.items():
+            at = now - timedelta(days=rng.randrange(400))
+            session, left = 0, 0
+            for _ in range(messages):
+                if left == 0:
+                    session, left = session + 1, rng.choice([1, 1, 3, 8, 25])
+                    at += timedelta(hours=rng.randrange(1, 72))
+                at += timedelta(minutes=rng.randrange(1, 30))
+                row = UserSentiment(user_id=user_id, session_id=f's{user_id}-{session}', sentiment=rng.choice(SENTIMENTS),
+                                    intensity=rng.choice(INTENSITIES), timestamp=at)
+                db.session.add(row)
+                record(row)
+                left -= 1
+                recorded += 1
+            db.session.commit()
+        per_record = (time.perf_counter() - started) / recorded
+        print(f"recorded {recorded} messages for {args.users} users: {per_record * 1e6:.0f} us each")
+
+        mismatched = 0
+        for user_id in sizes:
+            problems = matches(trends(user_id, sessions=50), reference(user_id, 50))
+            if problems:
+                mismatched += 1
+                print(f"user {user_id}: {', '.join(problems)} differ")
+        print(f"incremental: {mismatched} of {args.users} users differ from the raw rows")
+        failures += mismatched
+
+        incremental = aggregate_rows()
+        backfill(db.engine, list(sizes))
+        db.session.expire_all()
+        drift = incremental != aggregate_rows()
+        if drift:
+            print("incremental aggregates differ from a rebuild")
+        failures += drift
+
+        queries = [0]
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+        by_size = {}
+        for user_id, messages in sizes.items():
+            queries[0] = 0
+            started = time.perf_counter()
+            trends(user_id)
+            by_size[messages] = (queries[0], time.perf_counter() - started)
+        largest = max(by_size)
+        print(f"trends(): {by_size[min(by_size)][0]} queries for {min(by_size)} message(s), "
+              f"{by_size[largest][0]} queries and {by_size[largest][1] * 1000:.1f} ms for {largest}")
+        if len({q for q, _ in by_size.values()}) != 1:
+            print(f"query count varies: {sorted({q for q, _ in by_size.values()})}")
+            failures += 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Concurrent-write benchmark for the SQLite engine profiles in db_engine.py.
+
+Starts WORKERS processes, standing in for gunicorn workers, against one
+scratch database. Each process replays TURNS chat turns the way /chat
+writes them: it reads the session history, then commits the user message,
+the sentiment and the reply together (--split-commits commits each one
+separately, as /chat used to). Meanwhile READERS threads per process
+poll the active-reminders query. The run is repeated for each SQLITE_PROFILE
+and reports turn throughput, turn latency and "database is locked" failures.
+
+    python benchmarks/sqlite_write_bench.py [--profiles default,tuned] [--workers 4] [--turns 200]
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+
+def worker(n, turns, readers, split_commits, start, results):
+    import app as app_module
+    from sqlalchemy.exc import OperationalError
+    from models import db, ChatMessage, UserSentiment, Reminder
+
+    latencies, errors, reads = [], 0, 0
+    stop = threading.Event()
+
+    def reader():
+        nonlocal reads
+        with app_module.app.app_context():
+            while not stop.is_set():
+                Reminder.query.filter_by(user_id=n + 1, is_active=True).all()
+                db.session.rollback()
+                reads += 1
+
+    with app_module.app.app_context():
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        start.wait()
+        for thread in threads:
+            thread.start()
+        session_id = f'write-bench-{n}'
+        for i in range(turns):
+            started = time.perf_counter()
+            try:
+                ChatMessage.query.filter_by(user_id=n + 1, session_id=session_id).order_by(ChatMessage.timestamp).all()
+                rows = [ChatMessage(user_id=n + 1, session_id=session_id, role='user', content=f'turn {i}'),
+                        UserSentiment(user_id=n + 1, session_id=session_id, sentiment='neutral', intensity=0.5),
+                        ChatMessage(user_id=n + 1, session_id=session_id, role='model', content=f'reply {i}')]
+                for row in rows:
+                    db.session.add(row)
+                    if split_commits:
+                        db.session.commit()
+                db.session.commit()
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    results.put((latencies, errors, reads))
+
+
+def run_profile(profile, workers, turns, readers, split_commits=False):
+    workdir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'writes.db')}"
+    os.environ['CACHE_PATH'] = os.path.join(workdir, 'cache.db')
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+    ctx = multiprocessing.get_context('spawn')
+    start, results = ctx.Barrier(workers + 1), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(n, turns, readers, split_commits, start, results)) for n in range(workers)]
+    for process in processes:
+        process.start()
+    start.wait()
+    started = time.perf_counter()
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    latencies = [l for c in collected for l in c[0]]
+    return {
+        'turns_per_s': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p95_ms': _percentile(latencies, 0.95) * 1000,
+        'max_ms': max(latencies) * 1000,
+        'locked': sum(c[1] for c in collected),
+        'reads_per_s': sum(c[2] for c in collected) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default='default,tuned')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--readers', type=int, default=2, help='polling reader threads per worker')
+    parser.add_argument('--split-commits', action='store_true', help='commit each row of a turn separately')
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.turns} turns ({'3 commits' if args.split_commits else '1 commit'} each), "
+          f"{args.readers} readers per worker")
+    for profile in args.profiles.split(','):
+        r = run_profile(profile, args.workers, args.turns, args.readers, args.split_commits)
+        print(f"{profile:>8}: {r['turns_per_s']:.0f} turns/s, p50 {r['p50_ms']:.1f}ms p95 {r['p95_ms']:.1f}ms "
+              f"max {r['max_ms']:.0f}ms, {r['locked']} locked errors, {r['reads_per_s']:.0f} reads/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""Deterministic synthetic users and history for the benchmarks.
+
+populate() fills an empty database (created by importing app) with USERS
+users, each with a profile and months of chat, journal, sleep, goal/activity,
+habit, event, reminder and sentiment rows spread around today's date.
+Rows go in with bulk inserts, so a few hundred users take seconds.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from models import (db, User, UserProfile, Journal, ChatMessage, HabitProgress, Reminder, Goal,
+                    Activity, SleepLog, Event, UserSentiment, IST)
+import sentiment_trends
+from wellness import backfill
+
+# Rows per user; roughly a few months of daily use
+SCALE = {
+    'chat_sessions': 20,
+    'messages_per_session': 20,
+    'journal_days': 120,
+    'sleep_days': 90,
+    'goals': 3,
+    'activity_days': 90,
+    'events': 40,
+    'reminders': 8,
+}
+
+MOODS = ['happy', 'grateful', 'hopeful', 'content', 'neutral', 'anxious', 'stressed', 'sad', 'frustrated']
+SENTIMENTS = ['happy', 'sad', 'anxious', 'frustrated', 'neutral', 'confused']
+USER_LINES = [
+    "Work was a lot today and I'm tired.",
+    "I went for a run this morning, felt great!",
+    "Couldn't sleep again last night.",
+    "I have a dentist appointment tomorrow at 3pm",
+    "What's on my calendar this week?",
+    "I skipped my reading goal again.",
+]
+MODEL_LINES = [
+    "That sounds heavy; what's weighing on you most?",
+    "That's real progress, even if it feels small.",
+    "Rest matters; what usually keeps you up?",
+]
+PASSWORD_HASH = '$2b$12$benchmarkbenchmarkbenchmarkbenchmarkbenchmarkbenchmark'
+
+
+def _chunks(rows, size=5000):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def _insert(model, rows):
+    for chunk in _chunks(rows):
+        db.session.execute(insert(model), chunk)
+
+
+def populate(users=100, seed=7, scale=None):
+    """Insert the synthetic data; returns the list of user ids"""
+    scale = dict(SCALE, **(scale or {}))
+    rng = random.Random(seed)
+    now = datetime.now(IST).replace(tzinfo=None)
+    today = now.date()
+
+    first_id = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    user_ids = list(range(first_id, first_id + users))
+    _insert(User, [{'id': uid, 'email': f'bench{uid}@example.com', 'password_hash': PASSWORD_HASH,
+                    'created_at': now - timedelta(days=180)} for uid in user_ids])
+    _insert(UserProfile, [{'user_id': uid, 'name': f'Bench {uid}', 'age': 20 + uid % 40,
+                           'goal': 'Sleep earlier and read every day', 'reminder_enabled': True,
+                           'reminder_time': f"{rng.randrange(6, 23):02d}:00"} for uid in user_ids])
+
+    messages, sentiments, journals, sleep, habits, goals, activities, events, reminders = ([] for _ in range(9))
+    goal_id = (db.session.query(db.func.max(Goal.id)).scalar() or 0) + 1
+    for uid in user_ids:
+        for s in range(scale['chat_sessions']):
+            session_id = f'bench-{uid}-{s}'
+            started = now - timedelta(days=scale['chat_sessions'] - s, minutes=rng.randrange(600))
+            for m in range(scale['messages_per_session']):
+                role = 'user' if m % 2 == 0 else 'model'
+                content = rng.choice(USER_LINES if role == 'user' else MODEL_LINES)
+                messages.append({'user_id': uid, 'session_id': session_id, 'role': role, 'content': content,
+                                 'timestamp': started + timedelta(minutes=m)})
+                if role == 'user':
+                    sentiments.append({'user_id': uid, 'session_id': session_id, 'sentiment': rng.choice(SENTIMENTS),
+                                       'intensity': round(rng.random(), 2), 'timestamp': started + timedelta(minutes=m)})
+
+        for d in range(scale['journal_days']):
+            if rng.random() < 0.7:
+                journals.append({'user_id': uid, 'mood': rng.choice(MOODS),
+                                 'summary': 'My Reflection Today: a steady day with some ups and downs.',
+                                 'goal_progress': 'Read 10 pages', 'timestamp': now - timedelta(days=d, hours=rng.randrange(12))})
+        for d in range(scale['sleep_days']):
+            if rng.random() < 0.8:
+                sleep.append({'user_id': uid, 'date': today - timedelta(days=d), 'bedtime': '23:30', 'wake_time': '07:00',
+                              'hours_slept': round(rng.uniform(4.5, 9.5), 1), 'quality_rating': rng.randrange(1, 6),
+                              'notes': '', 'timestamp': now - timedelta(days=d)})
+        for d in range(30):
+            if rng.random() < 0.6:
+                habits.append({'user_id': uid, 'date': today - timedelta(days=d), 'progress_note': 'Did it', 'mood': 'good',
+                               'timestamp': now - timedelta(days=d)})
+        for g in range(scale['goals']):
+            goals.append({'id': goal_id, 'user_id': uid, 'title': f'Goal {g}', 'goal_type': rng.choice(['exercise', 'reading', 'sleep']),
+                          'target_days': 30, 'is_active': g < 2, 'created_at': now - timedelta(days=120)})
+            for d in range(scale['activity_days']):
+                if rng.random() < 0.5:
+                    activities.append({'goal_id': goal_id, 'user_id': uid, 'date': today - timedelta(days=d),
+                                       'activity_type': 'session', 'completed': True, 'timestamp': now - timedelta(days=d)})
+            goal_id += 1
+        for e in range(scale['events']):
+            offset = rng.randrange(-60, 30)
+            events.append({'user_id': uid, 'title': f'Event {e}', 'event_date': today + timedelta(days=offset),
+                           'event_time': f"{rng.randrange(8, 21):02d}:{rng.choice(['00', '30'])}" if rng.random() < 0.7 else None,
+                           'is_confirmed': rng.random() < 0.6, 'created_at': now - timedelta(days=max(0, -offset) + 1)})
+        for r in range(scale['reminders']):
+            reminders.append({'user_id': uid, 'message': f'Reminder {r}', 'time': f"{rng.randrange(6, 23):02d}:{rng.randrange(60):02d}",
+                              'is_active': r % 4 != 0, 'created_at': now - timedelta(days=30)})
+
+    for model, rows in ((ChatMessage, messages), (UserSentiment, sentiments), (Journal, journals), (SleepLog, sleep),
+                        (HabitProgress, habits), (Goal, goals), (Activity, activities), (Event, events), (Reminder, reminders)):
+        _insert(model, rows)
+    if db.engine.dialect.name == 'postgresql':
+        # Users and goals were inserted with explicit ids; move their sequences past them
+        for table in ('users', 'goals'):
+            db.session.execute(db.text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+    db.session.commit()
+    # Bulk inserts bypass the write paths that keep the wellness rollups and sentiment trends current
+    backfill(db.engine, user_ids)
+    sentiment_trends.backfill(db.engine, user_ids)
+    return user_ids
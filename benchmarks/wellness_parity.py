@@ -0,0 +1,271 @@
+"""Check that wellness.compute_wellness() matches the original /wellness_score loop.
+
+legacy_wellness() is the per-row implementation /wellness_score used before
+wellness.py, kept here as the reference. Both run for randomized users whose
+data covers the edges: sleep hours on every bucket boundary, missing and
+zero ratings, mixed-case and unknown moods, inactive goals, incomplete
+activities, rows exactly on the window starts, and users with no data.
+
+The rollups are built twice: by the backfill from bulk-inserted rows, then
+incrementally as more journals, sleep logs (new and edited), activities and
+deleted journals go through the record_*() helpers the routes use. After
+each, the scores must be identical for several values of today, the
+incremental rollups must equal a fresh rebuild, and the engine must use the
+same number of queries for a user with 0, 1 or 60 active goals.
+
+    python benchmarks/wellness_parity.py [--users 300] [--seed 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MOODS = ['happy', 'Happy', 'GRATEFUL', 'hopeful', 'content', 'neutral', 'anxious', 'Stressed', 'sad',
+         'frustrated', 'meh', 'excited', '']
+HOURS = [None, 0, 3.5, 4, 4.5, 5, 5.5, 6, 6.5, 6.999, 7, 8, 9, 9.001, 9.5, 10, 10.001, 11, 14]
+RATINGS = [None, 0, 1, 2, 3, 4, 5]
+
+
+def legacy_wellness(user_id, today):
+    from models import Journal, SleepLog, Goal, Activity
+
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+
+    journal_entries = Journal.query.filter(
+        Journal.user_id == user_id,
+        Journal.timestamp >= datetime.combine(week_ago, datetime.min.time())
+    ).all()
+    if journal_entries:
+        mood_values = {'happy': 100, 'grateful': 90, 'hopeful': 85, 'content': 80,
+                       'neutral': 70, 'anxious': 50, 'stressed': 40, 'sad': 30, 'frustrated': 20}
+        avg_mood = sum(mood_values.get(j.mood.lower(), 70) for j in journal_entries) / len(journal_entries)
+        mood_score = avg_mood * 0.25
+    else:
+        mood_score = 50 * 0.25
+
+    sleep_logs = SleepLog.query.filter(SleepLog.user_id == user_id, SleepLog.date >= week_ago).all()
+    if sleep_logs:
+        total_sleep_score = 0
+        for log in sleep_logs:
+            hours = log.hours_slept or 0
+            quality = log.quality_rating or 3
+            if 7 <= hours <= 9:
+                duration_score = 50
+            elif 6 <= hours < 7:
+                duration_score = 40
+            elif 9 < hours <= 10:
+                duration_score = 45
+            elif 5 <= hours < 6:
+                duration_score = 30
+            elif 4 <= hours < 5:
+                duration_score = 20
+            else:
+                duration_score = 10
+            total_sleep_score += min(duration_score + quality * 10, 100)
+        sleep_score = total_sleep_score / len(sleep_logs) * 0.25
+    else:
+        sleep_score = 50 * 0.25
+
+    goals = Goal.query.filter_by(user_id=user_id, is_active=True).all()
+    if goals:
+        total_activities = 0
+        for goal in goals:
+            total_activities += Activity.query.filter(
+                Activity.user_id == user_id,
+                Activity.goal_id == goal.id,
+                Activity.date >= week_ago,
+                Activity.completed == True
+            ).count()
+        habit_score = min((total_activities / 7) * 100, 100) * 0.25
+    else:
+        habit_score = 50 * 0.25
+
+    all_month_journals = Journal.query.filter(
+        Journal.user_id == user_id,
+        Journal.timestamp >= datetime.combine(month_ago, datetime.min.time())
+    ).count()
+    journal_consistency_score = min((all_month_journals / (today - month_ago).days) * 100, 100) * 0.25
+
+    overall_score = int(mood_score + sleep_score + habit_score + journal_consistency_score)
+    category_label = 'Excellent'
+    if overall_score < 40:
+        category_label = 'Needs Attention'
+    elif overall_score < 60:
+        category_label = 'Fair'
+    elif overall_score < 80:
+        category_label = 'Good'
+    return {
+        'overall_score': overall_score,
+        'category': category_label,
+        'breakdown': {
+            'mood': int(mood_score / 0.25),
+            'sleep': int(sleep_score / 0.25),
+            'habits': int(habit_score / 0.25),
+            'journal_consistency': int(journal_consistency_score / 0.25)
+        }
+    }
+
+
+def populate(rng, users, today, goal_counts):
+    from sqlalchemy import insert
+    from models import db, User, Journal, SleepLog, Goal, Activity
+
+    midnight = datetime.combine(today, datetime.min.time())
+    ids = []
+    for n in range(users):
+        user = User(email=f"parity{n}@example.com", password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        ids.append(user.id)
+        density = rng.choice([0, 0.2, 1, 3])
+
+        journals = []
+        for _ in range(int(rng.randint(0, 40) * density)):
+            when = midnight - timedelta(days=rng.randint(0, 35), minutes=rng.choice([0, 0, 1, 600, 1439]))
+            journals.append({'user_id': user.id, 'mood': rng.choice(MOODS), 'summary': '.', 'timestamp': when})
+        # Exactly on the window starts
+        journals.append({'user_id': user.id, 'mood': rng.choice(MOODS), 'summary': '.', 'timestamp': midnight - timedelta(days=7)})
+        journals.append({'user_id': user.id, 'mood': rng.choice(MOODS), 'summary': '.', 'timestamp': midnight - timedelta(days=30)})
+        if journals and rng.random() < 0.1:
+            journals = []
+        if journals:
+            db.session.execute(insert(Journal), journals)
+
+        sleep = [{'user_id': user.id, 'date': today - timedelta(days=rng.randint(0, 10)),
+                  'hours_slept': rng.choice(HOURS), 'quality_rating': rng.choice(RATINGS)}
+                 for _ in range(int(rng.randint(0, 12) * density))]
+        if sleep:
+            db.session.execute(insert(SleepLog), sleep)
+
+        goal_count = goal_counts.get(n, rng.choice([0, 0, 1, 2, 3, 5]))
+        for g in range(goal_count):
+            goal = Goal(user_id=user.id, title=f"g{g}", goal_type='habit', is_active=rng.random() < 0.8)
+            db.session.add(goal)
+            db.session.flush()
+            activities = [{'user_id': user.id, 'goal_id': goal.id, 'activity_type': 'x',
+                           'date': today - timedelta(days=rng.randint(0, 10)), 'completed': rng.random() < 0.8}
+                          for _ in range(int(rng.randint(0, 8) * density))]
+            if activities:
+                db.session.execute(insert(Activity), activities)
+        if goal_count:
+            # Force these goals active so the query-count check is meaningful
+            if n in goal_counts:
+                Goal.query.filter_by(user_id=user.id).update({'is_active': True})
+    db.session.commit()
+    return ids
+
+
+def add_more(rng, user_ids, today):
+    """Write more rows the way the routes do, through the incremental rollup helpers"""
+    from models import db, Journal, SleepLog, Goal, Activity
+    from wellness import record_journal, record_sleep, record_activity
+
+    for user_id in rng.sample(user_ids, len(user_ids) // 2):
+        for _ in range(rng.randint(0, 4)):
+            journal = Journal(user_id=user_id, mood=rng.choice(MOODS), summary='.', goal_progress='')
+            if rng.random() < 0.5:
+                journal.timestamp = datetime.combine(today - timedelta(days=rng.randint(0, 31)), datetime.min.time())
+            db.session.add(journal)
+            record_journal(journal)
+        for day in {today - timedelta(days=rng.randint(0, 9)) for _ in range(rng.randint(0, 4))}:
+            after = (rng.choice(HOURS), rng.choice(RATINGS))
+            existing = SleepLog.query.filter_by(user_id=user_id, date=day).first()
+            if existing:
+                record_sleep(user_id, day, (existing.hours_slept, existing.quality_rating), after)
+                existing.hours_slept, existing.quality_rating = after
+            else:
+                db.session.add(SleepLog(user_id=user_id, date=day, hours_slept=after[0], quality_rating=after[1]))
+                record_sleep(user_id, day, after=after)
+        goals = Goal.query.filter_by(user_id=user_id, is_active=True).all()
+        for goal in goals[:3]:
+            for _ in range(rng.randint(0, 3)):
+                activity = Activity(user_id=user_id, goal_id=goal.id, activity_type='x',
+                                    date=today - timedelta(days=rng.randint(0, 9)), completed=True)
+                db.session.add(activity)
+                record_activity(activity)
+        for journal in Journal.query.filter_by(user_id=user_id).limit(rng.randint(0, 2)).all():
+            record_journal(journal, removed=True)
+            db.session.delete(journal)
+    db.session.commit()
+
+
+def rollup_rows():
+    from models import db, DailyWellness
+    return sorted(
+        (r.user_id, r.day, r.mood_sum, r.mood_count, r.sleep_score_sum, r.sleep_count, r.activity_count, r.journal_count)
+        for r in db.session.query(DailyWellness)
+        if r.mood_count or r.sleep_count or r.activity_count or r.journal_count
+    )
+
+
+def compare(user_ids, today, offsets=(0, -4, 3)):
+    from wellness import compute_wellness
+
+    mismatches = 0
+    for user_id in user_ids:
+        for offset in offsets:
+            day = today + timedelta(days=offset)
+            expected, actual = legacy_wellness(user_id, day), compute_wellness(user_id, day)
+            if actual != expected:
+                mismatches += 1
+                print(f"user {user_id} on {day}: expected {expected}, got {actual}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'parity.db')}"
+    os.environ.setdefault('LLM_BACKEND', 'fake')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import app as app_module
+    from sqlalchemy import event
+    from models import db
+    from wellness import backfill, compute_wellness
+
+    rng = random.Random(args.seed)
+    today = app_module.get_ist_date()
+    queries = [0]
+    with app_module.app.app_context():
+        goal_counts = {0: 0, 1: 1, 2: 60}
+        user_ids = populate(rng, args.users, today, goal_counts)
+        backfill(db.engine, user_ids)
+        mismatches = compare(user_ids, today)
+        print(f"backfilled: {args.users} users, {mismatches} mismatches")
+
+        add_more(rng, user_ids, today)
+        incremental = rollup_rows()
+        backfill(db.engine, user_ids)
+        drift = incremental != rollup_rows()
+        if drift:
+            print("incremental rollups differ from a rebuild")
+        incremental_mismatches = compare(user_ids, today)
+        print(f"incremental: {incremental_mismatches} mismatches")
+        mismatches += incremental_mismatches
+
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: queries.__setitem__(0, queries[0] + 1))
+        engine_queries = {}
+        for n, user_id in enumerate(user_ids):
+            queries[0] = 0
+            compute_wellness(user_id, today)
+            engine_queries[n] = queries[0]
+
+    counts = {goal_counts[n]: engine_queries[n] for n in goal_counts}
+    print(f"engine queries by active goal count: {counts}")
+    constant = len(set(engine_queries.values())) == 1
+    if not constant:
+        print(f"query count varies: {sorted(set(engine_queries.values()))}")
+    return 1 if mismatches or drift or not constant else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Shared cache layer for hot read paths and AI results. Every backend speaks
+# the same small interface:
+#
+#     get(key) -> value or None
+#     set(key, value, ttl=None)
+#     delete(key)
+#     invalidate_prefix(prefix)
+#
+# Values must be JSON-serializable. Backend failures are counted and treated
+# as misses so a broken cache never takes a request down with it.
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def record_set(self):
+        with self._lock:
+            self.sets += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'sets': self.sets,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+
+class LRUCache:
+    """In-process cache with a size bound and per-entry TTL.
+
+    Values are stored as JSON like the shared backends, so each get() returns
+    a fresh copy that callers may modify without touching the cached entry.
+    """
+
+    def __init__(self, max_entries=2048, default_ttl=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self.stats.record(entry is not None)
+        return json.loads(entry[0]) if entry is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        expires_at = time.time() + ttl if ttl else None
+        data = json.dumps(value)
+        with self._lock:
+            self._entries[key] = (data, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self.stats.record_set()
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """Cache in a SQLite file, shared by every worker process on the host.
+
+    Expired rows are ignored on read and swept, together with the oldest rows
+    over max_entries, every prune_every writes.
+    """
+
+    def __init__(self, path, max_entries=20000, default_ttl=None, prune_every=200):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.prune_every = prune_every
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, stored_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        except sqlite3.Error:
+            self.stats.record_error()
+            row = None
+        self.stats.record(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, stored_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None, now)
+            )
+        except sqlite3.Error:
+            self.stats.record_error()
+            return
+        self.stats.record_set()
+
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error:
+            self.stats.record_error()
+
+    def invalidate_prefix(self, prefix):
+        # A range scan on the primary key rather than LIKE, which would need escaping
+        try:
+            self._connection().execute(
+                "DELETE FROM cache_entries WHERE key >= ? AND key < ?",
+                (prefix, prefix + '\U0010ffff')
+            )
+        except sqlite3.Error:
+            self.stats.record_error()
+
+    def prune(self):
+        try:
+            conn = self._connection()
+            conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN ("
+                "SELECT key FROM cache_entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        except sqlite3.Error:
+            self.stats.record_error()
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisCache:
+    """Cache on any server that speaks the Redis protocol (RESP2).
+
+    Talks to the server over a plain socket per thread, so no client library
+    is needed. Size bounds are left to the server's maxmemory policy.
+    """
+
+    def __init__(self, url='redis://localhost:6379/0', default_ttl=None, socket_timeout=1.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.lstrip('/') or 0)
+        self.default_ttl = default_ttl
+        self.socket_timeout = socket_timeout
+        self.stats = CacheStats()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.socket_timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = (sock, sock.makefile('rb'))
+            self._local.conn = conn
+            if self.password:
+                self._send(conn, 'AUTH', self.password)
+            if self.db:
+                self._send(conn, 'SELECT', self.db)
+        return conn
+
+    def _send(self, conn, *args):
+        sock, reader = conn
+        payload = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            payload.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        sock.sendall(b''.join(payload))
+        return self._read_reply(reader)
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise RedisError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length == -1:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(body)
+            if count == -1:
+                return None
+            return [self._read_reply(reader) for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _command(self, *args):
+        try:
+            return self._send(self._connection(), *args)
+        except (OSError, ConnectionError, RedisError):
+            # Drop the connection; the next command reconnects
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                conn[0].close()
+                self._local.conn = None
+            raise
+
+    def get(self, key):
+        try:
+            data = self._command('GET', key)
+        except (OSError, ConnectionError, RedisError):
+            self.stats.record_error()
+            data = None
+        self.stats.record(data is not None)
+        return json.loads(data) if data is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.default_ttl
+        args = ['SET', key, json.dumps(value)]
+        if ttl:
+            args += ['PX', int(ttl * 1000)]
+        try:
+            self._command(*args)
+        except (OSError, ConnectionError, RedisError):
+            self.stats.record_error()
+            return
+        self.stats.record_set()
+
+    def delete(self, key):
+        try:
+            self._command('DEL', key)
+        except (OSError, ConnectionError, RedisError):
+            self.stats.record_error()
+
+    def invalidate_prefix(self, prefix):
+        pattern = ''.join('\\' + ch if ch in '*?[]\\' else ch for ch in prefix) + '*'
+        cursor = b'0'
+        try:
+            while True:
+                cursor, keys = self._command('SCAN', cursor, 'MATCH', pattern, 'COUNT', 500)
+                if keys:
+                    self._command('DEL', *keys)
+                if cursor in (b'0', '0'):
+                    break
+        except (OSError, ConnectionError, RedisError):
+            self.stats.record_error()
+
+
+def make_cache(backend=None, path=None, url=None, max_entries=2048, default_ttl=None):
+    """Build a cache for 'memory', 'sqlite' or 'redis'; defaults come from CACHE_* env vars"""
+    backend = backend or os.environ.get('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return LRUCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'sqlite':
+        path = path or os.environ.get('CACHE_PATH') or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'instance', 'cache.db')
+        return SQLiteCache(path, max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'redis':
+        return RedisCache(url or os.environ.get('CACHE_URL', 'redis://localhost:6379/0'), default_ttl=default_ttl)
+    raise ValueError(f"Unknown cache backend: {backend!r}")
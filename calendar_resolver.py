@@ -0,0 +1,191 @@
+import re
+from datetime import datetime, timedelta
+import calendar
+
+# Resolves the date ranges that calendar_query_model used to work out over the
+# network ("tomorrow", "this week", "Friday", "9th November", ...). Anything
+# that is not clearly one of those patterns returns None so the caller can
+# fall back to the model.
+
+WEEKDAY_NAMES = {
+    'monday': 0, 'mon': 0,
+    'tuesday': 1, 'tue': 1, 'tues': 1,
+    'wednesday': 2, 'wed': 2,
+    'thursday': 3, 'thu': 3, 'thur': 3, 'thurs': 3,
+    'friday': 4, 'fri': 4,
+    'saturday': 5, 'sat': 5,
+    'sunday': 6, 'sun': 6,
+}
+
+MONTH_NAMES = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+    'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7,
+    'august': 8, 'aug': 8, 'september': 9, 'sep': 9, 'sept': 9,
+    'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12,
+}
+
+_WEEKDAY = '|'.join(sorted(WEEKDAY_NAMES, key=len, reverse=True))
+_MONTH = '|'.join(sorted(MONTH_NAMES, key=len, reverse=True))
+_ORDINAL = r'(\d{1,2})(?:st|nd|rd|th)?'
+
+# A calendar question has to name the calendar or its contents, or ask
+# "what do I have" / "am I free" / "anything" about a particular time.
+# "What's on your mind?", "Am I free to just feel sad?" and "Is there anything
+# wrong with me today?" have neither, so they go to the model.
+_CALENDAR_NOUNS = (r"calend[ae]r|schedule|agenda|events?|plans?|planned|meetings?|appointments?|appt"
+                   r"|reservations?|bookings?|deadlines?|commitments?")
+_WHEN = (rf"(?:(?:on|for|at|in|this|next|the) )*(?:today|tonight|tomorrow|tomorow|tmrw|tmr|weekend|week|month"
+         rf"|{_WEEKDAY}|{_MONTH}|\d{{1,2}}(?:st|nd|rd|th|am|pm)?)|coming up")
+CALENDAR_QUESTION_PATTERN = re.compile(
+    rf"\b(?:{_CALENDAR_NOUNS}"
+    r"|(?:what(?:'s| is| are)? (?:on|happening|planned)|what do i have|what have i got"
+    r"|(?:do i have|have i got|is there) anything|anything(?: i (?:have|need) to do)?|am i (?:free|busy)) "
+    rf"(?:{_WHEN}))\b",
+    re.IGNORECASE
+)
+
+QUESTION_START_PATTERN = re.compile(
+    r"^\W*(?:what|whats|what's|when|do|does|did|am|is|are|any|anything|have|show|tell|list|check|can you|could you)\b",
+    re.IGNORECASE
+)
+
+# Phrases that look like dates but need more reasoning than the rules below;
+# seeing any of them sends the message to the model.
+AMBIGUOUS_PATTERN = re.compile(
+    r"\b(?:next (?:" + _WEEKDAY + r")|last|ago|yesterday|day after|after next|(?:week|month) after|in \w+ (?:days?|weeks?|months?)"
+    r"|between|until|till|through|from|weekdays?|\d{1,4}[/-]\d{1,2})\b",
+    re.IGNORECASE
+)
+
+# Any sign that the question is about some particular time. With none of
+# these, "What's on my calendar?" means the coming week; with one that no
+# rule below resolves ("in December", "for Christmas", "this year"), the
+# message goes to the model rather than getting the coming week.
+HOLIDAYS = (r"christmas|xmas|new year'?s?(?: eve| day)?|diwali|deepavali|holi|eid|easter|thanksgiving"
+            r"|halloween|valentine'?s?(?: day)?|independence day|republic day|hanukkah|ramadan|navratri|dussehra")
+TEMPORAL_PATTERN = re.compile(
+    rf"\b(?:{_WEEKDAY}|{_MONTH}|{HOLIDAYS}"
+    r"|today|tonight|tomorrow|tomorow|tmrw|tmr|weekends?|days?|weeks?|fortnight|months?|years?"
+    r"|morning|afternoon|evening|night|noon|midnight|summer|winter|spring|autumn|holidays?|vacation|semester|term"
+    r"|\d{1,4}(?:st|nd|rd|th|am|pm)?)\b",
+    re.IGNORECASE
+)
+
+_RANGE_PATTERNS = [
+    ('today', re.compile(r'\b(?:today|tonight)\b', re.IGNORECASE)),
+    ('tomorrow', re.compile(r'\b(?:tomorrow|tomorow|tmrw|tmr)\b', re.IGNORECASE)),
+    ('this_weekend', re.compile(r'\b(?:this )?weekend\b', re.IGNORECASE)),
+    ('next_week', re.compile(r'\bnext week\b', re.IGNORECASE)),
+    ('this_week', re.compile(r'\b(?:this|the) week\b', re.IGNORECASE)),
+    ('next_month', re.compile(r'\bnext month\b', re.IGNORECASE)),
+    ('this_month', re.compile(r'\b(?:this|the) month\b', re.IGNORECASE)),
+    ('month_day', re.compile(rf'\b({_MONTH})\.? {_ORDINAL}\b', re.IGNORECASE)),
+    ('day_month', re.compile(rf'\b{_ORDINAL} (?:of )?({_MONTH})\b', re.IGNORECASE)),
+    ('ordinal', re.compile(r'\b(?:on the|the|on) (\d{1,2})(?:st|nd|rd|th)\b', re.IGNORECASE)),
+    ('weekday', re.compile(rf'\b(?:on |this )?({_WEEKDAY})\b', re.IGNORECASE)),
+]
+
+
+def _next_occurrence(today, month, day):
+    for year in (today.year, today.year + 1):
+        try:
+            candidate = today.replace(year=year, month=month, day=day)
+        except ValueError:
+            continue
+        if candidate >= today:
+            return candidate
+    return None
+
+
+def _day_of_month(today, day):
+    year, month = today.year, today.month
+    for _ in range(12):
+        if day <= calendar.monthrange(year, month)[1]:
+            candidate = today.replace(year=year, month=month, day=day)
+            if candidate >= today:
+                return candidate
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
+
+def _resolve(kind, match, today):
+    if kind == 'today':
+        return today, today, 'day'
+    if kind == 'tomorrow':
+        tomorrow = today + timedelta(days=1)
+        return tomorrow, tomorrow, 'day'
+    if kind == 'this_weekend':
+        saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+        if today.weekday() == 6:
+            saturday = today
+        return saturday, today + timedelta(days=(6 - today.weekday()) % 7), 'specific'
+    if kind == 'this_week':
+        return today, today + timedelta(days=6), 'week'
+    if kind == 'next_week':
+        return today + timedelta(days=7), today + timedelta(days=13), 'week'
+    if kind == 'this_month':
+        last_day = calendar.monthrange(today.year, today.month)[1]
+        return today, today.replace(day=last_day), 'month'
+    if kind == 'next_month':
+        year, month = (today.year + 1, 1) if today.month == 12 else (today.year, today.month + 1)
+        first = today.replace(year=year, month=month, day=1)
+        return first, first.replace(day=calendar.monthrange(year, month)[1]), 'month'
+    if kind == 'month_day':
+        day = _next_occurrence(today, MONTH_NAMES[match.group(1).lower()], int(match.group(2)))
+        return (day, day, 'day') if day else None
+    if kind == 'day_month':
+        day = _next_occurrence(today, MONTH_NAMES[match.group(2).lower()], int(match.group(1)))
+        return (day, day, 'day') if day else None
+    if kind == 'ordinal':
+        day = _day_of_month(today, int(match.group(1)))
+        return (day, day, 'day') if day else None
+    if kind == 'weekday':
+        weekday = WEEKDAY_NAMES[match.group(1).lower()]
+        day = today + timedelta(days=(weekday - today.weekday()) % 7)
+        return day, day, 'day'
+    return None
+
+
+def resolve_calendar_query(user_message, current_datetime):
+    """Resolve a calendar question to the detect_calendar_query dict, or None if unsure"""
+    if isinstance(current_datetime, str):
+        current_datetime = datetime.fromisoformat(current_datetime)
+
+    message = user_message.strip()
+    if not (message.endswith('?') or QUESTION_START_PATTERN.search(message)):
+        return None
+    if not CALENDAR_QUESTION_PATTERN.search(message):
+        return None
+    if AMBIGUOUS_PATTERN.search(message):
+        return None
+
+    today = current_datetime.date()
+    found = []
+    consumed = []
+    for kind, pattern in _RANGE_PATTERNS:
+        for match in pattern.finditer(message):
+            # "November 9" must not also count as a bare weekday/ordinal match
+            if any(start <= match.start() < end for start, end in consumed):
+                continue
+            consumed.append(match.span())
+            found.append((kind, match))
+
+    if found:
+        resolved = {_resolve(kind, match, today) for kind, match in found}
+    elif TEMPORAL_PATTERN.search(message):
+        # Names a time none of the rules cover
+        return None
+    else:
+        # "What's on my calendar?" with no date at all means the coming week
+        resolved = {(today, today + timedelta(days=6), 'week')}
+
+    if len(resolved) != 1 or None in resolved:
+        return None
+
+    start_date, end_date, query_type = resolved.pop()
+    return {
+        'is_calendar_query': True,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'query_type': query_type
+    }
@@ -0,0 +1,78 @@
+from datetime import date
+
+from models import db, Event
+from tracing import span
+
+# Every calendar read in the app (the calendar page, yesterday's follow-ups
+# and the events the chat is asked about) goes through one query on
+# ix_events_user_event_date. Results are cached per user and date range as
+# plain dicts, so a cached range never touches the database or a detached
+# ORM row, and any write to a user's events drops all of their ranges at once.
+
+EVENT_COLUMNS = (
+    Event.id, Event.title, Event.description, Event.event_date, Event.event_time, Event.location,
+    Event.is_confirmed, Event.is_in_google_calendar, Event.created_from_message,
+)
+
+
+def event_dict(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'date': row.event_date.isoformat(),
+        'time': row.event_time,
+        'location': row.location,
+        'is_confirmed': row.is_confirmed,
+        'is_in_google_calendar': row.is_in_google_calendar,
+        'created_from_message': row.created_from_message
+    }
+
+
+class CalendarService:
+    """Cached per-user event lookups by date range"""
+
+    def __init__(self, cache, key_fn):
+        self.cache = cache
+        self.key_fn = key_fn
+
+    def _key(self, user_id, start, end):
+        return self.key_fn(user_id, f"events:{start or '*'}:{end or '*'}")
+
+    def events_between(self, user_id, start=None, end=None):
+        """Events from start to end inclusive (either may be None for open-ended), by date and time"""
+        key = self._key(user_id, start, end)
+        with span('calendar.events') as s:
+            events = self.cache.get(key)
+            s.set(cache_hit=events is not None)
+            if events is None:
+                query = db.session.query(*EVENT_COLUMNS).filter(Event.user_id == user_id)
+                if start is not None:
+                    query = query.filter(Event.event_date >= start)
+                if end is not None:
+                    query = query.filter(Event.event_date <= end)
+                events = [event_dict(row) for row in query.order_by(Event.event_date, Event.event_time)]
+                self.cache.set(key, events)
+        return events
+
+    def all_events(self, user_id):
+        return self.events_between(user_id)
+
+    def confirmed_events_on(self, user_id, day):
+        return [e for e in self.events_between(user_id, day, day) if e['is_confirmed']]
+
+    def invalidate(self, user_id):
+        """Call after committing any change to the user's events"""
+        self.cache.invalidate_prefix(self.key_fn(user_id, 'events:'))
+
+
+def describe_event(event):
+    """One line of the chat's calendar context for an event dict"""
+    line = f"- {event['title']} on {date.fromisoformat(event['date']).strftime('%A, %B %d, %Y')}"
+    if event['time']:
+        line += f" at {event['time']}"
+    if event['location']:
+        line += f" (Location: {event['location']})"
+    if not event['is_confirmed']:
+        line += " (pending confirmation)"
+    return line
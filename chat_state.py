@@ -0,0 +1,146 @@
+import threading
+import time
+from collections import OrderedDict
+
+_token_stats_lock = threading.Lock()
+_token_stats = {
+    'requests': 0,
+    'prompt_tokens_sent': 0,
+    'prompt_tokens_full_history': 0,
+    'compactions': 0
+}
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; close enough to
+    # budget against without a round trip to count_tokens.
+    return (len(text) + 3) // 4
+
+
+def record_token_usage(sent, full_history, compacted=False):
+    with _token_stats_lock:
+        _token_stats['requests'] += 1
+        _token_stats['prompt_tokens_sent'] += sent
+        _token_stats['prompt_tokens_full_history'] += full_history
+        _token_stats['compactions'] += int(compacted)
+
+
+def get_token_stats():
+    with _token_stats_lock:
+        return dict(_token_stats)
+
+
+class ConversationState:
+    """What the model needs to know about one chat session"""
+
+    def __init__(self, user_id, session_id):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.turns = []
+        self.turn_ids = []
+        self.summary = None
+        self.summarized_through_id = 0
+        self.summarized_tokens = 0
+        self.last_message_id = 0
+        self.touched_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def restore_summary(self, summary, summarized_through_id, summarized_tokens):
+        self.summary = summary
+        self.summarized_through_id = summarized_through_id
+        self.summarized_tokens = summarized_tokens or 0
+        self.last_message_id = max(self.last_message_id, summarized_through_id)
+
+    def append(self, message_id, role, content):
+        self.turns.append({'role': role, 'parts': [content]})
+        self.turn_ids.append(message_id)
+        self.last_message_id = max(self.last_message_id, message_id)
+
+    def prompt_tokens(self):
+        """Estimated tokens of what gets sent: the summary plus the unsummarized turns"""
+        tokens = estimate_tokens(self.summary) if self.summary else 0
+        return tokens + sum(estimate_tokens(turn['parts'][0]) for turn in self.turns)
+
+    def full_history_tokens(self):
+        """Estimated tokens the whole session would cost without compaction"""
+        return self.summarized_tokens + sum(estimate_tokens(turn['parts'][0]) for turn in self.turns)
+
+    def turns_to_compact(self, keep_turns):
+        """The older turns outside the last keep_turns, and the id of the newest of them"""
+        cut = len(self.turns) - keep_turns
+        # What stays behind has to start on a user turn
+        while 0 < cut < len(self.turns) and self.turns[cut]['role'] != 'user':
+            cut += 1
+        if cut <= 0 or cut >= len(self.turns):
+            return [], None
+        return self.turns[:cut], self.turn_ids[cut - 1]
+
+    def fold_into_summary(self, summary, through_id):
+        """Replace every turn up to through_id with the new running summary"""
+        cut = 0
+        while cut < len(self.turn_ids) and self.turn_ids[cut] <= through_id:
+            cut += 1
+        self.summarized_tokens += sum(estimate_tokens(turn['parts'][0]) for turn in self.turns[:cut])
+        del self.turns[:cut]
+        del self.turn_ids[:cut]
+        self.summary = summary
+        self.summarized_through_id = through_id
+
+    def history_for_model(self, max_turns):
+        """The rolling summary (if any) followed by the last max_turns turns.
+
+        Returns fresh dicts, so callers can decorate the first/last turn
+        without touching the cached state.
+        """
+        recent = self.turns[-max_turns:] if max_turns else self.turns
+        # Gemini expects the history to start with a user turn
+        while recent and recent[0]['role'] != 'user':
+            recent = recent[1:]
+        history = []
+        if self.summary:
+            history.append({'role': 'user', 'parts': [f"[Summary of our conversation so far]\n{self.summary}"]})
+            history.append({'role': 'model', 'parts': ["Got it, I remember."]})
+        history.extend({'role': turn['role'], 'parts': [turn['parts'][0]]} for turn in recent)
+        return history
+
+
+class ConversationStateCache:
+    """LRU + TTL cache of ConversationState keyed by chat session id.
+
+    Each gunicorn worker has its own cache, so the state is never trusted to be
+    complete: callers fetch the rows stored after state.last_message_id and
+    append them before using it.
+    """
+
+    def __init__(self, max_sessions=500, ttl_seconds=1800):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, session_id):
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is None:
+                return None
+            if state.user_id != user_id or time.monotonic() - state.touched_at > self.ttl_seconds:
+                del self._states[session_id]
+                return None
+            state.touched_at = time.monotonic()
+            self._states.move_to_end(session_id)
+            return state
+
+    def put(self, state):
+        with self._lock:
+            state.touched_at = time.monotonic()
+            self._states[state.session_id] = state
+            self._states.move_to_end(state.session_id)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+
+    def invalidate(self, session_id):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._states)
@@ -0,0 +1,96 @@
+import os
+
+from sqlalchemy import event
+
+# Engine settings for SQLALCHEMY_ENGINE_OPTIONS, chosen by database type.
+#
+# PostgreSQL gets a small per-worker pool. Each gunicorn worker holds up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so 4 workers stay well under the
+# server's default max_connections of 100. Connections are pinged before reuse
+# and recycled, so idle ones the server or a proxy dropped are never handed out.
+#
+# SQLite gets a pragma profile (SQLITE_PROFILE). 'tuned' is the default.
+# It switches the file to WAL so readers never wait for a writer and a
+# writer only waits for another writer. It uses synchronous=NORMAL, which
+# fsyncs at checkpoints instead of on every commit; that is safe in WAL
+# mode, though a power cut can lose the last few commits. A busy timeout
+# makes a blocked writer retry instead of failing with "database is locked".
+# mmap and a larger page cache serve reads without extra copies. 'default'
+# leaves SQLite's own settings, for comparison in benchmarks/sqlite_write_bench.py.
+
+SQLITE_PROFILES = {
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 15000,
+        'mmap_size': 128 * 1024 * 1024,
+        'cache_size': -16000,
+        'temp_store': 'MEMORY',
+    },
+    'default': {},
+}
+
+SQLITE_OVERRIDES = {
+    'SQLITE_SYNCHRONOUS': 'synchronous',
+    'SQLITE_BUSY_TIMEOUT_MS': 'busy_timeout',
+    'SQLITE_MMAP_SIZE': 'mmap_size',
+    'SQLITE_CACHE_SIZE': 'cache_size',
+}
+
+
+def sqlite_pragmas(profile=None):
+    """The pragmas to run on each new SQLite connection, with env overrides applied"""
+    profile = profile or os.environ.get('SQLITE_PROFILE', 'tuned')
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile!r}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for env_name, pragma in SQLITE_OVERRIDES.items():
+        if os.environ.get(env_name):
+            pragmas[pragma] = os.environ[env_name]
+    return pragmas
+
+
+def database_url():
+    """DATABASE_URL, defaulting to SQLite in instance/; postgres:// is accepted as an alias"""
+    url = os.environ.get('DATABASE_URL', 'sqlite:///vibe_journal.db')
+    # Name the driver: SQLAlchemy 2.1 maps a bare postgresql:// to psycopg 3,
+    # but requirements.txt ships psycopg2
+    for prefix in ('postgres://', 'postgresql://'):
+        if url.startswith(prefix):
+            url = 'postgresql+psycopg2://' + url[len(prefix):]
+    return url
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for this database"""
+    if database_uri.startswith('postgresql'):
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '5')),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+            'pool_pre_ping': True,
+            'connect_args': {'application_name': 'emoai'},
+        }
+    if database_uri.startswith('sqlite') and ':memory:' not in database_uri and database_uri != 'sqlite://':
+        # Connections are cheap to open, but reusing them keeps the page cache
+        # and mmap warm. The overflow covers asgi.py's two thread pools.
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', '5')),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        }
+    return {}
+
+
+def configure_engine(engine, profile=None):
+    """Run the SQLite pragma profile on every new connection of this engine"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(profile)
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
@@ -0,0 +1,108 @@
+import base64
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, cast, func, tuple_
+
+from models import db, Journal
+
+# Journal reads that stay bounded however long a user has been journaling.
+#
+# Listing is keyset-paginated, newest first, on (timestamp, id). The cursor is
+# the last entry of the previous page, so each page is one seek on
+# ix_journals_user_timestamp (its rows carry the id) and costs the same on
+# page 500 as on page 1, with no OFFSET rescanning skipped rows.
+#
+# mood_series() counts entries per bucket and mood in the database: one
+# grouped query by day, rolled up to weeks or months here. The analytics
+# charts load it instead of every summary; summaries are only fetched a page
+# at a time where they are shown.
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+BUCKETS = ('day', 'week', 'month')
+
+
+def sql_day(column, dialect_name):
+    """A datetime column's calendar day (IST, as stored) as a SQL expression"""
+    # SQLite stores datetimes as text, where CAST would keep only the year
+    return func.date(column) if dialect_name == 'sqlite' else cast(column, Date)
+
+
+def journal_day(dialect_name):
+    return sql_day(Journal.timestamp, dialect_name)
+
+
+def as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def encode_cursor(journal):
+    raw = f"{journal.timestamp.isoformat()}|{journal.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(timestamp, id) from encode_cursor(); raises ValueError for anything else"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, journal_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(journal_id)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor!r}") from e
+
+
+def journal_dict(journal):
+    return {
+        'id': journal.id,
+        'timestamp': journal.timestamp.isoformat(),
+        'mood': journal.mood,
+        'summary': journal.summary,
+        'goal_progress': journal.goal_progress or ''
+    }
+
+
+def journal_page(user_id, limit=PAGE_SIZE, cursor=None):
+    """Up to `limit` entries older than `cursor` (newest first) and the cursor for the next page, or None"""
+    query = Journal.query.filter(Journal.user_id == user_id)
+    if cursor:
+        timestamp, journal_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Journal.timestamp, Journal.id) < (timestamp, journal_id))
+    # One extra row says whether there is a next page without a COUNT
+    rows = query.order_by(Journal.timestamp.desc(), Journal.id.desc()).limit(limit + 1).all()
+    entries = rows[:limit]
+    return entries, encode_cursor(entries[-1]) if len(rows) > limit else None
+
+
+def journal_count(user_id):
+    return db.session.query(func.count(Journal.id)).filter(Journal.user_id == user_id).scalar()
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def mood_series(user_id, bucket='day', start=None, end=None):
+    """Entry counts per bucket and mood, oldest first, for entries from start to end (inclusive)"""
+    day = journal_day(db.session.get_bind().dialect.name)
+    query = db.session.query(day, Journal.mood, func.count()).filter(Journal.user_id == user_id)
+    if start is not None:
+        query = query.filter(Journal.timestamp >= datetime.combine(start, datetime.min.time()))
+    if end is not None:
+        query = query.filter(Journal.timestamp < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+
+    buckets, totals = {}, {}
+    for entry_day, mood, count in query.group_by(day, Journal.mood):
+        key = bucket_start(as_date(entry_day), bucket)
+        point = buckets.setdefault(key, {'start': key.isoformat(), 'total': 0, 'moods': {}})
+        point['total'] += count
+        point['moods'][mood] = point['moods'].get(mood, 0) + count
+        totals[mood] = totals.get(mood, 0) + count
+    return {
+        'bucket': bucket,
+        'series': [buckets[key] for key in sorted(buckets)],
+        'totals': {'entries': sum(totals.values()), 'moods': totals}
+    }
@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from chat_state import estimate_tokens
+from tracing import Span, span
+
+# Every model call in ai_core goes through one backend object. Models are
+# named by role ('companion', 'sentiment', ...) and described by a spec:
+#
+#     {'system_instruction': str, 'json': bool}
+#
+# A backend implements:
+#
+#     generate(role, prompt) -> str
+#     chat(role, history, message) -> str
+#     stream_chat(role, history, message) -> iterator of str
+#
+# plus async twins of all three (stream_chat_async is an async iterator). history is the Gemini-style list of
+# {'role': 'user'|'model', 'parts': [text]} dicts. TracedBackend wraps any
+# backend to time each call and count its tokens (see tracing.py).
+
+
+class LLMBackendError(Exception):
+    pass
+
+
+class GeminiBackend:
+    """Google Gemini via google.generativeai; configured on first use"""
+
+    def __init__(self, specs, model_name='gemini-2.0-flash', api_key=None):
+        self.specs = specs
+        self.model_name = model_name
+        self.api_key = api_key
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, role):
+        model = self._models.get(role)
+        if model is not None:
+            return model
+        with self._lock:
+            if role not in self._models:
+                import google.generativeai as genai
+
+                if not self._models:
+                    api_key = self.api_key or os.environ.get('GOOGLE_API_KEY')
+                    if not api_key:
+                        raise LLMBackendError("GOOGLE_API_KEY is not set")
+                    genai.configure(api_key=api_key)
+                spec = self.specs[role]
+                self._models[role] = genai.GenerativeModel(
+                    model_name=self.model_name,
+                    system_instruction=spec.get('system_instruction'),
+                    generation_config={"response_mime_type": "application/json"} if spec.get('json') else None
+                )
+            return self._models[role]
+
+    def generate(self, role, prompt):
+        return self._model(role).generate_content(prompt).text
+
+    async def generate_async(self, role, prompt):
+        response = await self._model(role).generate_content_async(prompt)
+        return response.text
+
+    def chat(self, role, history, message):
+        return self._model(role).start_chat(history=history).send_message(message).text
+
+    async def chat_async(self, role, history, message):
+        response = await self._model(role).start_chat(history=history).send_message_async(message)
+        return response.text
+
+    def stream_chat(self, role, history, message):
+        response = self._model(role).start_chat(history=history).send_message(message, stream=True)
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def stream_chat_async(self, role, history, message):
+        response = await self._model(role).start_chat(history=history).send_message_async(message, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+SENTIMENT_KEYWORDS = [
+    ('anxious', re.compile(r"\b(?:anxious|nervous|worried|worry|stressed|panic|overwhelmed|scared)\b", re.IGNORECASE)),
+    ('sad', re.compile(r"\b(?:sad|down|depressed|lonely|cry|crying|miss|lost|hurt)\b", re.IGNORECASE)),
+    ('frustrated', re.compile(r"\b(?:angry|annoyed|frustrated|furious|hate|sick of|fed up)\b", re.IGNORECASE)),
+    ('happy', re.compile(r"\b(?:happy|great|excited|amazing|awesome|love|glad|proud)\b", re.IGNORECASE)),
+    ('confused', re.compile(r"\b(?:confused|unsure|don't know|lost on|not sure)\b", re.IGNORECASE)),
+]
+
+FAKE_REPLIES = [
+    "That sounds like a lot to carry; what feels heaviest right now?",
+    "I hear you, and it makes sense to feel that way.",
+    "That's real progress, even if it doesn't feel big yet.",
+    "What usually happens right before that feeling shows up?",
+]
+
+
+class FakeBackend:
+    """Deterministic local stand-in for load tests and offline development.
+
+    Replies are canned (per-role overrides from `responses`) or generated by
+    simple rules: keyword sentiment, no events or calendar queries. Every
+    call waits `latency` seconds (plus up to `jitter`) and fails with
+    LLMBackendError at `error_rate`; both are drawn from a seeded RNG.
+    """
+
+    def __init__(self, specs, latency=0.0, jitter=0.0, error_rate=0.0, seed=0, responses=None):
+        self.specs = specs
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.responses = responses or {}
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        with self._rng_lock:
+            delay = self.latency + self.jitter * self._rng.random()
+            failed = self._rng.random() < self.error_rate
+        return delay, failed
+
+    def _reply(self, role, text):
+        if role in self.responses:
+            return self.responses[role]
+        if role == 'sentiment':
+            return json.dumps(self._sentiment(text))
+        if role == 'understanding':
+            message = text.rsplit('User message:', 1)[-1]
+            return json.dumps({'sentiment': self._sentiment(message), 'event': None, 'calendar_query': None})
+        if role == 'summarizer':
+            return "My Reflection Today: I talked through how my day went and what is on my mind."
+        if role == 'general':
+            return "Your week looks fairly steady; try keeping the same bedtime for the next few nights."
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return FAKE_REPLIES[digest[0] % len(FAKE_REPLIES)]
+
+    def _sentiment(self, text):
+        for category, pattern in SENTIMENT_KEYWORDS:
+            if pattern.search(text):
+                return {'sentiment': category, 'intensity': 0.7}
+        return {'sentiment': 'neutral', 'intensity': 0.5}
+
+    def generate(self, role, prompt):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise LLMBackendError(f"injected failure ({role})")
+        return self._reply(role, prompt)
+
+    async def generate_async(self, role, prompt):
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        if failed:
+            raise LLMBackendError(f"injected failure ({role})")
+        return self._reply(role, prompt)
+
+    def chat(self, role, history, message):
+        return self.generate(role, message)
+
+    async def chat_async(self, role, history, message):
+        return await self.generate_async(role, message)
+
+    def stream_chat(self, role, history, message):
+        yield from self._pieces(self.generate(role, message))
+
+    async def stream_chat_async(self, role, history, message):
+        for piece in self._pieces(await self.generate_async(role, message)):
+            yield piece
+
+    def _pieces(self, text):
+        words = text.split(' ')
+        for i in range(0, len(words), 4):
+            yield ' '.join(words[i:i + 4]) + (' ' if i + 4 < len(words) else '')
+
+
+def _history_tokens(history, message):
+    return sum(estimate_tokens(part) for turn in history for part in turn['parts']) + estimate_tokens(message)
+
+
+class TracedBackend:
+    """Wraps a backend so each model call is an llm.<role> span with estimated token counts"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def generate(self, role, prompt):
+        with span(f'llm.{role}', role=role, prompt_tokens=estimate_tokens(prompt)) as s:
+            text = self.backend.generate(role, prompt)
+            s.set(response_tokens=estimate_tokens(text))
+            return text
+
+    async def generate_async(self, role, prompt):
+        with span(f'llm.{role}', role=role, prompt_tokens=estimate_tokens(prompt)) as s:
+            text = await self.backend.generate_async(role, prompt)
+            s.set(response_tokens=estimate_tokens(text))
+            return text
+
+    def chat(self, role, history, message):
+        with span(f'llm.{role}', role=role, prompt_tokens=_history_tokens(history, message)) as s:
+            text = self.backend.chat(role, history, message)
+            s.set(response_tokens=estimate_tokens(text))
+            return text
+
+    async def chat_async(self, role, history, message):
+        with span(f'llm.{role}', role=role, prompt_tokens=_history_tokens(history, message)) as s:
+            text = await self.backend.chat_async(role, history, message)
+            s.set(response_tokens=estimate_tokens(text))
+            return text
+
+    def stream_chat(self, role, history, message):
+        # Not span(): a generator can be resumed outside the context it started in
+        s = Span(f'llm.{role}', {'role': role, 'prompt_tokens': _history_tokens(history, message)})
+        response_tokens = 0
+        try:
+            for text in self.backend.stream_chat(role, history, message):
+                if not response_tokens:
+                    s.set(first_token_ms=round((time.perf_counter() - s.started) * 1000, 1))
+                response_tokens += estimate_tokens(text)
+                yield text
+        except Exception:
+            s.error = True
+            raise
+        finally:
+            s.set(response_tokens=response_tokens)
+            s.finish()
+
+    async def stream_chat_async(self, role, history, message):
+        s = Span(f'llm.{role}', {'role': role, 'prompt_tokens': _history_tokens(history, message)})
+        response_tokens = 0
+        try:
+            async for text in self.backend.stream_chat_async(role, history, message):
+                if not response_tokens:
+                    s.set(first_token_ms=round((time.perf_counter() - s.started) * 1000, 1))
+                response_tokens += estimate_tokens(text)
+                yield text
+        except Exception:
+            s.error = True
+            raise
+        finally:
+            s.set(response_tokens=response_tokens)
+            s.finish()
+
+
+def make_backend(specs, name=None):
+    """Build the backend named by LLM_BACKEND ('gemini' or 'fake')"""
+    name = name or os.environ.get('LLM_BACKEND', 'gemini')
+    if name == 'gemini':
+        return GeminiBackend(specs, model_name=os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash'))
+    if name == 'fake':
+        responses = None
+        if os.environ.get('FAKE_LLM_RESPONSES'):
+            with open(os.environ['FAKE_LLM_RESPONSES']) as f:
+                responses = json.load(f)
+        return FakeBackend(
+            specs,
+            latency=float(os.environ.get('FAKE_LLM_LATENCY_SECONDS', '0')),
+            jitter=float(os.environ.get('FAKE_LLM_JITTER_SECONDS', '0')),
+            error_rate=float(os.environ.get('FAKE_LLM_ERROR_RATE', '0')),
+            seed=int(os.environ.get('FAKE_LLM_SEED', '0')),
+            responses=responses
+        )
+    raise ValueError(f"Unknown LLM backend: {name!r}")
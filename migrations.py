@@ -0,0 +1,353 @@
+import contextlib
+import os
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from models import db, get_ist_now
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Versioned schema changes for databases that already exist. db.create_all()
+# builds new tables at the current model definitions but never alters an
+# existing one, so every index, column or backfill a model change needs on
+# old databases gets a migration here:
+#
+#     @migration(7, 'journal word count')
+#     def _journal_word_count(m):
+#         m.add_column('journals', 'word_count', 'INTEGER')
+#         m.backfill('journals', "word_count = length(summary) - length(replace(summary, ' ', '')) + 1",
+#                    'word_count IS NULL')
+#
+# Migrations apply in version order and are recorded in schema_version.
+# schema_lock() keeps workers that start together from racing each other.
+# Each step runs in its own short transaction and is idempotent, so a
+# migration that died halfway simply redoes the remaining steps. Nothing
+# rebuilds a table: SQLite adds a column by editing the schema only, and
+# backfills update fixed-size batches and commit between them so readers and
+# the app's writes are never blocked for long.
+#
+# A migration never calls the app's modules, which keep changing after it
+# ships. What a data step needs is copied here as SQL frozen at its version,
+# so running migration 3 next year does what it did when it was written.
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+class Migrator:
+    """The steps a migration can take; each one is safe to repeat"""
+
+    def __init__(self, engine, batch_size=1000, pause=0.0):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.pause = pause
+
+    def execute(self, sql, params=None):
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def has_column(self, table, column):
+        return column in {c['name'] for c in inspect(self.engine).get_columns(table)}
+
+    def create_index(self, name, table, columns, unique=False):
+        sql = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        if self.engine.dialect.name == 'postgresql':
+            # CONCURRENTLY builds without blocking writes, but not inside a transaction
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text(sql.replace(' INDEX ', ' INDEX CONCURRENTLY ', 1)))
+        else:
+            self.execute(sql)
+
+    def drop_index(self, name):
+        self.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def add_column(self, table, column, ddl):
+        if self.has_column(table, column):
+            return
+        try:
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        except OperationalError:
+            # Another worker added it between the check and the ALTER
+            if not self.has_column(table, column):
+                raise
+
+    def backfill(self, table, assignments, where):
+        """UPDATE table SET assignments WHERE where, batch_size rows per transaction.
+
+        `where` must stop matching a row once it is updated, or this never ends.
+        """
+        total = 0
+        while True:
+            updated = self.execute(
+                f"UPDATE {table} SET {assignments} WHERE id IN "
+                f"(SELECT id FROM {table} WHERE {where} LIMIT {int(self.batch_size)})"
+            ).rowcount
+            total += updated
+            if updated < self.batch_size:
+                return total
+            if self.pause:
+                time.sleep(self.pause)
+
+    def per_user(self, fn, batch_size=500):
+        """Call fn(conn, user_ids) for every user, batch_size users per transaction"""
+        with self.engine.connect() as conn:
+            user_ids = list(conn.execute(text("SELECT id FROM users ORDER BY id")).scalars())
+        for i in range(0, len(user_ids), batch_size):
+            with self.engine.begin() as conn:
+                fn(conn, user_ids[i:i + batch_size])
+            if self.pause and i + batch_size < len(user_ids):
+                time.sleep(self.pause)
+
+
+SCHEMA_LOCK_ID = 72046
+SCHEMA_LOCK_POLL_SECONDS = 0.5
+
+
+@contextlib.contextmanager
+def schema_lock(engine):
+    """Serialize schema changes across processes sharing the database"""
+    if engine.dialect.name == 'postgresql':
+        # A session-level lock on an autocommit connection, so no transaction
+        # stays open for CREATE INDEX CONCURRENTLY to wait on. Waiters poll
+        # instead of blocking in pg_advisory_lock(): a blocked statement keeps
+        # its snapshot, which the holder's CONCURRENTLY build waits for while
+        # the waiter waits for the lock, and Postgres aborts one as a deadlock.
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            while not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {'id': SCHEMA_LOCK_ID}).scalar():
+                time.sleep(SCHEMA_LOCK_POLL_SECONDS)
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {'id': SCHEMA_LOCK_ID})
+    elif engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:') and fcntl:
+        with open(f"{engine.url.database}.schema-lock", 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    else:
+        yield
+
+
+def prepare_schema(run_migrations=True):
+    """Create missing tables, then apply pending migrations, under the schema lock"""
+    with schema_lock(db.engine):
+        db.create_all()
+        return upgrade() if run_migrations else []
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine=None):
+    engine = engine or db.engine
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+
+def pending_migrations(engine=None):
+    applied = applied_versions(engine)
+    return [m for m in MIGRATIONS if m[0] not in applied]
+
+
+def upgrade(engine=None, target=None, batch_size=1000, pause=0.0):
+    """Apply pending migrations up to `target` (default: all); returns what ran"""
+    engine = engine or db.engine
+    migrator = Migrator(engine, batch_size=batch_size, pause=pause)
+    ran = []
+    for version, name, fn in pending_migrations(engine):
+        if target is not None and version > target:
+            break
+        started = time.perf_counter()
+        fn(migrator)
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                             {'v': version, 'n': name, 't': get_ist_now().replace(tzinfo=None)})
+        except IntegrityError:
+            # Recorded by another worker that ran it at the same time
+            pass
+        ran.append((version, name, time.perf_counter() - started))
+    return ran
+
+
+cli = AppGroup('db', help='Schema migrations.')
+
+
+@cli.command('upgrade')
+@click.option('--target', type=int, help='Stop after this version.')
+@click.option('--batch-size', type=int, default=1000, show_default=True, help='Rows per backfill transaction.')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between backfill batches.')
+def upgrade_command(target, batch_size, pause):
+    """Apply pending migrations."""
+    with schema_lock(db.engine):
+        db.create_all()
+        ran = upgrade(target=target, batch_size=batch_size, pause=pause)
+    for version, name, seconds in ran:
+        click.echo(f"applied {version:>4}  {name} ({seconds:.2f}s)")
+    if not ran:
+        click.echo("schema is up to date")
+
+
+@cli.command('status')
+def status_command():
+    """List migrations and whether each has been applied."""
+    applied = applied_versions()
+    for version, name, _ in MIGRATIONS:
+        click.echo(f"{'applied' if version in applied else 'pending':<8}{version:>4}  {name}")
+
+
+# Schema history. Never edit a migration once it has shipped; add a new one.
+
+@migration(1, 'per-user composite indexes')
+def _per_user_indexes(m):
+    m.create_index('ix_journals_user_timestamp', 'journals', ['user_id', 'timestamp'])
+    m.create_index('ix_chat_messages_user_session_timestamp', 'chat_messages', ['user_id', 'session_id', 'timestamp'])
+    m.create_index('ix_habit_progress_user_date', 'habit_progress', ['user_id', 'date'])
+    m.create_index('ix_reminders_user_active', 'reminders', ['user_id', 'is_active'])
+    m.create_index('ix_goals_user_active', 'goals', ['user_id', 'is_active'])
+    m.create_index('ix_activities_user_goal_date', 'activities', ['user_id', 'goal_id', 'date'])
+    m.create_index('ix_motivation_messages_user_read_created', 'motivation_messages', ['user_id', 'is_read', 'created_at'])
+    m.create_index('ix_sleep_logs_user_date', 'sleep_logs', ['user_id', 'date'])
+    m.create_index('ix_events_user_event_date', 'events', ['user_id', 'event_date'])
+    m.create_index('ix_user_sentiments_user_session_timestamp', 'user_sentiments', ['user_id', 'session_id', 'timestamp'])
+
+
+@migration(2, 'chat message status')
+def _chat_message_status(m):
+    # Constant default, so SQLite only edits the schema; existing rows read as 'complete'
+    m.add_column('chat_messages', 'status', "VARCHAR(20) NOT NULL DEFAULT 'complete'")
+
+
+# Migration 3's rollup rebuild, as wellness.rebuild_rollups() computed it then
+_WELLNESS_V3 = """
+INSERT INTO daily_wellness (user_id, day, mood_sum, mood_count, sleep_score_sum, sleep_count,
+                            activity_count, journal_count)
+SELECT user_id, day, SUM(mood_sum), SUM(mood_count), SUM(sleep_score_sum), SUM(sleep_count),
+       SUM(activity_count), SUM(journal_count)
+FROM (
+    SELECT user_id, {journal_day} AS day,
+           CASE lower(mood) WHEN 'happy' THEN 100 WHEN 'grateful' THEN 90 WHEN 'hopeful' THEN 85
+                WHEN 'content' THEN 80 WHEN 'neutral' THEN 70 WHEN 'anxious' THEN 50
+                WHEN 'stressed' THEN 40 WHEN 'sad' THEN 30 WHEN 'frustrated' THEN 20 ELSE 70 END AS mood_sum,
+           1 AS mood_count, 0 AS sleep_score_sum, 0 AS sleep_count, 0 AS activity_count, 1 AS journal_count
+    FROM journals WHERE user_id IN :user_ids
+    UNION ALL
+    SELECT user_id, date, 0, 0, CASE WHEN score > 100 THEN 100 ELSE score END, 1, 0, 0
+    FROM (
+        SELECT user_id, date,
+               CASE WHEN hours >= 7 AND hours <= 9 THEN 50 WHEN hours >= 6 AND hours < 7 THEN 40
+                    WHEN hours > 9 AND hours <= 10 THEN 45 WHEN hours >= 5 AND hours < 6 THEN 30
+                    WHEN hours >= 4 AND hours < 5 THEN 20 ELSE 10 END
+               + 10 * CASE WHEN quality IS NULL OR quality = 0 THEN 3 ELSE quality END AS score
+        FROM (SELECT user_id, date, coalesce(hours_slept, 0) AS hours, quality_rating AS quality
+              FROM sleep_logs WHERE user_id IN :user_ids) nights
+    ) scored
+    UNION ALL
+    SELECT a.user_id, a.date, 0, 0, 0, 0, 1, 0
+    FROM activities a JOIN goals g ON a.goal_id = g.id AND g.user_id = a.user_id
+    WHERE a.user_id IN :user_ids AND g.is_active = TRUE AND a.completed = TRUE
+) contributions
+GROUP BY user_id, day
+"""
+
+
+def _rebuild_wellness_v3(conn, user_ids):
+    # Delete first: it takes the write lock, so no write lands between the reads and the insert
+    conn.execute(text("DELETE FROM daily_wellness WHERE user_id IN :user_ids")
+                 .bindparams(bindparam('user_ids', expanding=True)), {'user_ids': user_ids})
+    # SQLite stores datetimes as text, where CAST would keep only the year
+    journal_day = 'date(timestamp)' if conn.dialect.name == 'sqlite' else 'CAST(timestamp AS DATE)'
+    conn.execute(text(_WELLNESS_V3.format(journal_day=journal_day))
+                 .bindparams(bindparam('user_ids', expanding=True)), {'user_ids': user_ids})
+
+
+@migration(3, 'daily wellness rollups')
+def _daily_wellness_rollups(m):
+    # create_all() made the table; fill it from existing journals, sleep logs and activities
+    m.per_user(_rebuild_wellness_v3)
+
+
+# Migration 4's aggregate rebuild, as sentiment_trends.rebuild() computed it then
+_SENTIMENT_CATEGORIES_V4 = ('happy', 'sad', 'anxious', 'frustrated', 'neutral', 'confused')
+
+
+def _rebuild_sentiment_v4(conn, user_ids):
+    alpha = min(max(float(os.environ.get('SENTIMENT_EWMA_ALPHA', '0.1')), 0.01), 1.0)
+    keep = 1.0 - alpha
+    ids = {'user_ids': user_ids}
+    for table in ('sentiment_profiles', 'sentiment_slots', 'sentiment_sessions'):
+        conn.execute(text(f"DELETE FROM {table} WHERE user_id IN :user_ids")
+                     .bindparams(bindparam('user_ids', expanding=True)), ids)
+
+    profiles, slots, sessions = {}, {}, {}
+    rows = conn.execute(
+        text("SELECT user_id, session_id, sentiment, intensity, timestamp FROM user_sentiments "
+             "WHERE user_id IN :user_ids ORDER BY user_id, timestamp, id")
+        .bindparams(bindparam('user_ids', expanding=True)).columns(timestamp=DateTime), ids)
+    for user_id, session_id, sentiment, intensity, at in rows:
+        category = (sentiment or '').lower()
+        if category not in _SENTIMENT_CATEGORIES_V4:
+            category = 'neutral'
+        intensity = 0.5 if intensity is None else min(max(float(intensity), 0.0), 1.0)
+
+        profile = profiles.get(user_id)
+        if profile is None:
+            profile = profiles[user_id] = dict({f'ewma_{c}': 0.0 for c in _SENTIMENT_CATEGORIES_V4},
+                                               user_id=user_id, message_count=0)
+        profile['message_count'] += 1
+        profile.update(last_sentiment=category, last_intensity=intensity, last_at=at)
+        for c in _SENTIMENT_CATEGORIES_V4:
+            profile[f'ewma_{c}'] = profile[f'ewma_{c}'] * keep + (alpha * intensity if c == category else 0.0)
+
+        slot = slots.setdefault((user_id, at.weekday(), at.hour, category), dict(
+            user_id=user_id, weekday=at.weekday(), hour=at.hour, sentiment=category, count=0, intensity_sum=0.0))
+        slot['count'] += 1
+        slot['intensity_sum'] += intensity
+
+        session = sessions.get((user_id, session_id))
+        if session is None:
+            sessions[(user_id, session_id)] = dict(
+                user_id=user_id, session_id=session_id, started_at=at, ended_at=at, message_count=1,
+                intensity_sum=intensity, first_sentiment=category, first_intensity=intensity,
+                last_sentiment=category, last_intensity=intensity, peak_sentiment=category, peak_intensity=intensity)
+            continue
+        session['message_count'] += 1
+        session['intensity_sum'] += intensity
+        session.update(ended_at=at, last_sentiment=category, last_intensity=intensity)
+        if intensity > session['peak_intensity']:
+            session.update(peak_sentiment=category, peak_intensity=intensity)
+
+    for table, values in (('sentiment_profiles', profiles), ('sentiment_slots', slots),
+                          ('sentiment_sessions', sessions)):
+        if values:
+            columns = list(next(iter(values.values())))
+            conn.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) "
+                              f"VALUES ({', '.join(':' + c for c in columns)})"), list(values.values()))
+
+
+@migration(4, 'sentiment trend aggregates')
+def _sentiment_trend_aggregates(m):
+    # create_all() made the tables; fill them from existing user_sentiments
+    m.per_user(_rebuild_sentiment_v4)
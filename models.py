@@ -10,13 +10,28 @@ IST = pytz.timezone('Asia/Kolkata')
 def get_ist_now():
     return datetime.now(IST)
 
+class ISTDateTime(db.TypeDecorator):
+    """Naive IST wall-clock time on every backend.
+
+    SQLite drops tzinfo when storing, but PostgreSQL would convert an aware
+    value to its session time zone first; normalizing here keeps stored
+    times and naive IST comparisons in app.py the same on both.
+    """
+    impl = db.DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(IST).replace(tzinfo=None)
+        return value
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
     
     profile = db.relationship('UserProfile', backref='user', uselist=False, cascade='all, delete-orphan')
     journals = db.relationship('Journal', backref='user', lazy=True, cascade='all, delete-orphan')
@@ -32,62 +47,93 @@ class UserProfile(db.Model):
     goal = db.Column(db.Text, nullable=False)
     reminder_enabled = db.Column(db.Boolean, default=True)
     reminder_time = db.Column(db.String(10), nullable=True)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
 
 class Journal(db.Model):
     __tablename__ = 'journals'
+    __table_args__ = (
+        db.Index('ix_journals_user_timestamp', 'user_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     mood = db.Column(db.String(50), nullable=False)
     summary = db.Column(db.Text, nullable=False)
     goal_progress = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<Journal {self.id} - {self.mood} on {self.timestamp}>'
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        db.Index('ix_chat_messages_user_session_timestamp', 'user_id', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     session_id = db.Column(db.String(100), nullable=False)
     role = db.Column(db.String(20), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    # 'pending' until the reply is stored with it; stays so for unanswered messages
+    status = db.Column(db.String(20), nullable=False, default='complete', server_default='complete')
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<ChatMessage {self.id} - {self.role}>'
 
+class ChatSessionSummary(db.Model):
+    __tablename__ = 'chat_session_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    session_id = db.Column(db.String(100), nullable=False, unique=True)
+    summary = db.Column(db.Text, nullable=False)
+    summarized_through_id = db.Column(db.Integer, nullable=False)
+    summarized_tokens = db.Column(db.Integer, default=0)
+    updated_at = db.Column(ISTDateTime, default=get_ist_now, onupdate=get_ist_now)
+    
+    def __repr__(self):
+        return f'<ChatSessionSummary {self.session_id} through {self.summarized_through_id}>'
+
 class HabitProgress(db.Model):
     __tablename__ = 'habit_progress'
+    __table_args__ = (
+        db.Index('ix_habit_progress_user_date', 'user_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     progress_note = db.Column(db.Text, nullable=True)
     mood = db.Column(db.String(50), nullable=True)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<HabitProgress {self.id} - {self.date}>'
 
 class Reminder(db.Model):
     __tablename__ = 'reminders'
+    __table_args__ = (
+        db.Index('ix_reminders_user_active', 'user_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     time = db.Column(db.String(10), nullable=True)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<Reminder {self.id} - {self.message[:20]}...>'
 
 class Goal(db.Model):
     __tablename__ = 'goals'
+    __table_args__ = (
+        db.Index('ix_goals_user_active', 'user_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -96,7 +142,7 @@ class Goal(db.Model):
     description = db.Column(db.Text, nullable=True)
     target_days = db.Column(db.Integer, default=30)
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
     
     activities = db.relationship('Activity', backref='goal', lazy=True, cascade='all, delete-orphan')
     
@@ -105,6 +151,9 @@ class Goal(db.Model):
 
 class Activity(db.Model):
     __tablename__ = 'activities'
+    __table_args__ = (
+        db.Index('ix_activities_user_goal_date', 'user_id', 'goal_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goals.id'), nullable=False)
@@ -113,26 +162,32 @@ class Activity(db.Model):
     activity_type = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text, nullable=True)
     completed = db.Column(db.Boolean, default=True)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<Activity {self.id} - {self.activity_type}>'
 
 class MotivationMessage(db.Model):
     __tablename__ = 'motivation_messages'
+    __table_args__ = (
+        db.Index('ix_motivation_messages_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     message_type = db.Column(db.String(50), nullable=False)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<MotivationMessage {self.id}>'
 
 class SleepLog(db.Model):
     __tablename__ = 'sleep_logs'
+    __table_args__ = (
+        db.Index('ix_sleep_logs_user_date', 'user_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -142,13 +197,36 @@ class SleepLog(db.Model):
     hours_slept = db.Column(db.Float, nullable=True)
     quality_rating = db.Column(db.Integer, nullable=True)
     notes = db.Column(db.Text, nullable=True)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<SleepLog {self.id} - {self.date}>'
 
+class DailyWellness(db.Model):
+    """Per-user, per-day totals behind the wellness score, kept up to date by wellness.py"""
+    __tablename__ = 'daily_wellness'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'day', name='uq_daily_wellness_user_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    mood_sum = db.Column(db.Integer, nullable=False, default=0)
+    mood_count = db.Column(db.Integer, nullable=False, default=0)
+    sleep_score_sum = db.Column(db.Integer, nullable=False, default=0)
+    sleep_count = db.Column(db.Integer, nullable=False, default=0)
+    activity_count = db.Column(db.Integer, nullable=False, default=0)
+    journal_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyWellness {self.user_id} on {self.day}>'
+
 class Event(db.Model):
     __tablename__ = 'events'
+    __table_args__ = (
+        db.Index('ix_events_user_event_date', 'user_id', 'event_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -161,24 +239,92 @@ class Event(db.Model):
     is_in_google_calendar = db.Column(db.Boolean, default=False)
     google_calendar_id = db.Column(db.String(200), nullable=True)
     created_from_message = db.Column(db.Text, nullable=True)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<Event {self.id} - {self.title}>'
 
 class UserSentiment(db.Model):
     __tablename__ = 'user_sentiments'
+    __table_args__ = (
+        db.Index('ix_user_sentiments_user_session_timestamp', 'user_id', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     session_id = db.Column(db.String(100), nullable=False)
     sentiment = db.Column(db.String(50), nullable=False)
     intensity = db.Column(db.Float, default=0.5)
-    timestamp = db.Column(db.DateTime, default=get_ist_now)
+    timestamp = db.Column(ISTDateTime, default=get_ist_now)
     
     def __repr__(self):
         return f'<UserSentiment {self.id} - {self.sentiment}>'
 
+class SentimentProfile(db.Model):
+    """Per-user running chat sentiment: message count, the latest reading and an
+    exponentially weighted intensity per category, kept up to date by sentiment_trends.py"""
+    __tablename__ = 'sentiment_profiles'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    last_sentiment = db.Column(db.String(50), nullable=True)
+    last_intensity = db.Column(db.Float, nullable=True)
+    last_at = db.Column(ISTDateTime, nullable=True)
+    # One per category in ai_core's SENTIMENT_CATEGORIES
+    ewma_happy = db.Column(db.Float, nullable=False, default=0.0)
+    ewma_sad = db.Column(db.Float, nullable=False, default=0.0)
+    ewma_anxious = db.Column(db.Float, nullable=False, default=0.0)
+    ewma_frustrated = db.Column(db.Float, nullable=False, default=0.0)
+    ewma_neutral = db.Column(db.Float, nullable=False, default=0.0)
+    ewma_confused = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<SentimentProfile {self.user_id}>'
+
+class SentimentSlot(db.Model):
+    """Chat sentiment counts and intensity totals per user, weekday, hour and category"""
+    __tablename__ = 'sentiment_slots'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'weekday', 'hour', 'sentiment', name='uq_sentiment_slots_user_slot'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)
+    hour = db.Column(db.Integer, nullable=False)
+    sentiment = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    intensity_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<SentimentSlot {self.user_id} {self.weekday}/{self.hour} {self.sentiment}>'
+
+class SentimentSession(db.Model):
+    """The emotional arc of one chat session: first, last and peak readings"""
+    __tablename__ = 'sentiment_sessions'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'session_id', name='uq_sentiment_sessions_user_session'),
+        db.Index('ix_sentiment_sessions_user_ended', 'user_id', 'ended_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    session_id = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(ISTDateTime, nullable=False)
+    ended_at = db.Column(ISTDateTime, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False, default=0)
+    intensity_sum = db.Column(db.Float, nullable=False, default=0.0)
+    first_sentiment = db.Column(db.String(50), nullable=False)
+    first_intensity = db.Column(db.Float, nullable=False)
+    last_sentiment = db.Column(db.String(50), nullable=False)
+    last_intensity = db.Column(db.Float, nullable=False)
+    peak_sentiment = db.Column(db.String(50), nullable=False)
+    peak_intensity = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<SentimentSession {self.session_id}>'
+
 class GoogleCalendarToken(db.Model):
     __tablename__ = 'google_calendar_tokens'
     
@@ -190,9 +336,9 @@ class GoogleCalendarToken(db.Model):
     client_id = db.Column(db.String(200), nullable=True)
     client_secret = db.Column(db.String(200), nullable=True)
     scopes = db.Column(db.Text, nullable=True)
-    expiry = db.Column(db.DateTime, nullable=True)
-    created_at = db.Column(db.DateTime, default=get_ist_now)
-    updated_at = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+    expiry = db.Column(ISTDateTime, nullable=True)
+    created_at = db.Column(ISTDateTime, default=get_ist_now)
+    updated_at = db.Column(ISTDateTime, default=get_ist_now, onupdate=get_ist_now)
     
     def __repr__(self):
         return f'<GoogleCalendarToken {self.id} - User {self.user_id}>'
@@ -0,0 +1,279 @@
+import os
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, insert, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, get_ist_now, User, UserSentiment, SentimentProfile, SentimentSlot, SentimentSession
+from tracing import span
+
+# Running aggregates over the chat sentiment rows /chat writes for every
+# message, so trends are read from a few small rows instead of the history.
+#
+# - sentiment_profiles: per user, the message count, the latest reading and
+#   an exponentially weighted moving average per category of the message's
+#   intensity (0 for the other categories), so recent messages dominate.
+# - sentiment_slots: per user, weekday, hour and category, the message count
+#   and intensity total, for time-of-day and day-of-week histograms.
+# - sentiment_sessions: per chat session, its first, last and peak readings,
+#   the emotional arc of that conversation.
+#
+# record() keeps them current: three upserts, whatever the history, run by
+# finish_chat_turn() in the transaction that stores the sentiment row. The
+# averages decay per message, not per day, so a quiet week doesn't erase
+# them. rebuild() recomputes users from user_sentiments for `flask --app app
+# sentiment backfill`, which is also the way to apply a new
+# SENTIMENT_EWMA_ALPHA to existing averages. Migration 4 keeps its own copy.
+
+# ai_core's SENTIMENT_CATEGORIES, one ewma_* column each
+CATEGORIES = ('happy', 'sad', 'anxious', 'frustrated', 'neutral', 'confused')
+# Weight of the newest message in the averages; 0.1 is roughly the last 10-20 messages
+ALPHA = min(max(float(os.environ.get('SENTIMENT_EWMA_ALPHA', '0.1')), 0.01), 1.0)
+KEEP = 1.0 - ALPHA
+DEFAULT_INTENSITY = 0.5
+# Signed mood of a category for the session arcs
+VALENCE = {'happy': 1, 'sad': -1, 'anxious': -1, 'frustrated': -1}
+ARC_THRESHOLD = 0.25
+DEFAULT_SESSIONS = 10
+MAX_SESSIONS = 50
+# Fewer messages than this say little about a trend, so the prompt leaves it out
+PROMPT_MIN_MESSAGES = 5
+PROMPT_MIN_WEIGHT = 0.1
+
+
+def observation(sentiment, intensity):
+    """(category, intensity) as aggregated; unknown categories count as neutral"""
+    category = (sentiment or '').lower()
+    if category not in CATEGORIES:
+        category = 'neutral'
+    intensity = DEFAULT_INTENSITY if intensity is None else min(max(float(intensity), 0.0), 1.0)
+    return category, intensity
+
+
+def _upsert(upsert, model, keys, set_):
+    table = model.__table__
+    stmt = upsert(table)
+    return stmt.on_conflict_do_update(index_elements=[table.c[key] for key in keys], set_=set_(table.c, stmt.excluded))
+
+
+def _build_statements(dialect_name):
+    """The three upserts behind record(), built once per dialect and run with per-message parameters"""
+    upsert = postgresql_insert if dialect_name == 'postgresql' else sqlite_insert
+    ewma = [f'ewma_{c}' for c in CATEGORIES]
+    profile = _upsert(upsert, SentimentProfile, ['user_id'], lambda old, new: dict(
+        message_count=old.message_count + 1,
+        last_sentiment=new.last_sentiment, last_intensity=new.last_intensity, last_at=new.last_at,
+        **{name: old[name] * KEEP + new[name] for name in ewma}
+    ))
+    slot = _upsert(upsert, SentimentSlot, ['user_id', 'weekday', 'hour', 'sentiment'], lambda old, new: dict(
+        count=old.count + 1, intensity_sum=old.intensity_sum + new.intensity_sum
+    ))
+    session = _upsert(upsert, SentimentSession, ['user_id', 'session_id'], lambda old, new: dict(
+        ended_at=new.ended_at,
+        message_count=old.message_count + 1,
+        intensity_sum=old.intensity_sum + new.intensity_sum,
+        last_sentiment=new.last_sentiment, last_intensity=new.last_intensity,
+        peak_sentiment=case((new.peak_intensity > old.peak_intensity, new.peak_sentiment), else_=old.peak_sentiment),
+        peak_intensity=case((new.peak_intensity > old.peak_intensity, new.peak_intensity), else_=old.peak_intensity)
+    ))
+    return profile, slot, session
+
+
+_statements = {}
+
+
+def record(sentiment):
+    """Fold one UserSentiment row into its user's aggregates; runs in the session's transaction"""
+    if sentiment.timestamp is None:
+        # The column default, set now so the slot and session times are the row's
+        sentiment.timestamp = get_ist_now()
+    category, intensity = observation(sentiment.sentiment, sentiment.intensity)
+    at, user_id = sentiment.timestamp, sentiment.user_id
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect not in _statements:
+        # Building these costs more than running them, so it happens once
+        _statements[dialect] = _build_statements(dialect)
+    profile, slot, session = _statements[dialect]
+    db.session.execute(profile, dict(
+        user_id=user_id, message_count=1, last_sentiment=category, last_intensity=intensity, last_at=at,
+        **{f'ewma_{c}': ALPHA * intensity if c == category else 0.0 for c in CATEGORIES}
+    ))
+    db.session.execute(slot, dict(
+        user_id=user_id, weekday=at.weekday(), hour=at.hour, sentiment=category, count=1, intensity_sum=intensity
+    ))
+    db.session.execute(session, dict(
+        user_id=user_id, session_id=sentiment.session_id, started_at=at, ended_at=at, message_count=1,
+        intensity_sum=intensity, first_sentiment=category, first_intensity=intensity,
+        last_sentiment=category, last_intensity=intensity, peak_sentiment=category, peak_intensity=intensity
+    ))
+
+
+def recent_weights(profile):
+    """The profile's averages per category, corrected for having started at zero"""
+    if profile is None or not profile.message_count:
+        return {}
+    correction = 1.0 - KEEP ** profile.message_count
+    return {c: getattr(profile, f'ewma_{c}') / correction for c in CATEGORIES}
+
+
+def arc(first_sentiment, first_intensity, last_sentiment, last_intensity):
+    """'lifted', 'dipped' or 'steady', from the signed mood at the start and end of a session"""
+    change = (VALENCE.get(last_sentiment, 0) * last_intensity
+              - VALENCE.get(first_sentiment, 0) * first_intensity)
+    if change >= ARC_THRESHOLD:
+        return 'lifted'
+    if change <= -ARC_THRESHOLD:
+        return 'dipped'
+    return 'steady'
+
+
+def _histogram(slots, position, size):
+    counts, totals = [0] * size, [0.0] * size
+    sentiments = {}
+    for weekday, hour, sentiment, count, intensity_sum in slots:
+        i = position(weekday, hour)
+        counts[i] += count
+        totals[i] += intensity_sum
+        sentiments.setdefault(sentiment, [0] * size)[i] += count
+    return {
+        'count': counts,
+        'intensity': [round(total / count, 3) if count else None for total, count in zip(totals, counts)],
+        'sentiments': dict(sorted(sentiments.items()))
+    }
+
+
+def session_dict(row):
+    return {
+        'session_id': row.session_id,
+        'started_at': row.started_at.isoformat(),
+        'ended_at': row.ended_at.isoformat(),
+        'messages': row.message_count,
+        'intensity': round(row.intensity_sum / row.message_count, 3),
+        'first': {'sentiment': row.first_sentiment, 'intensity': row.first_intensity},
+        'last': {'sentiment': row.last_sentiment, 'intensity': row.last_intensity},
+        'peak': {'sentiment': row.peak_sentiment, 'intensity': row.peak_intensity},
+        'arc': arc(row.first_sentiment, row.first_intensity, row.last_sentiment, row.last_intensity)
+    }
+
+
+def trends(user_id, sessions=DEFAULT_SESSIONS):
+    """Recent weights, hour and weekday histograms and the last `sessions` session arcs: three small reads"""
+    with span('sentiment.trends') as s:
+        profile = SentimentProfile.query.filter_by(user_id=user_id).first()
+        slots = db.session.query(
+            SentimentSlot.weekday, SentimentSlot.hour, SentimentSlot.sentiment, SentimentSlot.count, SentimentSlot.intensity_sum
+        ).filter(SentimentSlot.user_id == user_id).all()
+        recent_sessions = SentimentSession.query.filter_by(user_id=user_id).order_by(
+            SentimentSession.ended_at.desc(), SentimentSession.id.desc()
+        ).limit(sessions).all()
+        s.set(slots=len(slots), sessions=len(recent_sessions))
+
+    weights = recent_weights(profile)
+    return {
+        'messages': profile.message_count if profile else 0,
+        'last': {'sentiment': profile.last_sentiment, 'intensity': profile.last_intensity,
+                 'at': profile.last_at.isoformat()} if profile else None,
+        'recent': {
+            'weights': {c: round(w, 3) for c, w in weights.items()},
+            'dominant': max(weights, key=weights.get) if weights else None
+        },
+        'by_hour': _histogram(slots, lambda weekday, hour: hour, 24),
+        # 0 is Monday
+        'by_weekday': _histogram(slots, lambda weekday, hour: weekday, 7),
+        'sessions': [session_dict(row) for row in recent_sessions]
+    }
+
+
+def prompt_context(user_id):
+    """A line on the user's recent emotional pattern for the chat prompt, or '' without enough history"""
+    profile = SentimentProfile.query.filter_by(user_id=user_id).first()
+    if profile is None or profile.message_count < PROMPT_MIN_MESSAGES:
+        return ""
+    weights = recent_weights(profile)
+    leading = [c for c in sorted(weights, key=weights.get, reverse=True) if weights[c] >= PROMPT_MIN_WEIGHT][:2]
+    if not leading:
+        return ""
+    pattern = " and, less often, ".join(leading)
+    return (f"\n\n[EMOTIONAL TREND]\nAcross their recent messages the user has mostly felt {pattern}. "
+            "Let this inform your tone, but respond to how they feel right now.")
+
+
+def rebuild(conn, user_ids):
+    """Recompute the aggregates of `user_ids` from user_sentiments in the caller's transaction; returns rows read"""
+    # Delete first: it takes the write lock, so no write lands between the read and the inserts
+    for model in (SentimentProfile, SentimentSlot, SentimentSession):
+        conn.execute(delete(model).where(model.user_id.in_(user_ids)))
+
+    profiles, slots, sessions = {}, {}, {}
+    rows = conn.execute(
+        select(UserSentiment.user_id, UserSentiment.session_id, UserSentiment.sentiment,
+               UserSentiment.intensity, UserSentiment.timestamp)
+        .where(UserSentiment.user_id.in_(user_ids))
+        .order_by(UserSentiment.user_id, UserSentiment.timestamp, UserSentiment.id)
+    )
+    read = 0
+    for user_id, session_id, sentiment, intensity, at in rows:
+        read += 1
+        category, intensity = observation(sentiment, intensity)
+        # The same arithmetic, in the same order, as record()'s upserts
+        profile = profiles.get(user_id)
+        if profile is None:
+            profile = profiles[user_id] = dict({f'ewma_{c}': 0.0 for c in CATEGORIES}, user_id=user_id, message_count=0)
+        profile['message_count'] += 1
+        profile.update(last_sentiment=category, last_intensity=intensity, last_at=at)
+        for c in CATEGORIES:
+            profile[f'ewma_{c}'] = profile[f'ewma_{c}'] * KEEP + (ALPHA * intensity if c == category else 0.0)
+
+        slot = slots.setdefault((user_id, at.weekday(), at.hour, category), dict(
+            user_id=user_id, weekday=at.weekday(), hour=at.hour, sentiment=category, count=0, intensity_sum=0.0))
+        slot['count'] += 1
+        slot['intensity_sum'] += intensity
+
+        session = sessions.get((user_id, session_id))
+        if session is None:
+            sessions[(user_id, session_id)] = dict(
+                user_id=user_id, session_id=session_id, started_at=at, ended_at=at, message_count=1,
+                intensity_sum=intensity, first_sentiment=category, first_intensity=intensity,
+                last_sentiment=category, last_intensity=intensity, peak_sentiment=category, peak_intensity=intensity)
+            continue
+        session['message_count'] += 1
+        session['intensity_sum'] += intensity
+        session.update(ended_at=at, last_sentiment=category, last_intensity=intensity)
+        if intensity > session['peak_intensity']:
+            session.update(peak_sentiment=category, peak_intensity=intensity)
+
+    for model, values in ((SentimentProfile, profiles), (SentimentSlot, slots), (SentimentSession, sessions)):
+        if values:
+            conn.execute(insert(model), list(values.values()))
+    return read
+
+
+def backfill(engine, user_ids=None, batch_size=500, pause=0.0):
+    """Rebuild the aggregates of `user_ids` (default: everyone), batch_size users per transaction"""
+    if user_ids is None:
+        with engine.connect() as conn:
+            user_ids = list(conn.execute(select(User.id).order_by(User.id)).scalars())
+    rows = 0
+    for i in range(0, len(user_ids), batch_size):
+        with engine.begin() as conn:
+            rows += rebuild(conn, user_ids[i:i + batch_size])
+        if pause and i + batch_size < len(user_ids):
+            time.sleep(pause)
+    return len(user_ids), rows
+
+
+cli = AppGroup('sentiment', help='Chat sentiment trend aggregates.')
+
+
+@cli.command('backfill')
+@click.option('--user', 'user_ids', type=int, multiple=True, help='Only this user (repeatable).')
+@click.option('--batch-size', type=int, default=500, show_default=True, help='Users per transaction.')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+def backfill_command(user_ids, batch_size, pause):
+    """Rebuild sentiment profiles, hour/weekday slots and session arcs from user_sentiments."""
+    users, rows = backfill(db.engine, list(user_ids) or None, batch_size=batch_size, pause=pause)
+    click.echo(f"rebuilt sentiment trends from {rows} messages for {users} users")
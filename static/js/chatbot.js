@@ -116,9 +116,11 @@ async function sendMessage() {
     sendBtn.disabled = true;
     
     const typingIndicator = addTypingIndicator();
+    let messageText = null;
+    let fullResponse = '';
     
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat_stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -126,25 +128,66 @@ async function sendMessage() {
             body: JSON.stringify({ message }),
         });
         
-        const data = await response.json();
-        
-        typingIndicator.remove();
-        
-        if (data.success) {
-            addMessageToChat('ai', data.response);
-            speakText(data.response);
-        } else {
-            addMessageToChat('error', data.error || 'Something went wrong');
-        }
+        await readChatStream(response, (eventType, data) => {
+            if (eventType === 'token') {
+                if (!messageText) {
+                    typingIndicator.remove();
+                    messageText = addMessageToChat('ai', '');
+                }
+                fullResponse += data.text;
+                messageText.textContent = fullResponse;
+                chatBox.scrollTop = chatBox.scrollHeight;
+            } else if (eventType === 'done') {
+                // An empty reply never sent a token
+                typingIndicator.remove();
+                speakText(fullResponse);
+            } else if (eventType === 'error') {
+                typingIndicator.remove();
+                throw new Error(data.error || 'Something went wrong');
+            } else {
+                // sentiment / detected_event metadata for anything that wants it
+                document.dispatchEvent(new CustomEvent(`chat:${eventType}`, { detail: data }));
+            }
+        });
     } catch (error) {
         typingIndicator.remove();
-        addMessageToChat('error', 'Failed to connect. Please try again.');
+        addMessageToChat('error', error.message || 'Failed to connect. Please try again.');
     }
     
     sendBtn.disabled = false;
     userInput.focus();
 }
 
+async function readChatStream(response, onEvent) {
+    if (!response.ok || !response.body) {
+        const data = await response.json();
+        throw new Error(data.error || 'Failed to connect. Please try again.');
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+        
+        for (const frame of frames) {
+            let eventType = 'message';
+            let data = '';
+            for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) eventType = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            if (data) onEvent(eventType, JSON.parse(data));
+        }
+    }
+}
+
 function addMessageToChat(sender, message) {
     const messageDiv = document.createElement('div');
     messageDiv.className = sender === 'user' ? 'user-message-elegant' : 'ai-message-elegant';
@@ -171,6 +214,7 @@ function addMessageToChat(sender, message) {
     messageDiv.appendChild(messageContent);
     chatBox.appendChild(messageDiv);
     chatBox.scrollTop = chatBox.scrollHeight;
+    return messageText;
 }
 
 function addTypingIndicator() {
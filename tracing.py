@@ -0,0 +1,234 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# Spans time the stages of a request (chat.begin, classify, llm.companion,
+# chat.commit, ...) and carry attributes: token counts, cache hits, row
+# counts. Each finished span feeds the in-process metrics below, which
+# /metrics serves in the Prometheus text format. Spans are also kept on the
+# current request's Trace, which can be rendered as a Server-Timing header.
+#
+# The current trace and span live in context variables. A plain thread pool
+# does not carry them over; submit work with contextvars.copy_context().run
+# when its spans should count toward the request. Metrics are per process:
+# each gunicorn worker serves its own numbers, so scrape every worker or
+# run a single one behind the scraper.
+#
+# Attribute names with a meaning here:
+#     cache_hit        counted in emoai_cache_lookups_total
+#     prompt_tokens    added to emoai_llm_tokens_total{direction="prompt"}
+#     response_tokens  added to emoai_llm_tokens_total{direction="response"}
+#     role             labels the token counts (defaults to the span name)
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar('emoai_trace', default=None)
+_current_span = contextvars.ContextVar('emoai_span', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Counters and histograms keyed by metric name and a sorted tuple of labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, kind, help_text):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self):
+        """Everything recorded so far, in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(h.counts), h.sum) for key, h in self._histograms.items())
+        lines, described = [], set()
+
+        def header(name):
+            if name not in described and name in self._help:
+                kind, help_text = self._help[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+            described.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), counts, total in histograms:
+            header(name)
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (k + '="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+metrics = Metrics()
+metrics.describe('emoai_requests_total', 'counter', 'Requests by route and status code.')
+metrics.describe('emoai_request_duration_seconds', 'histogram', 'Request latency by route, including streamed bodies.')
+metrics.describe('emoai_span_duration_seconds', 'histogram', 'Time spent in each traced stage.')
+metrics.describe('emoai_span_errors_total', 'counter', 'Traced stages that raised.')
+metrics.describe('emoai_llm_tokens_total', 'counter', 'Estimated model tokens by role and direction.')
+metrics.describe('emoai_cache_lookups_total', 'counter', 'Cache lookups made inside traced stages, by result.')
+
+
+class Span:
+    __slots__ = ('name', 'attrs', 'started', 'duration', 'error')
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration = None
+        self.error = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self, trace=None):
+        """Stop the clock and record the span; for spans not opened with span(), like a stream's"""
+        self.duration = time.perf_counter() - self.started
+        _record(self)
+        trace = trace if trace is not None else _current_trace.get()
+        if trace is not None:
+            trace.add(self)
+
+
+class Trace:
+    """The spans of one request"""
+
+    def __init__(self, route, owned=False):
+        self.route = route
+        # True when the server (asgi.py) ends the trace itself, after the
+        # response has been sent, instead of Flask's after_request hook
+        self.owned = owned
+        self.started = time.perf_counter()
+        self.spans = []
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            # A timed-out classifier thread may still finish its spans later
+            if not self.finished:
+                self.spans.append(span)
+
+    def server_timing(self):
+        """A Server-Timing header value: total time, then each stage summed by name"""
+        with self._lock:
+            spans = list(self.spans)
+        totals = {}
+        for s in spans:
+            totals[s.name] = totals.get(s.name, 0.0) + s.duration
+        entries = [f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}"]
+        entries += [f"{name.replace('.', '-')};dur={seconds * 1000:.1f}" for name, seconds in totals.items()]
+        return ', '.join(entries)
+
+
+def _record(s):
+    metrics.observe('emoai_span_duration_seconds', {'span': s.name}, s.duration)
+    if s.error:
+        metrics.inc('emoai_span_errors_total', {'span': s.name})
+    if 'cache_hit' in s.attrs:
+        metrics.inc('emoai_cache_lookups_total', {'span': s.name, 'result': 'hit' if s.attrs['cache_hit'] else 'miss'})
+    role = s.attrs.get('role', s.name)
+    for direction in ('prompt', 'response'):
+        tokens = s.attrs.get(f'{direction}_tokens')
+        if tokens:
+            metrics.inc('emoai_llm_tokens_total', {'role': role, 'direction': direction}, tokens)
+
+
+@contextlib.contextmanager
+def span(name, **attrs):
+    """Time the block as a stage of the current request (if any); yields the Span for attributes"""
+    s = Span(name, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException:
+        s.error = True
+        raise
+    finally:
+        _current_span.reset(token)
+        s.finish()
+
+
+def annotate(**attrs):
+    """Set attributes on the innermost open span, if there is one"""
+    s = _current_span.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def start_trace(route, owned=False):
+    trace = Trace(route, owned)
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def end_trace(trace, status):
+    """Record the request's latency and stop collecting its spans"""
+    with trace._lock:
+        if trace.finished:
+            return
+        trace.finished = True
+    labels = {'route': trace.route}
+    metrics.observe('emoai_request_duration_seconds', labels, time.perf_counter() - trace.started)
+    metrics.inc('emoai_requests_total', dict(labels, status=str(status)))
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+
+
+def render_stats(prefix, stats, help_text):
+    """Render a get_*_stats() dict as untyped Prometheus samples named emoai_<prefix>_<key>"""
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            name = f"emoai_{prefix}_{key}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} untyped")
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n' if lines else ''
@@ -0,0 +1,243 @@
+import time
+from datetime import timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from journals import as_date, journal_day
+from models import db, get_ist_now, User, Journal, SleepLog, Goal, Activity, DailyWellness
+
+# The 0-100 wellness score behind /wellness_score, from four equally weighted
+# components: mood (journal moods over the window, 7 days by default), sleep
+# (duration and quality over the window), habits (completed activities on
+# goals over the window) and journal consistency (journals in the last 30 days).
+#
+# Scores are read from daily_wellness, one row per user and day holding the
+# sums and counts each component needs. Any window is a scan over its few
+# dozen rows plus the active goal count, two queries however much history or
+# how many goals the user has. The rows are kept current by the write paths:
+# record_journal(), record_sleep() and record_activity() upsert the day's
+# deltas in the same transaction as the row they describe, and take
+# removed=True for a delete. rebuild_rollups() recomputes users from the raw
+# rows for `flask --app app wellness backfill`; migration 3 keeps its own copy,
+# so a change to the scoring here needs a backfill run on existing databases.
+#
+# Activities are counted when logged, and log_activity only accepts active
+# goals. Nothing deactivates a goal today; if something starts to, rebuild
+# that user so the goal's past activities stop counting.
+
+MOOD_VALUES = {'happy': 100, 'grateful': 90, 'hopeful': 85, 'content': 80,
+               'neutral': 70, 'anxious': 50, 'stressed': 40, 'sad': 30, 'frustrated': 20}
+DEFAULT_MOOD_VALUE = 70
+# Used for a component with no data in its window
+NEUTRAL_COMPONENT = 50
+WEIGHT = 0.25
+CONSISTENCY_DAYS = 30
+
+
+def mood_value(mood):
+    return MOOD_VALUES.get(mood.lower(), DEFAULT_MOOD_VALUE)
+
+
+def night_score(hours, quality):
+    """One night's 0-100 sleep score; missing hours count as 0 and a missing (or zero) rating as 3"""
+    hours, quality = hours or 0, quality or 3
+    if 7 <= hours <= 9:
+        duration = 50
+    elif 6 <= hours < 7:
+        duration = 40
+    elif 9 < hours <= 10:
+        duration = 45
+    elif 5 <= hours < 6:
+        duration = 30
+    elif 4 <= hours < 5:
+        duration = 20
+    else:
+        duration = 10
+    return min(duration + quality * 10, 100)
+
+
+# The same mappings in SQL, for rebuilding from the raw rows
+
+def mood_value_expr():
+    return case(
+        *[(func.lower(Journal.mood) == mood, value) for mood, value in MOOD_VALUES.items()],
+        else_=DEFAULT_MOOD_VALUE
+    )
+
+
+def sleep_duration_expr():
+    hours = func.coalesce(SleepLog.hours_slept, 0)
+    return case(
+        (and_(hours >= 7, hours <= 9), 50),
+        (and_(hours >= 6, hours < 7), 40),
+        (and_(hours > 9, hours <= 10), 45),
+        (and_(hours >= 5, hours < 6), 30),
+        (and_(hours >= 4, hours < 5), 20),
+        else_=10
+    )
+
+
+def sleep_quality_expr():
+    return case(
+        (or_(SleepLog.quality_rating.is_(None), SleepLog.quality_rating == 0), 3),
+        else_=SleepLog.quality_rating
+    )
+
+
+def category_for(score):
+    if score < 40:
+        return 'Needs Attention'
+    if score < 60:
+        return 'Fair'
+    if score < 80:
+        return 'Good'
+    return 'Excellent'
+
+
+def _apply(user_id, day, **deltas):
+    """Add `deltas` to the user's rollup for `day`, creating it if needed; runs in the session's transaction"""
+    dialect = db.session.get_bind().dialect.name
+    upsert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+    stmt = upsert(DailyWellness).values(user_id=user_id, day=day, **deltas)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyWellness.user_id, DailyWellness.day],
+        set_={name: getattr(DailyWellness, name) + stmt.excluded[name] for name in deltas}
+    ))
+
+
+def record_journal(journal, removed=False):
+    if journal.timestamp is None:
+        # The column default, set now so the rollup day is the entry's day
+        journal.timestamp = get_ist_now()
+    sign = -1 if removed else 1
+    _apply(journal.user_id, journal.timestamp.date(),
+           mood_sum=sign * mood_value(journal.mood), mood_count=sign, journal_count=sign)
+
+
+def record_sleep(user_id, day, before=None, after=None):
+    """A night's log changed from `before` to `after`, each (hours, quality) or None when absent"""
+    score = night_score(*after) if after else 0
+    if before:
+        score -= night_score(*before)
+    _apply(user_id, day, sleep_score_sum=score, sleep_count=(after is not None) - (before is not None))
+
+
+def record_activity(activity, removed=False):
+    if activity.completed is False:
+        return
+    _apply(activity.user_id, activity.date, activity_count=-1 if removed else 1)
+
+
+def compute_wellness(user_id, today, days=7):
+    """Overall score, category and per-component breakdown for the `days` days up to `today`"""
+    window_start = today - timedelta(days=days)
+    month_start = today - timedelta(days=CONSISTENCY_DAYS)
+
+    rows = db.session.query(
+        DailyWellness.day, DailyWellness.mood_sum, DailyWellness.mood_count, DailyWellness.sleep_score_sum,
+        DailyWellness.sleep_count, DailyWellness.activity_count, DailyWellness.journal_count
+    ).filter(
+        DailyWellness.user_id == user_id,
+        DailyWellness.day >= min(window_start, month_start)
+    ).all()
+    goal_count = db.session.query(func.count(Goal.id)).filter(
+        Goal.user_id == user_id, Goal.is_active == True
+    ).scalar()
+
+    in_window = [r for r in rows if r.day >= window_start]
+    mood_sum, mood_count = sum(r.mood_sum for r in in_window), sum(r.mood_count for r in in_window)
+    sleep_sum, sleep_count = sum(r.sleep_score_sum for r in in_window), sum(r.sleep_count for r in in_window)
+    activities = sum(r.activity_count for r in in_window)
+    month_journals = sum(r.journal_count for r in rows if r.day >= month_start)
+
+    mood_score = (mood_sum / mood_count if mood_count else NEUTRAL_COMPONENT) * WEIGHT
+    sleep_score = (sleep_sum / sleep_count if sleep_count else NEUTRAL_COMPONENT) * WEIGHT
+    habit_score = min((activities / days) * 100, 100) * WEIGHT if goal_count else NEUTRAL_COMPONENT * WEIGHT
+    journal_consistency_score = min((month_journals / CONSISTENCY_DAYS) * 100, 100) * WEIGHT
+
+    overall_score = int(mood_score + sleep_score + habit_score + journal_consistency_score)
+    return {
+        'overall_score': overall_score,
+        'category': category_for(overall_score),
+        'breakdown': {
+            'mood': int(mood_score / WEIGHT),
+            'sleep': int(sleep_score / WEIGHT),
+            'habits': int(habit_score / WEIGHT),
+            'journal_consistency': int(journal_consistency_score / WEIGHT)
+        }
+    }
+
+
+def rebuild_rollups(conn, user_ids):
+    """Recompute the rollups of `user_ids` from the raw rows in the caller's transaction; returns rows written"""
+    # Delete first: it takes the write lock, so no write lands between the reads and the insert
+    conn.execute(delete(DailyWellness).where(DailyWellness.user_id.in_(user_ids)))
+    totals = {}
+
+    def add(user_id, day, **deltas):
+        row = totals.setdefault((user_id, as_date(day)), dict.fromkeys(
+            ('mood_sum', 'mood_count', 'sleep_score_sum', 'sleep_count', 'activity_count', 'journal_count'), 0))
+        for name, value in deltas.items():
+            row[name] += value
+
+    # Grouped through subqueries so the CASE expressions are not repeated in
+    # GROUP BY, where PostgreSQL would see their parameters as different values
+    journals = select(
+        Journal.user_id, journal_day(conn.dialect.name).label('day'), mood_value_expr().label('value')
+    ).where(Journal.user_id.in_(user_ids)).subquery()
+    for user_id, day, value, count in conn.execute(
+            select(journals.c.user_id, journals.c.day, journals.c.value, func.count())
+            .group_by(journals.c.user_id, journals.c.day, journals.c.value)):
+        add(user_id, day, mood_sum=value * count, mood_count=count, journal_count=count)
+
+    nights = select(
+        SleepLog.user_id, SleepLog.date, sleep_duration_expr().label('duration'), sleep_quality_expr().label('quality')
+    ).where(SleepLog.user_id.in_(user_ids)).subquery()
+    for user_id, day, duration, quality, count in conn.execute(
+            select(nights.c.user_id, nights.c.date, nights.c.duration, nights.c.quality, func.count())
+            .group_by(nights.c.user_id, nights.c.date, nights.c.duration, nights.c.quality)):
+        add(user_id, day, sleep_score_sum=min(duration + quality * 10, 100) * count, sleep_count=count)
+
+    for user_id, day, count in conn.execute(
+            select(Activity.user_id, Activity.date, func.count())
+            .join(Goal, and_(Activity.goal_id == Goal.id, Goal.user_id == Activity.user_id))
+            .where(Activity.user_id.in_(user_ids), Goal.is_active == True, Activity.completed == True)
+            .group_by(Activity.user_id, Activity.date)):
+        add(user_id, day, activity_count=count)
+
+    if totals:
+        conn.execute(insert(DailyWellness), [
+            dict(values, user_id=user_id, day=day) for (user_id, day), values in totals.items()
+        ])
+    return len(totals)
+
+
+def backfill(engine, user_ids=None, batch_size=500, pause=0.0):
+    """Rebuild the rollups of `user_ids` (default: everyone), batch_size users per transaction"""
+    if user_ids is None:
+        with engine.connect() as conn:
+            user_ids = list(conn.execute(select(User.id).order_by(User.id)).scalars())
+    rows = 0
+    for i in range(0, len(user_ids), batch_size):
+        with engine.begin() as conn:
+            rows += rebuild_rollups(conn, user_ids[i:i + batch_size])
+        if pause and i + batch_size < len(user_ids):
+            time.sleep(pause)
+    return len(user_ids), rows
+
+
+cli = AppGroup('wellness', help='Wellness score rollups.')
+
+
+@cli.command('backfill')
+@click.option('--user', 'user_ids', type=int, multiple=True, help='Only this user (repeatable).')
+@click.option('--batch-size', type=int, default=500, show_default=True, help='Users per transaction.')
+@click.option('--pause', type=float, default=0.0, help='Seconds to sleep between batches.')
+def backfill_command(user_ids, batch_size, pause):
+    """Rebuild daily wellness rollups from journals, sleep logs and activities."""
+    users, rows = backfill(db.engine, list(user_ids) or None, batch_size=batch_size, pause=pause)
+    click.echo(f"rebuilt {rows} daily rollups for {users} users")